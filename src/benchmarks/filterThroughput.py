@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2014, Rectorate of the University of Freiburg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+
+
+"""
+Micro-benchmark comparing SampleContainer.extractRows with the former
+implementation, which masked each column by getMaskedFC and copied its
+unit, attributes and dimensions.
+
+usage: python filterThroughput.py [ROWS] [COLUMNS] [REPEATS]
+"""
+
+import sys
+import copy
+import time
+import numpy
+from pyphant.core.DataContainer import (FieldContainer, SampleContainer,
+                                        IndexMarker)
+
+
+def legacyMaskedFC(field, numpymask):
+    if isinstance(field, IndexMarker):
+        return IndexMarker()
+    mdims = []
+    for dim in field.dimensions:
+        if mdims == []:
+            mdims.append(legacyMaskedFC(dim, numpymask))
+        else:
+            mdims.append(copy.deepcopy(dim))
+    masked = []
+    for item in [field.data, field.error, field.mask]:
+        if item is not None:
+            masked.append(item[numpymask])
+        else:
+            masked.append(None)
+    return FieldContainer(masked[0], copy.deepcopy(field.unit), masked[1],
+                          masked[2], mdims, longname=field.longname,
+                          shortname=field.shortname,
+                          attributes=copy.deepcopy(field.attributes))
+
+
+def legacyExtractRows(sample, mask, shortname, longname):
+    columns = [legacyMaskedFC(column, mask) for column in sample.columns]
+    return SampleContainer(columns, longname=longname, shortname=shortname,
+                           attributes=copy.deepcopy(sample.attributes))
+
+
+def modernExtractRows(sample, mask, shortname, longname):
+    return sample.extractRows(mask, shortname, longname)
+
+
+def measure(function, sample, mask, repeats):
+    """
+    Returns the best time in seconds needed to extract the rows selected
+    by mask from sample.
+    """
+    best = None
+    for i in xrange(repeats):
+        start = time.time()
+        function(sample, mask, u's', u'selection')
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def main():
+    rows = 10 ** 6
+    columns = 100
+    repeats = 3
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        columns = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        repeats = int(sys.argv[3])
+    data = numpy.random.rand(rows)
+    time0 = FieldContainer(numpy.arange(float(rows)), u'1 s',
+                           longname=u'time', shortname=u't')
+    time0.seal()
+    for label, dimensions in [('index', None), ('shared', [time0])]:
+        sample = SampleContainer([
+            FieldContainer(data, u'1 V', dimensions=dimensions,
+                           longname=u'column %d' % i, shortname=u'c_%d' % i)
+            for i in xrange(columns)])
+        mask = data > 0.5
+        print "Selecting half of %d rows of %d columns (%s dimensions)," \
+              " best of %d runs:" % (rows, columns, label, repeats)
+        for name, function in [('legacy', legacyExtractRows),
+                               ('extractRows', modernExtractRows)]:
+            duration = measure(function, sample, mask, repeats)
+            print "%-12s %8.3f s %8.2f Mrows/s" % (
+                name, duration, rows / 1e6 / duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2014, Rectorate of the University of Freiburg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+
+
+"""
+Micro-benchmark comparing the throughput of FieldContainer.seal() for
+the available hash algorithms.
+
+usage: python sealThroughput.py [MEGABYTES] [REPEATS]
+"""
+
+import sys
+import time
+import numpy
+from pyphant.core.DataContainer import (FieldContainer, HASH_ALGORITHMS,
+                                        setHashAlgorithm)
+
+
+def measure(data, repeats):
+    """
+    Returns the best time in seconds needed to seal a FieldContainer
+    holding data.
+    """
+    best = None
+    for i in xrange(repeats):
+        field = FieldContainer(data)
+        start = time.time()
+        field.seal()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def main():
+    megabytes = 256
+    repeats = 3
+    if len(sys.argv) > 1:
+        megabytes = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        repeats = int(sys.argv[2])
+    data = numpy.random.rand(megabytes * 2 ** 20 / 8)
+    print "Sealing %d MB, best of %d runs:" % (megabytes, repeats)
+    for name in sorted(HASH_ALGORITHMS.keys()):
+        setHashAlgorithm(name)
+        for label, array in [('contiguous', data),
+                             ('strided', data.reshape(-1, 2)[:, 0])]:
+            duration = measure(array, repeats)
+            print "%-10s %-10s %8.3f s %8.2f GB/s" % (
+                name, label, duration,
+                array.nbytes / float(2 ** 30) / duration)
+    setHashAlgorithm(u'md5')
+
+
+if __name__ == '__main__':
+    main()
@@ -34,9 +34,63 @@ pkg_resources.require("pyphant")
 pkg_resources.require("tables")
 
 
+def applyExecutionOrder(recipe, order):
+    """
+    Feeds the sockets of recipe with the DataContainers given by order
+    and returns the plug requested by order.
+    """
+    from pyphant.core.Emd5Src import Emd5Src
+    for socket, emd5 in order[0].iteritems():
+        sSpec = socket.split('.')
+        w = recipe.getWorker(sSpec[0])
+        s = getattr(w, sSpec[-1])
+        src = Emd5Src(recipe)
+        src.paramEmd5.value = emd5
+        if s.isFull():
+            s.pullPlug()
+        s.insert(src.plugGetDataContainer)
+    pSpec = order[1][0].split('.')
+    d = recipe.getWorker(pSpec[0])
+    return getattr(d, pSpec[1])
+
+
+def executeOrder(recipe, order):
+    plug = applyExecutionOrder(recipe, order)
+    res = recipe.run(plugs=[plug])[0]
+    res.seal()
+    return res
+
+
+#Recipe of the processes of the pool used by --jobs
+_recipe = None
+
+
+def _initProcess(recipe):
+    global _recipe
+    _recipe = recipe
+
+
+def _executeOrderInProcess(order):
+    return executeOrder(_recipe, order)
+
+
 def main():
-    import sys
-    filename = sys.argv[1]
+    import optparse
+    parser = optparse.OptionParser(
+        "usage: %prog [options] FILE\n"
+        "Executes the execution orders stored in FILE and saves the "
+        "results to FILE.")
+    parser.add_option(
+        "-j", "--jobs", type="int", dest="jobs", default=1,
+        help="Number of processes executing the orders (default: 1)")
+    parser.add_option(
+        "-b", "--batch-size", type="int", dest="batchSize", default=10,
+        help="Number of results written before the file is flushed "
+        "(default: 10)")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("Exactly one FILE is required.")
+    filename = args[0]
     from pyphant.core import KnowledgeManager
     km = KnowledgeManager.KnowledgeManager.getInstance()
     import os.path
@@ -44,27 +98,29 @@ def main():
     import tables
     h5 = tables.openFile(filename, 'r+')
     from pyphant.core import PyTablesPersister
-    recipe = PyTablesPersister.loadRecipe(h5)
+    # The processes of a pool must not read stored results through the
+    # handle this process writes to, hence they are loaded at once.
+    recipe = PyTablesPersister.loadRecipe(h5, lazy=options.jobs == 1)
     executionOrders = PyTablesPersister.loadExecutionOrders(h5)
-    h5.close()
-    from pyphant.core.Emd5Src import Emd5Src
-    for order in executionOrders:
-        for socket, emd5 in order[0].iteritems():
-            sSpec = socket.split('.')
-            w = recipe.getWorker(sSpec[0])
-            s = getattr(w, sSpec[-1])
-            src = Emd5Src(recipe)
-            src.paramEmd5.value = emd5
-            if s.isFull():
-                s.pullPlug()
-            s.insert(src.plugGetDataContainer)
-        pSpec = order[1][0].split('.')
-        d = recipe.getWorker(pSpec[0])
-        plug = getattr(d, pSpec[1])
-        res = plug.getResult()
-        res.seal()
-        h5 = tables.openFile(filename, 'r+')
-        PyTablesPersister.saveResult(res, h5)
+    pool = None
+    if options.jobs > 1:
+        # The processes of the pool compute the results from a copy of
+        # the recipe, this process is the only one writing to the file.
+        from multiprocessing import Pool
+        pool = Pool(options.jobs, _initProcess, (recipe, ))
+        results = pool.imap_unordered(_executeOrderInProcess,
+                                      executionOrders)
+    else:
+        results = (executeOrder(recipe, order) for order in executionOrders)
+    try:
+        for count, res in enumerate(results):
+            PyTablesPersister.saveResult(res, h5)
+            if (count + 1) % options.batchSize == 0:
+                h5.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
         h5.close()
 
 
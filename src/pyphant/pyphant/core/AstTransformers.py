@@ -33,10 +33,22 @@ This module ships classes for SampleContainer algebra expressions
 based on python's abstract syntax trees.
 """
 
+from __future__ import with_statement
+import threading
+import numpy
 from pyphant.quantities import Quantity
 from ast import (NodeTransformer, fix_missing_locations, Name, Load,
                  BinOp, Num, Mult, Compare, BoolOp, And, Add, Sub, Div, Or,
-                 Call, Not, Expression)
+                 Call, Not, Expression, Lt, LtE, Gt, GtE, Eq, NotEq)
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+#Whether CompiledExpressions are evaluated by numexpr if available
+USE_NUMEXPR = True
+#Size of the row chunks CompiledExpressions are evaluated in otherwise
+CHUNK_BYTES = 1 << 18
 
 
 class LocationFixingNodeTransformer(NodeTransformer):
@@ -246,3 +258,200 @@ def checkDimensions(dimensions1, dimensions2):
               % (dimensions1, dimensions2)
         raise ValueError(msg)
     return dimensions1 or dimensions2
+
+
+_NUMEXPR_OPERATORS = {Add: '+', Sub: '-', Mult: '*', Div: '/',
+                      Lt: '<', LtE: '<=', Gt: '>', GtE: '>=', Eq: '==',
+                      NotEq: '!=', 'logical_and': '&', 'logical_or': '|'}
+
+
+def toNumexpr(node):
+    """
+    Returns the expression transformed by ReplaceName, ReplaceCompare and
+    ReplaceOperator as numexpr string or None if it is not supported.
+    """
+    if isinstance(node, Name):
+        if node.id in ['True', 'False']:
+            return None
+        return node.id
+    elif isinstance(node, Num):
+        if not isinstance(node.n, (int, float)):
+            return None
+        return repr(node.n)
+    elif isinstance(node, BinOp):
+        operands = [toNumexpr(node.left), toNumexpr(node.right)]
+        operator = _NUMEXPR_OPERATORS.get(type(node.op))
+    elif isinstance(node, Compare) and len(node.ops) == 1:
+        operands = [toNumexpr(node.left), toNumexpr(node.comparators[0])]
+        operator = _NUMEXPR_OPERATORS.get(type(node.ops[0]))
+    elif isinstance(node, Call) and isinstance(node.func, Name):
+        operands = [toNumexpr(arg) for arg in node.args]
+        if node.func.id == 'logical_not' and len(operands) == 1:
+            if operands[0] is None:
+                return None
+            return '(~%s)' % (operands[0], )
+        operator = _NUMEXPR_OPERATORS.get(node.func.id)
+        if len(operands) != 2:
+            return None
+    else:
+        return None
+    if operator is None or None in operands:
+        return None
+    return '(%s %s %s)' % (operands[0], operator, operands[1])
+
+
+class CompiledExpression(object):
+    """
+    Unit checked and compiled calcColumn expression, which is evaluated
+    by binding the data of the referenced columns.
+    """
+    def __init__(self, exprStr, sampleContainer):
+        import ast
+        rpn = ReplaceName(sampleContainer)
+        expr = compile(exprStr, "<calcColumn>", 'eval', ast.PyCF_ONLY_AST)
+        replacedExpr = rpn.visit(expr)
+        rpc = ReplaceCompare(rpn.localDict)
+        factorExpr = rpc.visit(replacedExpr)
+        rpo = ReplaceOperator(rpn.localDict)
+        factorExpr = rpo.visit(factorExpr)
+        self.code = compile(factorExpr, '<calcColumn>', 'eval')
+        self.numexprString = toNumexpr(factorExpr.body)
+        unitcalc = UnitCalculator(rpn.localDict)
+        self.unit, dims = unitcalc.getUnitAndDim(replacedExpr)
+        self.hasDimensions = dims is not None
+        self.columns = []
+        self.constants = {}
+        positions = dict([(id(column), index) for index, column
+                          in enumerate(sampleContainer.columns)])
+        for name, ref in rpn.localDict.iteritems():
+            if id(ref) in positions:
+                self.columns.append((int(name[1:]), name, positions[id(ref)]))
+            else:
+                self.constants[name] = ref.data
+        #ReplaceName numbers the columns from left to right
+        self.columns.sort()
+
+    def evaluate(self, columns):
+        """
+        Returns the tuple (data, dimensions) of the expression evaluated
+        for the given columns, whose schema has to match the one of
+        compilation. The dimensions are None for expressions without
+        columns.
+        """
+        dims = None
+        if self.hasDimensions:
+            for number, name, index in self.columns:
+                dims = checkDimensions(dims, columns[index].dimensions)
+        arrays = dict([(name, columns[index].data)
+                       for number, name, index in self.columns])
+        localDict = dict(self.constants)
+        localDict.update(arrays)
+        if numexpr is not None and USE_NUMEXPR \
+               and self.numexprString is not None \
+               and len(arrays) > 0 \
+               and [array for array in arrays.itervalues()
+                    if array.dtype != numpy.float64] == []:
+            #Restricted to float64 columns and without rewriting
+            #divisions, numexpr and NumPy yield identical results.
+            try:
+                return numexpr.evaluate(self.numexprString, localDict,
+                                        optimization='none'), dims
+            except Exception:
+                #Let NumPy evaluate or report the failure.
+                pass
+        localDict.update({'logical_and': numpy.logical_and,
+                          'logical_or': numpy.logical_or,
+                          'logical_not': numpy.logical_not})
+        return self._evaluateChunked(localDict, arrays), dims
+
+    def _evaluateChunked(self, localDict, arrays):
+        u"""Evaluates the code for chunks of rows, which bounds the
+        temporary arrays to the chunk size."""
+        if len(arrays) == 0:
+            return eval(self.code, {}, localDict)
+        rows = len(arrays.values()[0])
+        rowBytes = max([array[:1].nbytes for array in arrays.itervalues()])
+        step = max(1, CHUNK_BYTES // max(1, rowBytes))
+        if rows <= step:
+            return eval(self.code, {}, localDict)
+        result = None
+        for start in xrange(0, rows, step):
+            region = slice(start, start + step)
+            for name, array in arrays.iteritems():
+                localDict[name] = array[region]
+            chunk = eval(self.code, {}, localDict)
+            if result is None:
+                result = numpy.empty((rows, ) + chunk.shape[1:],
+                                     dtype=chunk.dtype)
+            result[region] = chunk
+        return result
+
+
+class ExpressionCache(object):
+    """
+    Bounded LRU cache of CompiledExpressions keyed by the expression and
+    the schema, i.e. names and units, of the columns.
+    """
+    def __init__(self, maxSize=128):
+        """
+        maxSize -- maximal number of cached expressions, 0 disables caching
+        """
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def getKey(self, exprStr, sampleContainer):
+        return (exprStr, tuple([(column.longname, column.shortname,
+                                 repr(column.unit))
+                                for column in sampleContainer.columns]))
+
+    def get(self, exprStr, sampleContainer):
+        """
+        Returns the CompiledExpression of exprStr for sampleContainer,
+        which is compiled and cached if necessary.
+        """
+        key = self.getKey(exprStr, sampleContainer)
+        with self._lock:
+            self._tick += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = self._tick
+                return entry[0]
+            self.misses += 1
+        compiled = CompiledExpression(exprStr, sampleContainer)
+        with self._lock:
+            if self.maxSize > 0:
+                self._entries[key] = [compiled, self._tick]
+            while len(self._entries) > self.maxSize:
+                oldest = min(self._entries.iteritems(),
+                             key=lambda item: item[1][1])[0]
+                del self._entries[oldest]
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def keys(self):
+        """
+        Returns the keys (expression, schema) of the cached expressions.
+        """
+        with self._lock:
+            return self._entries.keys()
+
+    def getStatistics(self):
+        """
+        Returns a dictionary with the number of cached expressions, the
+        maximal size and the number of hits and misses.
+        """
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'maxSize': self.maxSize,
+                    'hits': self.hits,
+                    'misses': self.misses}
@@ -35,7 +35,8 @@ At the moment these can only be entire recipes, but it is planned
 that they can be subgraphs, too.
 """
 
-from pyphant.core import (EventDispatcher, Worker, Connectors, Param)
+from pyphant.core import (EventDispatcher, Worker, Connectors, Param,
+                          Executors)
 import copy
 import pkg_resources
 
@@ -92,6 +93,9 @@ class CompositeWorker(Worker.Worker):
     VERSION = 1
     REVISION = pkg_resources.get_distribution("pyphant").version
     name = "Composite"
+    _executor = None
+    _resultCache = None
+    _memoryBudget = None
     _params = [("noSockets", "Number of sockets", 0, None),
                ("noPlugs", "Number of plugs", 0, None)]
 
@@ -173,6 +177,39 @@ class CompositeWorker(Worker.Worker):
     def getAllPlugs(self):
         return sum([w.getPlugs() for w in self.getWorkers()], [])
 
+    def getOutputPlugs(self):
+        """
+        Returns the plugs of the contained workers that are not connected
+        to any socket.
+        """
+        return [plug for plug in self.getAllPlugs() if not plug._sockets]
+
+    def run(self, plugs=None, max_workers=None, subscriber=None):
+        """
+        Computes the results of the given plugs with at most max_workers
+        threads and returns them as a list. See Scheduler.RecipeScheduler.
+        plugs -- list of plugs or connector ids, defaults to the plugs
+                 returned by getOutputPlugs()
+        max_workers -- maximal number of plugs computed at the same time,
+                       defaults to the number of CPUs
+        subscriber -- subscriber passed to CalculatingPlug.getResult()
+        """
+        from pyphant.core.Scheduler import RecipeScheduler
+        if plugs is None:
+            plugs = self.getOutputPlugs()
+        plugs = [isinstance(plug, basestring) and self.findConnectorForId(plug)
+                 or plug for plug in plugs]
+        return RecipeScheduler(plugs).run(max_workers, subscriber)
+
+    def getPerformanceReport(self, profiler):
+        """
+        Returns the resources used by the workers of this recipe as
+        recorded by profiler, one dictionary per worker, sorted by
+        descending computation time. See the Profiler module.
+        profiler -- Profiler.Profiler passed as subscriber to run()
+        """
+        return profiler.getReport(self.getWorkers())
+
     def getOpenSocketsForPlug(self, plug):
         walker = self.createCompositeWorkerWalker()
         return sum(walker.visit(lambda w:
@@ -187,6 +224,54 @@ class CompositeWorker(Worker.Worker):
     def getSinks(self):
         return self._sinks
 
+    def setExecutor(self, executor):
+        """
+        Sets the executor used by all plugs of this recipe, which have
+        no executor of their own. See the Executors module.
+        executor -- executor instance or None to use the executor of
+                    the parent CompositeWorker or the default executor
+        """
+        self._executor = executor
+
+    def setResultCache(self, cache):
+        """
+        Sets the ResultCache consulted by all plugs of this recipe before
+        computing their results. See the ResultCache module.
+        cache -- ResultCache instance or None to use the cache of the
+                 parent CompositeWorker
+        """
+        self._resultCache = cache
+
+    def getResultCache(self):
+        if self._resultCache is not None:
+            return self._resultCache
+        if self.parent is not None:
+            return self.parent.getResultCache()
+        return None
+
+    def setMemoryBudget(self, budget):
+        """
+        Sets the MemoryBudget limiting the memory occupied by the results
+        of all plugs of this recipe. See the MemoryBudget module.
+        budget -- MemoryBudget instance or None to use the budget of the
+                  parent CompositeWorker
+        """
+        self._memoryBudget = budget
+
+    def getMemoryBudget(self):
+        if self._memoryBudget is not None:
+            return self._memoryBudget
+        if self.parent is not None:
+            return self.parent.getMemoryBudget()
+        return None
+
+    def getExecutor(self):
+        if self._executor is not None:
+            return self._executor
+        if self.parent is not None:
+            return self.parent.getExecutor()
+        return Executors.DEFAULT_EXECUTOR
+
     #pickle
     def __getstate__(self):
         pdict = copy.copy(self.__dict__)
@@ -37,15 +37,87 @@ import copy
 import threading
 import inspect
 import logging
-
-# used in exec statement; shouldn't this be passed as a name to exec?
-import Queue
+import weakref
+from pyphant.core import Executors
 
 
 class FullSocketError(ValueError):
     pass
 
 
+class CancelledError(RuntimeError):
+    pass
+
+
+class PlugTimeoutError(CancelledError):
+    pass
+
+
+#Stack of sets collecting the parameters read by the worker methods,
+#which are currently being executed in this thread.
+_paramReads = threading.local()
+
+
+def recordParamRead(param):
+    """
+    Notes that param has been read by the worker method, which is being
+    executed by the calling thread. Called by Param.value.
+    """
+    stack = getattr(_paramReads, 'stack', None)
+    if stack:
+        stack[-1].add(param)
+
+
+def _fingerprint(value):
+    """
+    Returns a key which is equal for values of equal content, or None if
+    the content of value cannot be compared cheaply. DataContainers are
+    compared by their hash, which is only known once they are sealed.
+    """
+    from pyphant.core.DataContainer import DataContainer
+    if isinstance(value, DataContainer):
+        if value.id:
+            return ('dc', value.hash)
+        return None
+    if value is None or isinstance(value, (basestring, bool, int,
+                                           long, float)):
+        return ('value', value)
+    return None
+
+
+def _recordInputs(inputs):
+    """
+    Returns a record of the inputs of a worker method, which is used by
+    _inputsUnchanged(). Values without a fingerprint are recorded by
+    identity via a weak reference. Returns None if an input can neither
+    be fingerprinted nor weakly referenced.
+    """
+    record = {}
+    for name, value in inputs.iteritems():
+        key = _fingerprint(value)
+        if key is None:
+            try:
+                key = weakref.ref(value)
+            except TypeError:
+                return None
+        record[name] = key
+    return record
+
+
+def _inputsUnchanged(record, inputs):
+    if record is None or set(record.keys()) != set(inputs.keys()):
+        return False
+    for name, value in inputs.iteritems():
+        key = _fingerprint(value)
+        if key is not None:
+            if record[name] != key:
+                return False
+        elif not isinstance(record[name], weakref.ref) \
+                 or record[name]() is not value:
+            return False
+    return True
+
+
 TYPE_ARRAY = 'scipy.array'
 TYPE_IMAGE = 'pil.image'
 TYPE_INT = type(2)
@@ -76,6 +148,91 @@ class Connector(object):
                   self.worker.id + "." + self.pre + self.name.capitalize())
 
 
+class CancelToken(object):
+    """
+    Flag for the cooperative cancellation of plug computations. A token
+    counts as cancelled if it has been cancelled itself or if one of its
+    ancestors has been cancelled. Worker methods poll the token by
+    their subscriber argument, see Updater.
+    """
+    def __init__(self, parent=None):
+        """
+        parent -- optional CancelToken cancelling this token as well
+        """
+        self.parent = parent
+        self._cancelled = False
+        self._reason = None
+        self._error = CancelledError
+
+    def cancel(self, reason=u"The calculation has been cancelled.",
+               error=CancelledError):
+        """
+        Cancels the token. The first reason given is kept.
+        error -- exception class raised by check()
+        """
+        if not self._cancelled:
+            self._reason = reason
+            self._error = error
+            self._cancelled = True
+
+    def _getCancelledToken(self):
+        token = self
+        while token is not None:
+            if token._cancelled:
+                return token
+            token = token.parent
+        return None
+
+    def isCancelled(self):
+        return self._getCancelledToken() is not None
+
+    def check(self):
+        """
+        Raises CancelledError if the token has been cancelled.
+        """
+        token = self._getCancelledToken()
+        if token is not None:
+            raise token._error(token._reason)
+
+
+class CancellableSubscriber(object):
+    """
+    Subscriber providing a CancelToken to the worker methods. The
+    notifications are forwarded to an optional subscriber.
+    """
+    def __init__(self, cancelToken=None, subscriber=None):
+        if cancelToken is None:
+            cancelToken = CancelToken()
+        self.cancelToken = cancelToken
+        self.subscriber = subscriber
+
+    def cancel(self, reason=u"The calculation has been cancelled."):
+        self.cancelToken.cancel(reason)
+
+    def startProcess(self, process):
+        if self.subscriber:
+            self.subscriber.startProcess(process)
+
+    def updateProcess(self, process, percentage):
+        if self.subscriber:
+            self.subscriber.updateProcess(process, percentage)
+
+    def finishProcess(self, process):
+        if self.subscriber:
+            self.subscriber.finishProcess(process)
+
+    def inputsCollected(self, process, inputs):
+        if hasattr(self.subscriber, 'inputsCollected'):
+            self.subscriber.inputsCollected(process, inputs)
+
+
+def getCancelToken(subscriber):
+    """
+    Returns the CancelToken provided by subscriber or None.
+    """
+    return getattr(subscriber, 'cancelToken', None)
+
+
 class Computer(threading.Thread):
     def __init__(self, method, exception_queue, **kwargs):
         threading.Thread.__init__(self)
@@ -88,6 +245,8 @@ class Computer(threading.Thread):
         if self.method:
             try:
                 self.result = self.method(subscriber=self.kwargs["subscriber"])
+            except CancelledError, e:
+                self.exception_queue.put(e)
             except Exception, e:
                 logging.getLogger('pyphant').error(
                     u"An unhandled exception occured in the calculation.",
@@ -97,6 +256,10 @@ class Computer(threading.Thread):
 
 
 class Plug(Connector):
+    #Handle of a result stored in a recipe file, which is loaded when the
+    #result is requested first, see PyTablesPersister.StoredResult
+    _storedResult = None
+
     def __init__(self, worker, name, type=DEFAULT_DATA_TYPE):
         Connector.__init__(self, worker, name, type, "plug")
         self._result = None
@@ -106,6 +269,7 @@ class Plug(Connector):
     def __getstate__(self):  # this could be done with marshalling
         pdict = copy.copy(self.__dict__)
         pdict['_result'] = None
+        pdict.pop('_storedResult', None)
         del pdict['_resultLock']
         return pdict
 
@@ -122,17 +286,46 @@ class Plug(Connector):
     def invalidate(self, event=None):
         self._resultLock.acquire()
         self._result = None
+        self._storedResult = None
         for socket in self._sockets:
             socket.invalidate()
         self._resultLock.release()
 
+    def getResultAsync(self, subscriber=None):
+        """
+        Returns a Future of the result of this plug, which is computed
+        by the shared ResultPool without blocking the caller.
+        Concurrent requests share the same Future. See the Scheduler
+        module.
+        """
+        from pyphant.core.Scheduler import getResultPool
+        return getResultPool().submit(self, subscriber)
+
+    def dependsOn(self, connector):
+        """
+        Indicates whether the result of this plug may depend on the
+        socket or parameter connector of its worker.
+        """
+        return True
+
     def resultIsAvailable(self):
         """Indicates whether a precalculated result is available.
 
         This is not threadsafe, i.e. by the time this function returns
         a formerly available result may have been invalidated, or a
         calculation may have finished. Use as an indicator only."""
-        return (self._result != None)
+        return (self._result != None) or (self._storedResult is not None)
+
+    def getAvailableResult(self):
+        """
+        Returns the result if it is available without calculation, i.e.
+        the precalculated or the stored result, else None.
+        """
+        result = self._result
+        storedResult = self._storedResult
+        if result is None and storedResult is not None:
+            result = storedResult.load()
+        return result
 
 
 class Updater(object):
@@ -140,13 +333,56 @@ class Updater(object):
         self.subscriber = subscriber
         self.process = process
 
+    def _getCancelToken(self):
+        return getCancelToken(self.subscriber)
+    cancelToken = property(_getCancelToken)
+
+    def isCancelled(self):
+        """
+        Indicates whether the calculation has been cancelled. Worker
+        methods may poll this in order to stop early.
+        """
+        token = self.cancelToken
+        return token is not None and token.isCancelled()
+
+    def checkCancelled(self):
+        """
+        Raises CancelledError if the calculation has been cancelled.
+        Called by every progress update.
+        """
+        token = self.cancelToken
+        if token is not None:
+            token.check()
+
     def __imod__(self, percentage):
+        self.checkCancelled()
         if self.subscriber:
             self.subscriber.updateProcess(self.process, percentage)
         return self
 
 
 class CalculatingPlug(Plug):
+    """
+    Plug computing its result by a method of its worker.
+
+    Invalidation is tracked incrementally: When an upstream plug is
+    invalidated, the former result is kept as stale result. If the
+    inputs turn out to be unchanged upon the next call of getResult(),
+    the stale result is reused without calling the worker method. If a
+    recomputed result has the same hash as the stale one, the stale
+    result is kept, such that downstream plugs find their inputs
+    unchanged as well (early cutoff). Changing a parameter only
+    invalidates the plugs whose methods read the parameter during their
+    last calculation.
+    """
+    executor = None
+    #Maximal time in seconds the worker method may take, see _callMethod()
+    timeout = None
+    _staleResult = None
+    _inputRecord = None
+    _paramsRead = None
+    _spilledId = None
+
     def __init__(self, method, name, type=DEFAULT_DATA_TYPE):
         Plug.__init__(self, method.im_self, name, type)
         self._methodName = method.func_name
@@ -155,52 +391,195 @@ class CalculatingPlug(Plug):
     def createWrapper(self, method):
         args, varargs, varkw, defaults = inspect.getargspec(method)
         sockets = args[1:-1]
-        name = method.func_name + 'PyphantWrapper'
-        l = 'def ' + name + '(subscriber, method=method, process=self):\n'
-        l += '\texception_queue=Queue.Queue()\n'
-        for s in sockets:
-            l += '\t' + s + '=Computer(method.im_self.getSocket("'
-            l += s + '").getResult, exception_queue, subscriber=subscriber)\n'
-        for s in sockets:
-            l += '\t' + s + '.start()\n'
-        for s in sockets:
-            l += '\t' + s + '.join()\n'
-        l += '\texceptions=[]\n'
-        l += '\twhile not exception_queue.empty():\n'
-        l += '\t\texceptions.append(exception_queue.get())\n'
-        l += '\t\texception_queue.task_done()\n'
-        l += '\tif len(exceptions)>0:\n'
-        l += '\t\traise RuntimeError, str(exceptions)\n'
-        #If no sockets are needed the comma in the next line will be erased,
-        #so do not add a space!
-        l += '\treturn method( subscriber=Updater(subscriber, process),'
-        for s in sockets:
-            l += s + '=' + s + '.result,'
-        l = l[:-1] + ')\n'
-        exec l
-        return eval(name)
+        self._socketNames = sockets
+
+        def wrapper(subscriber, executor=None):
+            if executor is None:
+                executor = self.getExecutor()
+            inputs = executor.collectInputs(
+                [(s, self.worker.getSocket(s)) for s in sockets], subscriber)
+            token = getCancelToken(subscriber)
+            if token is not None:
+                token.check()
+            if hasattr(subscriber, 'inputsCollected'):
+                subscriber.inputsCollected(self, inputs)
+            stale = self._staleResult
+            self._staleResult = None
+            if stale is not None and _inputsUnchanged(self._inputRecord,
+                                                      inputs):
+                return stale
+            self._inputRecord = _recordInputs(inputs)
+            cache = self.getResultCache()
+            key = None
+            if cache is not None:
+                key = cache.getKey(self, inputs)
+            if key is not None:
+                result = cache.lookup(key)
+                if result is not None:
+                    return result
+            result = self._callMethod(executor, inputs, subscriber)
+            if key is not None:
+                cache.store(key, result)
+            if stale is not None:
+                fingerprint = _fingerprint(result)
+                if fingerprint is not None \
+                       and fingerprint == _fingerprint(stale):
+                    return stale
+            return result
+        wrapper.__name__ = method.func_name + 'PyphantWrapper'
+        return wrapper
+
+    def _callMethod(self, executor, inputs, subscriber):
+        """
+        Calls the worker method via executor. If self.timeout is set,
+        the calculation is cancelled after self.timeout seconds, which
+        takes effect when the worker method polls its subscriber
+        argument next time.
+        """
+        timer = None
+        if self.timeout is not None:
+            token = CancelToken(getCancelToken(subscriber))
+            subscriber = CancellableSubscriber(token, subscriber)
+            timer = threading.Timer(
+                self.timeout, token.cancel,
+                (u"Plug %s timed out after %s s." % (self.id, self.timeout),
+                 PlugTimeoutError))
+            timer.setDaemon(True)
+            timer.start()
+        updater = Updater(subscriber, self)
+        try:
+            if not getattr(executor, 'tracksParamReads', False):
+                self._paramsRead = None
+                return executor.callMethod(self, inputs, updater)
+            if not hasattr(_paramReads, 'stack'):
+                _paramReads.stack = []
+            _paramReads.stack.append(set())
+            try:
+                result = executor.callMethod(self, inputs, updater)
+            finally:
+                paramsRead = _paramReads.stack.pop()
+            self._paramsRead = paramsRead
+            return result
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def invalidate(self, event=None):
+        from pyphant.core.Param import Param
+        self._resultLock.acquire()
+        try:
+            if self._result is not None:
+                self._staleResult = self._result
+            if event is None or isinstance(event, Param):
+                self._staleResult = None
+            self._result = None
+            self._spilledId = None
+            self._storedResult = None
+            budget = self.getMemoryBudget()
+            if budget is not None:
+                budget.release(self)
+            for socket in self._sockets:
+                socket.invalidate()
+        finally:
+            self._resultLock.release()
+
+    def dependsOn(self, connector):
+        from pyphant.core.Param import Param
+        if isinstance(connector, Param):
+            return self._paramsRead is None or connector in self._paramsRead
+        if connector in self.worker.getSockets():
+            return connector.name in self._socketNames
+        return True
+
+    def getExecutor(self):
+        """
+        Returns the executor of this plug if one has been assigned to
+        .executor, else the executor of the parent CompositeWorker.
+        """
+        if self.executor is not None:
+            return self.executor
+        if self.worker.parent is not None:
+            return self.worker.parent.getExecutor()
+        return Executors.DEFAULT_EXECUTOR
+
+    def getMemoryBudget(self):
+        """
+        Returns the MemoryBudget of the parent CompositeWorker or None.
+        """
+        if self.worker.parent is not None:
+            return self.worker.parent.getMemoryBudget()
+        return None
+
+    def evictResult(self, spill=False):
+        """
+        Drops the result of this plug in order to free memory. The result
+        is recomputed on demand or, if spill is set and the result is a
+        DataContainer, stored temporarily by the KnowledgeManager and
+        reloaded on demand. Returns whether the result has been evicted,
+        which is not the case while it is being computed.
+        """
+        if not self._resultLock.acquire(False):
+            return False
+        try:
+            result = self._result
+            if result is None:
+                return False
+            from pyphant.core.DataContainer import DataContainer
+            if spill and isinstance(result, DataContainer):
+                from pyphant.core.KnowledgeManager import KnowledgeManager
+                result.seal()
+                KnowledgeManager.getInstance().registerDataContainer(
+                    result, temporary=True)
+                self._spilledId = result.id
+            self._result = None
+            self._staleResult = None
+            return True
+        finally:
+            self._resultLock.release()
+
+    def getResultCache(self):
+        """
+        Returns the ResultCache of the parent CompositeWorker or None.
+        """
+        if self.worker.parent is not None:
+            return self.worker.parent.getResultCache()
+        return None
 
     def __getstate__(self):  # this could be done with marshalling
         pdict = super(CalculatingPlug, self).__getstate__()
         del pdict['_func']
+        for attr in ['_staleResult', '_inputRecord', '_paramsRead',
+                     '_spilledId']:
+            pdict.pop(attr, None)
         return pdict
 
     def __setstate__(self, pdict):
         super(CalculatingPlug, self).__setstate__(pdict)
         self._func = self.createWrapper(getattr(self.worker, self._methodName))
 
-    def getResult(self, subscriber=None):
+    def getResult(self, subscriber=None, executor=None):
         self._resultLock.acquire()
         try:
+            if self._result is None and self._spilledId is not None:
+                from pyphant.core.KnowledgeManager import KnowledgeManager
+                self._result = KnowledgeManager.getInstance(
+                    ).getDataContainer(self._spilledId)
+            if self._result is None and self._storedResult is not None:
+                self._result = self._storedResult.load()
             if not self.resultIsAvailable():
                 if subscriber:
                     subscriber.startProcess(self)
-                self._result = self._func(subscriber)
-                if subscriber:
-                    subscriber.finishProcess(self)
+                try:
+                    self._result = self._func(subscriber, executor)
+                finally:
+                    if subscriber:
+                        subscriber.finishProcess(self)
             result = self._result
         finally:
             self._resultLock.release()
+        budget = self.getMemoryBudget()
+        if budget is not None:
+            budget.retain(self, result)
         return result
 
 
@@ -261,6 +640,7 @@ class ConnectorProxy(Socket, Plug):
     def __getstate__(self):  # this could be done with marshalling
         pdict = copy.copy(self.__dict__)
         pdict['_result'] = None
+        pdict.pop('_storedResult', None)
         del pdict['_resultLock']
         return pdict
 
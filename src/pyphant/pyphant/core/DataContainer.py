@@ -70,9 +70,7 @@ import threading
 import numpy
 import StringIO
 import urlparse
-from pyphant.core.AstTransformers import (
-    ReplaceName, ReplaceCompare, ReplaceOperator, UnitCalculator,
-    checkDimensions)
+from pyphant.core.AstTransformers import (checkDimensions, ExpressionCache)
 import Helpers
 import logging
 _logger = logging.getLogger("pyphant")
@@ -88,6 +86,237 @@ def parseId(id):
     return resUri[2].split('/')[-1].split('.')  # (hash, uriType)
 
 
+#Version of the hashing scheme. Hashes of version 1 have been computed
+#by MD5 from pickled arrays and carry no tag. Later hashes are prefixed
+#by the tag of their HashAlgorithm, see tagHash() and splitHash(). Ids
+#containing hashes of any version remain valid.
+HASH_VERSION = 2
+#Number of bytes fed to the digest at once when hashing arrays
+HASH_CHUNK_BYTES = 1 << 22
+
+
+class HashAlgorithm(object):
+    u"""Digest used for generating the hashes of DataContainers.
+    If tree is set, arrays are split into chunks of HASH_CHUNK_BYTES,
+    which are digested separately by up to threads threads. The digests
+    of the chunks are fed to the digest of the container in order."""
+    def __init__(self, name, factory, tree=False, threads=None):
+        self.name = name
+        self.factory = factory
+        self.tree = tree
+        if threads is None:
+            from multiprocessing import cpu_count
+            threads = cpu_count()
+        self.threads = threads
+        self.tag = u"%sv%d" % (name, HASH_VERSION)
+
+    def new(self):
+        return self.factory()
+
+
+def _blake2bFactory():
+    try:
+        return hashlib.blake2b
+    except AttributeError:
+        from pyblake2 import blake2b
+        return blake2b
+
+HASH_ALGORITHMS = {u'md5': HashAlgorithm(u'md5', hashlib.md5)}
+try:
+    HASH_ALGORITHMS[u'blake2b'] = HashAlgorithm(u'blake2b', _blake2bFactory(),
+                                                tree=True)
+except ImportError:
+    pass
+_hashAlgorithm = HASH_ALGORITHMS[u'md5']
+
+
+def setHashAlgorithm(name):
+    u"""Selects the HashAlgorithm used by DataContainers sealed from now
+    on. Available are the keys of HASH_ALGORITHMS: 'md5' (default) and
+    'blake2b', if hashlib or the pyblake2 package provide it."""
+    global _hashAlgorithm
+    _hashAlgorithm = HASH_ALGORITHMS[name]
+
+
+def getHashAlgorithm():
+    return _hashAlgorithm
+
+
+def tagHash(hexdigest, algorithm=None):
+    u"""Returns the hash part of an emd5 for the given hexdigest."""
+    if algorithm is None:
+        algorithm = _hashAlgorithm
+    return u"%s_%s" % (algorithm.tag, hexdigest)
+
+
+def splitHash(hash):
+    u"""Returns tuple (TAG, HEXDIGEST) from the hash part of an emd5.
+    TAG is None for hashes of version 1."""
+    if u'_' in hash:
+        return tuple(hash.split(u'_', 1))
+    return (None, hash)
+
+
+def hashArray(m, array, chunkBytes=HASH_CHUNK_BYTES, algorithm=None):
+    u"""Feeds dtype, shape and content of the numpy array to digest m.
+    The buffer of contiguous arrays is hashed in chunks of chunkBytes
+    without copying, non-contiguous arrays are copied chunk by chunk.
+    Arrays of Python objects are hashed by their pickled representation.
+    algorithm -- HashAlgorithm m belongs to, defaults to the selected one"""
+    if algorithm is None:
+        algorithm = _hashAlgorithm
+    m.update(array.dtype.str)
+    m.update(str(array.shape))
+    if array.dtype.hasobject:
+        m.update(array.dumps())
+    elif algorithm.tree:
+        _treeHash(m, array, chunkBytes, algorithm)
+    else:
+        for chunk in _iterChunks(array, chunkBytes):
+            m.update(chunk)
+
+
+def _iterChunks(array, chunkBytes):
+    u"""Yields the C-order byte stream of array split at fixed offsets
+    of chunkBytes, independent of the memory layout of array."""
+    pending = []
+    pendingBytes = 0
+    for block in _iterBlocks(array, chunkBytes):
+        while len(block):
+            take = min(chunkBytes - pendingBytes, len(block))
+            pending.append(block[:take])
+            pendingBytes += take
+            block = block[take:]
+            if pendingBytes == chunkBytes:
+                yield _joinBlocks(pending)
+                pending = []
+                pendingBytes = 0
+    if pending:
+        yield _joinBlocks(pending)
+
+
+def _joinBlocks(blocks):
+    if len(blocks) == 1:
+        return blocks[0]
+    return numpy.concatenate(blocks)
+
+
+def _iterBlocks(array, chunkBytes):
+    #Yields the bytes of array in C order as uint8 arrays of at most
+    #chunkBytes, copying non-contiguous arrays a few rows at a time.
+    if array.size == 0:
+        return
+    if array.flags.c_contiguous:
+        buf = array.reshape(-1).view(numpy.uint8)
+        for start in xrange(0, len(buf), chunkBytes):
+            yield buf[start:start + chunkBytes]
+    elif array[0].nbytes > chunkBytes:
+        for row in array:
+            for block in _iterBlocks(row, chunkBytes):
+                yield block
+    else:
+        rows = max(1, chunkBytes // array[0].nbytes)
+        for start in xrange(0, len(array), rows):
+            for block in _iterBlocks(
+                numpy.ascontiguousarray(array[start:start + rows]),
+                chunkBytes):
+                yield block
+
+
+def _treeHash(m, array, chunkBytes, algorithm):
+    chunks = enumerate(_iterChunks(array, chunkBytes))
+    lock = threading.Lock()
+    leaves = {}
+
+    def digest():
+        while True:
+            with lock:
+                try:
+                    index, chunk = chunks.next()
+                except StopIteration:
+                    return
+            leaf = algorithm.new()
+            leaf.update(chunk)
+            leaves[index] = leaf.digest()
+    if array.nbytes <= chunkBytes or algorithm.threads < 2:
+        digest()
+    else:
+        threads = [threading.Thread(target=digest)
+                   for i in xrange(algorithm.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for index in xrange(len(leaves)):
+        m.update(leaves[index])
+
+
+def rawDataBytes(value):
+    u"""Returns the number of bytes of the arrays of value, if it is a
+    DataContainer, and 0 otherwise."""
+    nbytes = getattr(value, 'rawDataBytes', 0)
+    if isinstance(nbytes, list):
+        #SampleContainer returns the bytes per column
+        nbytes = sum(nbytes)
+    return nbytes
+
+
+def sealConcurrently(containers):
+    u"""Seals the given DataContainers. Unsealed containers are hashed
+    in parallel threads, since hashlib releases the GIL while digesting
+    large buffers."""
+    pending = []
+    for container in containers:
+        if not getattr(container, 'id', True) \
+               and not [c for c in pending if c is container]:
+            pending.append(container)
+    if len(pending) < 2:
+        for container in pending:
+            container.seal()
+        return
+    from multiprocessing import cpu_count
+    exceptions = []
+
+    def seal():
+        while True:
+            try:
+                container = pending.pop()
+            except IndexError:
+                return
+            try:
+                container.seal()
+            except Exception, e:
+                exceptions.append(e)
+    threads = [threading.Thread(target=seal)
+               for i in xrange(min(len(pending), cpu_count()))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if exceptions:
+        raise exceptions[0]
+
+
+_slotCache = {}
+
+
+def _slotNames(cls):
+    u"""Returns the names of all slots of cls holding picklable state."""
+    try:
+        return _slotCache[cls]
+    except KeyError:
+        names = []
+        for klass in cls.__mro__:
+            names.extend([name for name in klass.__dict__.get('__slots__', ())
+                          if name not in ('_lock', '__weakref__')])
+        _slotCache[cls] = names
+        return names
+
+
+#Compiled calcColumn expressions
+EXPRESSION_CACHE = ExpressionCache()
+
+
 class DataContainer(object):
     u"""DataContainer \t- Base class for self-explanatory scientific data
 \nDataContainer presents the following attributes:
@@ -103,15 +332,27 @@ class DataContainer(object):
 \t  .label\t- Typical axis description composed from the meta
 \t\t\t  information of the DataContainer.
     """
-    id = None
-    hash = None
+    __slots__ = ('longname', 'shortname', 'machine', 'creator', 'attributes',
+                 'id', 'hash', 'timestamp', '_lock', '__weakref__')
     masterLock = threading.Lock()
 
-    def __init__(self, longname, shortname, attributes=None):
+    def __new__(cls, *args, **kwargs):
+        self = object.__new__(cls)
+        object.__setattr__(self, 'id', None)
+        object.__setattr__(self, 'hash', None)
+        return self
+
+    def __init__(self, longname, shortname, attributes=None, source=None):
+        u"""source -- optional DataContainer this one is derived from,
+        whose machine and creator are taken over."""
         self.longname = longname
         self.shortname = shortname
-        self.machine = Helpers.getMachine()
-        self.creator = Helpers.getUsername()
+        if source is None:
+            self.machine = Helpers.getMachine()
+            self.creator = Helpers.getUsername()
+        else:
+            self.machine = source.machine
+            self.creator = source.creator
         if type(attributes) == type({}):
             self.attributes = attributes
         else:
@@ -142,23 +383,29 @@ class DataContainer(object):
     lock = property(_getLock)
 
     def __getstate__(self):
-        dict = copy.copy(self.__dict__)
-        del dict['_lock']
-        return dict
+        state = dict([(name, getattr(self, name))
+                      for name in _slotNames(type(self))
+                      if hasattr(self, name)])
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            object.__setattr__(self, name, value)
 
     def __setattr__(self, attr, value):
-        self.lock.acquire()
-        if not self.id:
-            super(DataContainer, self).__setattr__(attr, value)
-        else:
+        # Unsealed containers are only visible to the thread building
+        # them, hence the lock is first needed by seal(). The id is
+        # assigned last in seal(), which makes it the sealed flag.
+        if self.id:
             raise TypeError(
                 "This DataContainer has been sealed and cannot"
                 "be modified anymore.")
-        self.lock.release()
+        object.__setattr__(self, attr, value)
 
     def generateHash(self, m=None):
         if m == None:
-            m = hashlib.md5()
+            m = _hashAlgorithm.new()
         m.update(self.longname)
         m.update(self.shortname)
         m.update(self.machine)
@@ -214,11 +461,12 @@ class SampleContainer(DataContainer):
 \t\t\t  of the DataContainer.
 """
     typeString = u"sample"
+    __slots__ = ('_columns', 'longnames', 'shortnames')
 
     def __init__(self, columns, longname='Realizations of random variable',
-                 shortname='X', attributes=None):
+                 shortname='X', attributes=None, source=None):
         """columns: List of FieldContainer"""
-        DataContainer.__init__(self, longname, shortname, attributes)
+        DataContainer.__init__(self, longname, shortname, attributes, source)
         self._setColumns(columns)
 
     def _setColumns(self, columns):
@@ -240,12 +488,14 @@ class SampleContainer(DataContainer):
 
     def generateHash(self, m=None):
         if m == None:
-            m = hashlib.md5()
+            m = _hashAlgorithm.new()
         super(SampleContainer, self).generateHash(m)
         m.update(u''.join([c.hash for c in self.columns]))
-        return enc(m.hexdigest())
+        return tagHash(m.hexdigest())
 
     def __deepcopy__(self, memo):
+        if self.id:
+            return self
         self.lock.acquire()
         res = SampleContainer.__new__(SampleContainer)
         res.columns = copy.deepcopy(self.columns, memo)
@@ -257,9 +507,22 @@ class SampleContainer(DataContainer):
         self.lock.release()
         return res
 
+    def derive(self, **changes):
+        u"""Returns an unsealed SampleContainer built from this one.
+        Keyword arguments replace the respective constructor arguments.
+        Columns which are not replaced are copied, sealed ones are shared
+        by reference."""
+        kwargs = {'longname': self.longname, 'shortname': self.shortname}
+        if 'columns' not in changes:
+            kwargs['columns'] = copy.deepcopy(self.columns)
+        if 'attributes' not in changes:
+            kwargs['attributes'] = copy.deepcopy(self.attributes)
+        kwargs.update(changes)
+        return SampleContainer(source=self, **kwargs)
+
     def seal(self, id=None):
         self.lock.acquire()
-        [c.seal(c.id) for c in self.columns]
+        sealConcurrently(self.columns)
         super(SampleContainer, self).seal(id)
         self.lock.release()
 
@@ -369,25 +632,14 @@ class SampleContainer(DataContainer):
             exprStr = "col('t') >= '4 s'"
             exprStr = "col('s') > '1 m' and COL('Time') == '3s'"
 
+        The compiled expressions are kept in EXPRESSION_CACHE for
+        SampleContainers with the same column names and units.
+
         """
         exprStr = exprStr or 'True'
-        import ast
-        rpn = ReplaceName(self)
-        expr = compile(exprStr, "<calcColumn>", 'eval', ast.PyCF_ONLY_AST)
-        replacedExpr = rpn.visit(expr)
-        rpc = ReplaceCompare(rpn.localDict)
-        factorExpr = rpc.visit(replacedExpr)
-        rpo = ReplaceOperator(rpn.localDict)
-        factorExpr = rpo.visit(factorExpr)
-        localDict = dict([(key, value.data) \
-                          for key, value in rpn.localDict.iteritems()])
-        numpyDict = {'logical_and': numpy.logical_and,
-                     'logical_or': numpy.logical_or,
-                     'logical_not': numpy.logical_not}
-        localDict.update(numpyDict)
-        data = eval(compile(factorExpr, '<calcColumn>', 'eval'), {}, localDict)
-        unitcalc = UnitCalculator(rpn.localDict)
-        unit, dims = unitcalc.getUnitAndDim(replacedExpr)
+        compiled = EXPRESSION_CACHE.get(exprStr, self)
+        data, dims = compiled.evaluate(self.columns)
+        unit = compiled.unit
         if dims is None:
             assert not isinstance(data, numpy.ndarray)
             for col in self.columns:
@@ -436,33 +688,54 @@ class SampleContainer(DataContainer):
 
         Parameters
         ----------
-        mask : numpy array of Boolean values
-            The length of the array has to be equal to the length of the columns
-            of the SampleContainer. If the value of mask[n] is
+        mask : numpy array of Boolean values or of row indices, or a slice
+            The length of a Boolean array has to be equal to the length of
+            the columns of the SampleContainer. If the value of mask[n] is
             True, the nth row is part of the result, else it is discarded.
+            A slice reads only its rows of lazily loaded columns.
 
         shortname, longname : str
             Specify the short and long name of the resulting FC.
 
         """
+        if isinstance(mask, slice):
+            indices = mask
+        else:
+            mask = numpy.asarray(mask)
+            if mask.dtype == bool:
+                indices = numpy.flatnonzero(mask)
+            else:
+                #An empty list of indices would be float64 otherwise.
+                indices = numpy.asarray(mask, dtype=numpy.intp)
+        #Columns sharing a primary dimension share its taken rows.
+        taken = {}
         maskedcolumns = []
         for col in self.columns:
-            try:
-                maskedcol = col.getMaskedFC(mask)
-            except ValueError:
-                raise ValueError(
-                    'Column "' + col.longname + '" has not enough rows!'
-                    )
-            except AttributeError:
+            if not isinstance(col, FieldContainer):
                 raise AttributeError(
                     "Masking of SampleContainers as columns is not supported."
                     )
+            rows = col._getShape('data')[0]
+            if not isinstance(indices, slice) and (
+                (mask.dtype == bool and len(mask) != rows)
+                or (len(indices) > 0 and indices.max() >= rows)):
+                raise ValueError(
+                    'Column "' + col.longname + '" has not enough rows!'
+                    )
+            dim = col.dimensions[0]
+            if isinstance(dim, IndexMarker):
+                maskedcol = col.takeRows(indices)
+            else:
+                if id(dim) not in taken:
+                    taken[id(dim)] = (dim, dim.takeRows(indices))
+                maskedcol = col.takeRows(indices, taken[id(dim)][1])
             maskedcolumns.append(maskedcol)
         #build new SampleContainer from masked columns and return it
         result = SampleContainer(maskedcolumns,
                                  longname=longname,
                                  shortname=shortname,
-                                 attributes=copy.deepcopy(self.attributes))
+                                 attributes=copy.deepcopy(self.attributes),
+                                 source=self)
         return result
 
 
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the executors, which are used by CalculatingPlugs
+to gather the results of their upstream plugs and to call the
+calculating method of their worker.
+
+The following executors are available:
+
+ - L{ThreadExecutor} pulls each socket in a thread of its own and calls
+   the worker method in the calling thread. This is the default.
+ - L{InlineExecutor} pulls all sockets one after another in the calling
+   thread and does not start any threads at all.
+ - L{ProcessExecutor} pulls the sockets like the ThreadExecutor, but the
+   worker methods are called in a pool of processes. DataContainers
+   are handed over between the processes by their emd5 through the
+   temporary storage of the KnowledgeManager.
+
+The executor of a whole recipe is set by CompositeWorker.setExecutor(),
+the executor of a single plug by assigning its .executor attribute.
+"""
+
+from __future__ import with_statement
+import Queue
+import threading
+
+
+class ThreadExecutor(object):
+    """
+    Pulls every socket in its own thread (see Connectors.Computer).
+    """
+    #The worker methods are called in the calling thread, such that the
+    #plugs can track which parameters the methods read.
+    tracksParamReads = True
+
+    def collectInputs(self, sockets, subscriber=None):
+        """
+        Returns a dictionary mapping socket names to the results of the
+        plugs connected to the sockets.
+        sockets -- list of (name, socket) tuples
+        subscriber -- subscriber passed to Socket.getResult()
+        """
+        from pyphant.core.Connectors import (
+            Computer, CancelToken, CancellableSubscriber, CancelledError,
+            getCancelToken)
+        exception_queue = Queue.Queue()
+        #The first failing branch cancels its siblings.
+        token = CancelToken(getCancelToken(subscriber))
+        branchSubscriber = CancellableSubscriber(token, subscriber)
+
+        def pull(socket):
+            def getResult(subscriber):
+                try:
+                    return socket.getResult(subscriber)
+                except Exception:
+                    token.cancel(u"A sibling branch has failed.")
+                    raise
+            return getResult
+        computers = [(name, Computer(pull(socket), exception_queue,
+                                     subscriber=branchSubscriber))
+                     for name, socket in sockets]
+        for name, computer in computers:
+            computer.start()
+        for name, computer in computers:
+            computer.join()
+        exceptions = []
+        while not exception_queue.empty():
+            exceptions.append(exception_queue.get())
+            exception_queue.task_done()
+        if len(exceptions) > 0:
+            failures = [e for e in exceptions
+                        if not isinstance(e, CancelledError)]
+            if not failures:
+                raise exceptions[0]
+            raise RuntimeError(str(failures))
+        return dict([(name, computer.result) for name, computer in computers])
+
+    def callMethod(self, plug, inputs, updater):
+        """
+        Calls the calculating method of the plug and returns its result.
+        plug -- CalculatingPlug whose method is called
+        inputs -- dictionary as returned by collectInputs()
+        updater -- Connectors.Updater passed as subscriber to the method
+        """
+        method = getattr(plug.worker, plug._methodName)
+        return method(subscriber=updater, **inputs)
+
+
+class InlineExecutor(ThreadExecutor):
+    """
+    Pulls all sockets sequentially in the calling thread.
+    """
+    def collectInputs(self, sockets, subscriber=None):
+        return dict([(name, socket.getResult(subscriber))
+                     for name, socket in sockets])
+
+
+def _getWorkerState(worker):
+    """
+    Returns the class, the annotations and the parameter values of the
+    worker, which are sufficient to call its methods in another process.
+    Pickling the worker itself would pickle the whole recipe.
+    """
+    params = dict([(name, param.value)
+                   for name, param in worker._params.iteritems()])
+    return (worker.__class__, dict(worker.getAnnotations()), params)
+
+
+def _createWorker(workerState):
+    cls, annotations, params = workerState
+    worker = cls(None, annotations)
+    for name, value in params.iteritems():
+        worker.getParam(name).overrideValue(value)
+    return worker
+
+
+class _RemoteCancelToken(object):
+    """
+    CancelToken of the child processes, which is cancelled by setting
+    an Event shared with the parent process.
+    """
+    def __init__(self, event):
+        self.event = event
+
+    def isCancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        from pyphant.core.Connectors import CancelledError
+        if self.isCancelled():
+            raise CancelledError(u"The calculation has been cancelled.")
+
+
+class _ProgressSubscriber(object):
+    """
+    Subscriber of the child processes putting the progress of the
+    worker method into a queue of the parent process.
+    """
+    def __init__(self, queue, cancelled):
+        self.queue = queue
+        self.cancelToken = _RemoteCancelToken(cancelled)
+
+    def updateProcess(self, process, percentage):
+        self.queue.put(percentage)
+
+
+def _callInProcess(workerState, methodName, inputIds, inputs, progress,
+                   cancelled):
+    """
+    Entry point of the ProcessExecutor's child processes. Returns a tuple
+    (emd5, None) if the result is a DataContainer and (None, result)
+    otherwise.
+    """
+    from pyphant.core.KnowledgeManager import KnowledgeManager
+    from pyphant.core.DataContainer import DataContainer
+    from pyphant.core.Connectors import Updater
+    km = KnowledgeManager.getInstance()
+    for name, dcId in inputIds.iteritems():
+        inputs[name] = km.getDataContainer(dcId)
+    method = getattr(_createWorker(workerState), methodName)
+    updater = Updater(_ProgressSubscriber(progress, cancelled), None)
+    result = method(subscriber=updater, **inputs)
+    if isinstance(result, DataContainer):
+        result.seal()
+        km.registerDataContainer(result, temporary=True)
+        return (result.id, None)
+    return (None, result)
+
+
+class ProcessExecutor(ThreadExecutor):
+    """
+    Calls the worker methods in a pool of processes, such that
+    independent branches of a recipe are not serialized by the GIL.
+
+    DataContainers are sealed and registered temporarily with the
+    KnowledgeManager, only their emd5 is passed to the child processes.
+    The results are handed back the same way. All other values are
+    pickled. The workers are rebuilt in the child processes from their
+    class and parameter values, hence worker methods must not rely on
+    other state of their worker. Progress of the worker methods is
+    forwarded to the subscriber of the parent process. If the
+    calculation is cancelled or times out, the parent process raises
+    at once and the worker method in the child process is cancelled
+    upon its next progress update. Worker methods not reporting their
+    progress keep their process of the pool busy until they return.
+    """
+    #Seconds between two polls for progress of the child process
+    pollInterval = 0.05
+
+    tracksParamReads = False
+
+    def __init__(self, processes=None):
+        """
+        processes -- number of processes, defaults to the number of CPUs
+        """
+        self.processes = processes
+        self._pool = None
+        self._manager = None
+        self._poolLock = threading.Lock()
+
+    def __getstate__(self):
+        return {'processes': self.processes}
+
+    def __setstate__(self, pdict):
+        self.__init__(pdict['processes'])
+
+    def _getPool(self):
+        with self._poolLock:
+            if self._pool is None:
+                from multiprocessing import Pool
+                from pyphant.core.KnowledgeManager import KnowledgeManager
+                # The KnowledgeManager has to be instantiated before forking.
+                # Otherwise each child would create its own instance and
+                # clear the temporary storage the results are passed by.
+                KnowledgeManager.getInstance()
+                self._pool = Pool(self.processes)
+            return self._pool
+
+    def _createChannels(self):
+        """
+        Returns a Queue for the progress and an Event for the
+        cancellation of a call in a child process.
+        """
+        with self._poolLock:
+            if self._manager is None:
+                from multiprocessing import Manager
+                self._manager = Manager()
+            return self._manager.Queue(), self._manager.Event()
+
+    def close(self):
+        """
+        Terminates the pool of processes. A new pool is started when
+        the executor is used again.
+        """
+        with self._poolLock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+    def callMethod(self, plug, inputs, updater):
+        from pyphant.core.KnowledgeManager import KnowledgeManager
+        from pyphant.core.DataContainer import DataContainer
+        pool = self._getPool()
+        km = KnowledgeManager.getInstance()
+        inputIds = {}
+        values = {}
+        for name, value in inputs.iteritems():
+            if isinstance(value, DataContainer):
+                value.seal()
+                km.registerDataContainer(value, temporary=True)
+                inputIds[name] = value.id
+            else:
+                values[name] = value
+        progress, cancelled = self._createChannels()
+        asyncResult = pool.apply_async(
+            _callInProcess, (_getWorkerState(plug.worker), plug._methodName,
+                             inputIds, values, progress, cancelled))
+        try:
+            while True:
+                asyncResult.wait(self.pollInterval)
+                ready = asyncResult.ready()
+                while not progress.empty():
+                    updater %= progress.get()
+                if ready:
+                    break
+                updater.checkCancelled()
+        except Exception:
+            #The result of the abandoned call is discarded.
+            cancelled.set()
+            raise
+        resultId, result = asyncResult.get()
+        if resultId is not None:
+            result = km.getDataContainer(resultId)
+        return result
+
+
+#Executor used by plugs, which are not part of a CompositeWorker
+#with an executor of its own.
+DEFAULT_EXECUTOR = ThreadExecutor()
@@ -59,11 +59,15 @@ import copy
 import hashlib
 import numpy
 from pyphant.quantities import (isQuantity, Quantity, _prefixes)
-from pyphant.core.DataContainer import DataContainer, enc, _logger
+from pyphant.core.DataContainer import (DataContainer, enc, _logger,
+                                        hashArray, tagHash, sealConcurrently,
+                                        getHashAlgorithm)
 from types import NoneType
 
 #Default variables of indices
 INDEX_NAMES = [u'i', u'j', u'k', u'l', u'm', u'n']
+#Size of the blocks in which FieldContainer arithmetic is evaluated
+BLOCK_BYTES = 1 << 24
 PREFIXES_METER = copy.deepcopy(_prefixes)
 map(lambda r: PREFIXES_METER.remove(r), [('h', 1.e2), ('da', 1.e1)])
 PREFIXES_METER.append(('', 1.0))
@@ -72,6 +76,7 @@ map(lambda r: PREFIXES.remove(r), [('d', 1.e-1), ('c', 1.e-2)])
 
 
 class IndexMarker(object):
+    __slots__ = ()
     hash = hashlib.md5().hexdigest()
     shortname = u"i"
     longname = u"index"
@@ -89,6 +94,9 @@ class IndexMarker(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __deepcopy__(self, memo):
+        return self
+
     def isValid(self):
         return True
 
@@ -106,18 +114,34 @@ class IndexMarker(object):
 INDEX = [IndexMarker()]
 
 
-def generateIndex(i, n, indexNames=INDEX_NAMES):
+def generateIndex(i, n, indexNames=INDEX_NAMES, source=None):
     u"""Returns a FieldContainer for index variables.
     It stores an index vector (0,...,n-1)^T, whose short name
     will be given by the i. element of list indexNames, if i<=n,
-    and 'i_\%i' %i otherwise.
+    and 'i_\%i' %i otherwise. Machine and creator are taken from
+    source, if given.
     """
     if i < len(indexNames):
         name = u"%s" % (indexNames[i], )
     else:
         name = u"i_%i" % (i, )
     return FieldContainer(scipy.arange(0, n), dimensions=INDEX,
-                          longname=u"Index", shortname=name)
+                          longname=u"Index", shortname=name, source=source)
+
+
+def _iterBlocks(shape, blockBytes=None):
+    u"""Yields regions splitting an array of the given shape along its
+    first axis into blocks of about blockBytes (default: BLOCK_BYTES)
+    for float64 elements."""
+    if blockBytes is None:
+        blockBytes = BLOCK_BYTES
+    if len(shape) == 0:
+        yield ()
+        return
+    rowBytes = 8 * int(numpy.prod(shape[1:]))
+    rows = max(1, blockBytes // max(1, rowBytes))
+    for start in xrange(0, max(1, shape[0]), rows):
+        yield (slice(start, start + rows), )
 
 
 class DimensionList(list):
@@ -164,6 +188,8 @@ def slice2ind(arg, dim):
         except SyntaxError:
             li, hi = [float(i) / unit for i in sl]
         f = dim.data
+        if f.ndim == 1 and len(f) > 0 and _isIncreasing(dim):
+            return _searchInterval(f, li, hi)
         intervallElements = numpy.logical_and(f >= li, f < hi)
         if numpy.alltrue(intervallElements):
             start = 0
@@ -193,6 +219,50 @@ def slice2ind(arg, dim):
         return arg
 
 
+#Maps hashes of sealed dimensions to whether their data is increasing
+_increasing = {}
+_INCREASING_MAX_ENTRIES = 1024
+
+
+def _isIncreasing(dim):
+    u"""Returns whether the 1-d data of dim is monotonically increasing.
+    The O(n) check is done only once for sealed dimensions."""
+    if dim.hash is None:
+        f = dim.data
+        return bool(numpy.all(f[1:] >= f[:-1]))
+    try:
+        return _increasing[dim.hash]
+    except KeyError:
+        f = dim.data
+        increasing = bool(numpy.all(f[1:] >= f[:-1]))
+        if len(_increasing) >= _INCREASING_MAX_ENTRIES:
+            _increasing.clear()
+        _increasing[dim.hash] = increasing
+        return increasing
+
+
+def _searchInterval(f, li, hi):
+    u"""Returns the slice of the monotonically increasing array f, which
+    slice2ind determines for the interval [li, hi), by binary search."""
+    n = len(f)
+    start = f.searchsorted(li, 'left')
+    end = f.searchsorted(hi, 'left')
+    if start == 0 and end == n:
+        return slice(0, n + 1)
+    if start == end:
+        raise NotImplementedError(
+            "This slice needs interpolation, "
+            "which is not implemented yet."
+            )
+    if li <= f[0]:
+        return slice(0, end)
+    elif hi > f[-1]:
+        return slice(start, n + 1)
+    elif hi == f[-1]:
+        return slice(start, n)
+    return slice(start, end)
+
+
 class FieldContainer(DataContainer):
     u"""FieldContainer(data, unit=1, error=None,dimensions=None, longname=u"Sampled Field",
 \t\t\t  shortname=u"\\Psi",rescale=False)
@@ -215,11 +285,13 @@ class FieldContainer(DataContainer):
 Concerning the ordering of data matrices and the dimension list consult http://wiki.pyphant.org/xwiki/bin/view/Main/Dimension+Handling+in+Pyphant.
 """
     typeString = u"field"
+    __slots__ = ('data', 'mask', 'unit', 'error', '_dimensions')
 
     def __init__(self, data, unit=1, error=None, mask=None,
                  dimensions=None, longname=u"Sampled Field",
-                 shortname=u"\\Psi", attributes=None, rescale=False):
-        DataContainer.__init__(self, longname, shortname, attributes)
+                 shortname=u"\\Psi", attributes=None, rescale=False,
+                 source=None):
+        DataContainer.__init__(self, longname, shortname, attributes, source)
         self.data = data
         self.mask = mask
         try:
@@ -239,7 +311,8 @@ Concerning the ordering of data matrices and the dimension list consult http://w
         else:
             N = len(data.shape) - 1
             self.dimensions = [
-                generateIndex(N - i, n) for i, n in enumerate(data.shape)
+                generateIndex(N - i, n, source=self)
+                for i, n in enumerate(data.shape)
                 ]
         if rescale:
             self.rescale()
@@ -297,6 +370,8 @@ Concerning the ordering of data matrices and the dimension list consult http://w
     rawDataBytes = property(_getRawDataBytes)
 
     def __deepcopy__(self, memo):
+        if self.id:
+            return self
         self.lock.acquire()
         data = copy.deepcopy(self.data, memo)
         data.setflags(write=True)
@@ -308,25 +383,42 @@ Concerning the ordering of data matrices and the dimension list consult http://w
             error.setflags(write=True)
         dimensions = copy.deepcopy(self._dimensions, memo)
         res = FieldContainer(data, self.unit, error, mask, dimensions,
-                             self.longname, self.shortname)
+                             self.longname, self.shortname, source=self)
         self.lock.release()
         return res
 
+    def derive(self, **changes):
+        u"""Returns an unsealed FieldContainer built from this one.
+        Keyword arguments replace the respective constructor arguments.
+        Arrays which are not replaced are copied, hence writable, while
+        sealed dimensions are shared by reference."""
+        kwargs = {'unit': self.unit, 'longname': self.longname,
+                  'shortname': self.shortname}
+        for name in ['data', 'mask', 'error']:
+            if name not in changes:
+                value = getattr(self, name)
+                if value is not None:
+                    value = value.copy()
+                kwargs[name] = value
+        if 'dimensions' not in changes:
+            kwargs['dimensions'] = copy.deepcopy(self._dimensions)
+        if 'attributes' not in changes:
+            kwargs['attributes'] = copy.deepcopy(self.attributes)
+        kwargs.update(changes)
+        return FieldContainer(source=self, **kwargs)
+
     def generateHash(self, m=None):
         if m == None:
-            m = hashlib.md5()
+            m = getHashAlgorithm().new()
         super(FieldContainer, self).generateHash(m)
-        #m.update(str(self.data.tolist()))
-        m.update(self.data.dumps())
+        hashArray(m, self.data)
         m.update(str(self.unit))
         if self.error != None:
-            #m.update(str(self.error.tolist()))
-            m.update(self.error.dumps())
+            hashArray(m, self.error)
         if self.mask != None:
-            #m.update(str(self.mask.tolist()))
-            m.update(self.mask.dumps())
+            hashArray(m, self.mask)
         [m.update(dim.hash) for dim in self._dimensions]
-        return enc(m.hexdigest())
+        return tagHash(m.hexdigest())
 
     def seal(self, id=None):
         with self.lock:
@@ -338,8 +430,7 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                 self.error.setflags(write=False)
             if not id:
                 self._dimensions.write = False
-                for dim in self._dimensions:
-                    dim.seal()
+                sealConcurrently(self._dimensions)
             super(FieldContainer, self).seal(id)
 
     def inUnitsOf(self, other):
@@ -368,12 +459,11 @@ Concerning the ordering of data matrices and the dimension list consult http://w
             factor = self.unit.inUnitsOf(
                 other.unit.unit
                 ).value / other.unit.value
-        newSelf = copy.deepcopy(self)
-        newSelf.data *= factor
-        if newSelf.error != None:
-            newSelf.error *= factor
-        newSelf.unit = copy.deepcopy(other.unit)
-        return newSelf
+        error = self.error
+        if error != None:
+            error = error * factor
+        return self.derive(data=self.data * factor, error=error,
+                           unit=copy.deepcopy(other.unit))
 
     def rescale(self):
         if isQuantity(self.unit):
@@ -413,7 +503,7 @@ Concerning the ordering of data matrices and the dimension list consult http://w
         self.unit = newUnit / unitAmplitude
 
     def __eq__(self, other, rtol=1e-5, atol=1e-8):
-        if type(self) != type(other):
+        if not isinstance(other, FieldContainer):
             if type(other) != IndexMarker and type(other) != NoneType:
                 _logger.debug(
                     'Cannot compare objects '
@@ -422,6 +512,9 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                         )
                     )
             return False
+        if self.id is not None and other.id is not None \
+               and self.hash == other.hash:
+            return True
         if not (self.typeString == other.typeString):
             _logger.debug('The typeString is not identical.')
             return False
@@ -590,101 +683,104 @@ Concerning the ordering of data matrices and the dimension list consult http://w
 
     def __add__(self, other):
         if isinstance(other, FieldContainer):
-            if self.error != None or other.error != None:
-                return NotImplemented
-            else:
-                error = None
-            if len(self._dimensions) != len(other.dimensions):
-                return NotImplemented
-            for i in xrange(len(self._dimensions)):
-                if not self._dimensions[i] == other.dimensions[i]:
-                    return NotImplemented
-            if isQuantity(self.unit):
-                if not isQuantity(other.unit):
-                    return NotImplemented
-                if not self.unit.isCompatible(other.unit.unit):
-                    return NotImplemented
-                if self.unit >= other.unit:
-                    data = self.data + (
-                        other.data * other.unit.value *
-                        other.unit.unit.conversionFactorTo(self.unit.unit)
-                        ) / self.unit.value
-                    unit = self.unit
-                else:
-                    data = other.data + (
-                        self.data * self.unit.value *
-                        self.unit.unit.conversionFactorTo(other.unit.unit)
-                        ) / other.unit.value
-                    unit = other.unit
-            elif isQuantity(other.unit):
-                return NotImplemented
-            else:
-                data = (self.data * self.unit) + (other.data * other.unit)
-                unit = 1.0
-            if self.mask == None:
-                mask = other.mask
-            elif other.mask == None:
-                mask = self.mask
-            else:
-                mask = self.mask + other.mask
-            longname = u"Sum of %s and %s." % (self.longname, other.longname)
-            shortname = u"%s + %s" % (self.shortname, other.shortname)
-            return FieldContainer(data, unit, error, mask,
-                                  copy.deepcopy(self._dimensions),
-                                  longname, shortname)
+            return self.add(other)
         return NotImplemented
 
     def __sub__(self, other):
         if isinstance(other, FieldContainer):
-            if self.error != None or other.error != None:
-                error = other.error + self.error
-            else:
-                error = None
-            if len(self._dimensions) != len(other.dimensions):
-                return NotImplemented
-            for i in xrange(len(self._dimensions)):
-                if not self._dimensions[i] == other.dimensions[i]:
-                    return NotImplemented
-            if isQuantity(self.unit):
-                if not (
-                    isQuantity(other.unit) and
-                    self.unit.isCompatible(other.unit.unit)
-                    ):
-                    return NotImplemented
-                if self.unit >= other.unit:
-                    data = self.data - (
-                        other.data * other.unit.value *
-                        other.unit.unit.conversionFactorTo(self.unit.unit)
-                        ) / self.unit.value
-                    unit = self.unit
-                else:
-                    data = (
-                        (
-                            self.data * self.unit.value *
-                            self.unit.unit.conversionFactorTo(other.unit.unit)
-                            ) / other.unit.value
-                        ) - other.data
-                    unit = other.unit
-            else:
-                if isQuantity(other.unit):
-                    return NotImplemented
-                data = (self.data * self.unit) - (other.data * other.unit)
-                unit = 1.0
-            if self.mask == None:
-                mask = other.mask
-            elif other.mask == None:
-                mask = self.mask
-            else:
-                mask = self.mask + other.mask
-            longname = u"Difference of %s and %s." % (
-                self.longname, other.longname
-                )
-            shortname = u"%s - %s" % (self.shortname, other.shortname)
-            return FieldContainer(data, unit, error, mask,
-                                  copy.deepcopy(self._dimensions),
-                                  longname, shortname)
+            return self.subtract(other)
         return NotImplemented
 
+    def add(self, other, out=None):
+        u"""Returns the sum of this and the other FieldContainer in the
+        larger of both units or NotImplemented for incompatible fields.
+        The sum is evaluated block-wise along the first axis, hence lazily
+        loaded fields are not read completely at once. If given, the
+        result is written to out, e.g. a numpy.memmap."""
+        if self._getShape('error') is not None \
+               or other._getShape('error') is not None:
+            return NotImplemented
+        longname = u"Sum of %s and %s." % (self.longname, other.longname)
+        shortname = u"%s + %s" % (self.shortname, other.shortname)
+        return self._combine(other, numpy.add, longname, shortname, out)
+
+    def subtract(self, other, out=None):
+        u"""Returns the difference of this and the other FieldContainer,
+        see add()."""
+        longname = u"Difference of %s and %s." % (
+            self.longname, other.longname
+            )
+        shortname = u"%s - %s" % (self.shortname, other.shortname)
+        return self._combine(other, numpy.subtract, longname, shortname,
+                             out)
+
+    def _getCombination(self, other):
+        u"""Returns (factor, otherFactor, unit), such that the data of the
+        combination in unit is composed of self.data * factor and
+        other.data * otherFactor. A factor None means no scaling. Returns
+        None for incompatible units."""
+        if isQuantity(self.unit):
+            if not (
+                isQuantity(other.unit) and
+                self.unit.isCompatible(other.unit.unit)
+                ):
+                return None
+            if self.unit >= other.unit:
+                return (None, other.unit.value *
+                        other.unit.unit.conversionFactorTo(self.unit.unit) /
+                        self.unit.value, self.unit)
+            return (self.unit.value *
+                    self.unit.unit.conversionFactorTo(other.unit.unit) /
+                    other.unit.value, None, other.unit)
+        elif isQuantity(other.unit):
+            return None
+        return (self.unit, other.unit, 1.0)
+
+    def _combine(self, other, operation, longname, shortname, out=None):
+        if len(self._dimensions) != len(other.dimensions):
+            return NotImplemented
+        for i in xrange(len(self._dimensions)):
+            if not self._dimensions[i] == other.dimensions[i]:
+                return NotImplemented
+        combination = self._getCombination(other)
+        if combination is None:
+            return NotImplemented
+        factor, otherFactor, unit = combination
+        shape = self._getShape('data')
+        hasMask = [field._getShape('mask') is not None
+                   for field in [self, other]]
+        hasError = [field._getShape('error') is not None
+                    for field in [self, other]]
+        mask = None
+        error = None
+        if True in hasMask:
+            mask = numpy.empty(shape, dtype=bool)
+        if True in hasError:
+            error = numpy.empty(shape)
+        for region in _iterBlocks(shape):
+            data = self._readRegion('data', region)
+            if factor is not None:
+                data = data * factor
+            otherData = other._readRegion('data', region)
+            if otherFactor is not None:
+                otherData = otherData * otherFactor
+            data = operation(data, otherData)
+            if out is None:
+                out = numpy.empty(shape, dtype=data.dtype)
+            out[region] = data
+            if mask is not None:
+                masks = [field._readRegion('mask', region)
+                         for field, present in zip([self, other], hasMask)
+                         if present]
+                mask[region] = reduce(numpy.logical_or, masks)
+            if error is not None:
+                #Errors are added without unit conversion.
+                error[region] = other._readRegion('error', region) \
+                                + self._readRegion('error', region)
+        return FieldContainer(out, unit, error, mask,
+                              copy.deepcopy(self._dimensions),
+                              longname, shortname, source=self)
+
     def __str__(self):
         deps = [
             dim for dim in self._dimensions if type(dim) != type(IndexMarker())
@@ -709,21 +805,22 @@ Concerning the ordering of data matrices and the dimension list consult http://w
         if isinstance(args, type("")):
             args = [args]
         if isinstance(args, type(1)):
-            if args >= len(self.data):
+            if args >= self._getShape('data')[0]:
                 raise IndexError('index out of bound')
         try:
             len(args)
         except:
             args = [args]
-        args = [
+        args = tuple([
             slice2ind(
                 arg, self._dimensions[dim]
                 ) for dim, arg in enumerate(args)
-            ]
-        data = self.data[args]
-        attributes = copy.deepcopy(self.attributes)
-        mask = None
-        error = None
+            ])
+        data = self._readRegion('data', args)
+        if self.id is None:
+            attributes = copy.deepcopy(self.attributes)
+        else:
+            attributes = dict(self.attributes)
         dimensions = []
         for i, l in enumerate(data.shape[:len(args)]):
             dim = self._dimensions[i]
@@ -738,27 +835,46 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                     dimensions.append(dim[args[i], ])
         for i in xrange(len(args), len(data.shape)):
             dimensions.append(copy.deepcopy(self._dimensions[i]))
+        mask = self._readRegion('mask', args)
+        error = self._readRegion('error', args)
         if data.shape != (1,):
             data = data.squeeze()
-            if self.mask != None:
-                mask = self.mask[args].squeeze()
-            if self.error != None:
-                error = self.error[args].squeeze()
-        else:
-            if self.mask != None:
-                mask = self.mask[args]
-            if self.error != None:
-                error = self.error[args]
+            if mask is not None:
+                mask = mask.squeeze()
+            if error is not None:
+                error = error.squeeze()
+        if [arg for arg in args
+            if not isinstance(arg, (slice, int, long))] == []:
+            #Basic slices are views sharing the buffer of this field.
+            for array in [data, mask, error]:
+                if array is not None:
+                    array.setflags(write=False)
         field = FieldContainer(data, dimensions=dimensions,
                                longname=self.longname,
                                shortname=self.shortname,
                                mask=mask,
                                error=error,
                                unit=self.unit,
-                               attributes=attributes)
+                               attributes=attributes,
+                               source=self)
         return field
 
+    def _getShape(self, name):
+        u"""Returns the shape of the array name or None if it is unset."""
+        value = getattr(self, name)
+        if value is None:
+            return None
+        return value.shape
+
+    def _readRegion(self, name, region):
+        u"""Returns the region of the array name or None if it is unset."""
+        value = getattr(self, name)
+        if value is None:
+            return None
+        return value[region]
+
     def isValid(self):
+        shape = self._getShape('data')
         # Valid dimensions?
         if (
             not (
@@ -768,7 +884,7 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                     )
                 )  # IndexMarkers are valid and...
             and not (
-                self.data.shape == (1, ) and len(self._dimensions) == 0
+                shape == (1, ) and len(self._dimensions) == 0
                 )  # ...so are zero dim fields.
             ):
             dimshape = []
@@ -777,11 +893,11 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                     _logger.debug("Dimension %s is not 1-d." % d.longname)
                     return False
                 dimshape.append(d.data.shape[0])
-            if self.data.shape != tuple(dimshape):
+            if shape != tuple(dimshape):
                 _logger.debug(
                     "Shape of data %s and of dimensions %s "
                     "do not match for field\n:%s" % (
-                        self.data.shape, dimshape, self
+                        shape, dimshape, self
                         )
                     )
                 return False
@@ -790,18 +906,20 @@ Concerning the ordering of data matrices and the dimension list consult http://w
                     _logger.debug("Invalid dimension %s." % (d.longname, ))
                     return False
         # Valid mask?
-        if (self.mask != None) and (self.data.shape != self.mask.shape):
+        maskShape = self._getShape('mask')
+        if (maskShape is not None) and (shape != maskShape):
             _logger.debug(
                 "Shape of data %s and of mask %s do not match." % (
-                    self.data.shape, self.mask.shape
+                    shape, maskShape
                     )
                 )
             return False
         # Valid error?
-        if (self.error != None) and (self.data.shape != self.error.shape):
+        errorShape = self._getShape('error')
+        if (errorShape is not None) and (shape != errorShape):
             _logger.debug(
                 "Shape of data %s and of error %s do not match." % (
-                    self.data.shape, self.error.shape
+                    shape, errorShape
                     )
                 )
             return False
@@ -831,29 +949,48 @@ Concerning the ordering of data matrices and the dimension list consult http://w
         is set to False are discarded.
         numpymask -- Numpy array with Boolean values
         """
-        mdims = []
-        for dim in self.dimensions:
-            if mdims == []:
-                # only primary axis has to be masked:
-                mdims.append(dim.getMaskedFC(numpymask))
+        numpymask = numpy.asarray(numpymask)
+        if len(numpymask) != self._getShape('data')[0]:
+            raise ValueError("Length of mask %d does not match %d rows." % (
+                len(numpymask), self._getShape('data')[0]))
+        return self.takeRows(numpy.flatnonzero(numpymask))
+
+    def takeRows(self, indices, dimension=None):
+        """
+        Return an unsealed FieldContainer instance consisting of the
+        given rows, i.e. entries along the primary axis, of this instance.
+        The unit and the remaining dimensions are shared.
+        indices -- Numpy array of row indices or a slice, which reads
+                   only these rows of lazily loaded fields
+        dimension -- primary dimension with the rows taken already,
+                     which lets columns sharing a dimension share its rows
+        """
+        if not isinstance(indices, slice):
+            indices = numpy.asarray(indices, dtype=numpy.intp)
+        if dimension is None:
+            dimension = self._dimensions[0]
+            if isinstance(dimension, IndexMarker):
+                dimension = IndexMarker()
             else:
-                mdims.append(copy.deepcopy(dim))
-        to_mask = [self.data, self.error, self.mask]
-        masked = []
-        for item in to_mask:
-            if item != None:
-                masked.append(item[numpymask])
+                dimension = dimension.takeRows(indices)
+        taken = []
+        for name in ['data', 'error', 'mask']:
+            if isinstance(indices, slice):
+                value = self._readRegion(name, (indices, ))
             else:
-                masked.append(None)
-        return FieldContainer(masked[0],
-                              copy.deepcopy(self.unit),
-                              masked[1],
-                              masked[2],
-                              mdims,
+                value = getattr(self, name)
+                if value is not None:
+                    value = numpy.take(value, indices, axis=0)
+            taken.append(value)
+        dimensions = [dimension] + [copy.deepcopy(dim)
+                                    for dim in self._dimensions[1:]]
+        return FieldContainer(taken[0], self.unit, taken[1], taken[2],
+                              dimensions,
                               longname=self.longname,
                               shortname=self.shortname,
                               attributes=copy.deepcopy(self.attributes),
-                              rescale=False)
+                              rescale=False,
+                              source=self)
 
     maskedData = property(
         lambda self: numpy.ma.array(self.data, mask=self.mask)
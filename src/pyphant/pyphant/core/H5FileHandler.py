@@ -54,6 +54,24 @@ im_summary = {'id': im_id, 'longname': utf82uc(im.longname),
               'unit': 1, 'dimensions': [im_id], 'attributes': {}}
 
 
+def extractRegion(dc, region):
+    """
+    Returns the region of the given DataContainer as an unsealed
+    container derived from it. Lazily loaded containers read this
+    region only.
+    dc -- FieldContainer or SampleContainer
+    region -- index of a FieldContainer, e.g. (3, slice(0, 10)) or
+              "2mm:4mm", or rows of a SampleContainer, e.g. slice(0, 10)
+    """
+    if isinstance(dc, DataContainer.SampleContainer):
+        if isinstance(region, tuple) and len(region) == 1:
+            region = region[0]
+        if isinstance(region, (int, long)):
+            region = slice(region, region + 1)
+        return dc.extractRows(region, dc.shortname, dc.longname)
+    return dc[region]
+
+
 class H5FileHandler(object):
     """
     This class is used to handle IO operations on HDF5 files.
@@ -74,6 +92,8 @@ class H5FileHandler(object):
         self.filename = filename
         self.mode = mode
         if mode == 'w':
+            if exists:
+                PyTablesPersister.resolveStoredResults(filename)
             tmphandle = tables.openFile(self.filename, 'w')
             tmphandle.close()
             self.mode = 'a'
@@ -118,38 +138,46 @@ class H5FileHandler(object):
                 return True
         return False
 
-    def loadDataContainer(self, dcId):
+    def loadDataContainer(self, dcId, lazy=False, region=None):
         """
         Loads a DataContainer from the HDF5 file and returns it as a
         DataContainer instance.
         dcId -- emd5 of the DC to be returned
+        lazy -- whether FieldContainers are returned as LazyFieldContainers,
+                which read their arrays on demand
+        region -- if given, only this region is read and returned as an
+                  unsealed container, see extractRegion()
         """
+        if region is not None:
+            return extractRegion(self.loadDataContainer(dcId, True), region)
         resNode, uriType = self.getNodeAndTypeFromId(dcId)
         if uriType == 'field':
-            result = self.loadField(resNode)
+            result = self.loadField(resNode, lazy)
         elif uriType == 'sample':
-            result = self.loadSample(resNode)
+            result = self.loadSample(resNode, lazy)
         else:
             raise TypeError(
                 "Unknown result uriType in <%s>" % (resNode._v_title, )
                 )
         return result
 
-    def loadField(self, resNode):
+    def loadField(self, resNode, lazy=False):
         """
         Loads a FieldContainer from the given node and returns it as an
         instance. This method is intended for internal use only.
         resNode -- node at which the FieldContainer is located in the file.
+        lazy -- see loadDataContainer
         """
-        return PyTablesPersister.loadField(self.handle, resNode)
+        return PyTablesPersister.loadField(self.handle, resNode, lazy)
 
-    def loadSample(self, resNode):
+    def loadSample(self, resNode, lazy=False):
         """
         Loads a SampleContainer from the given node and returns it as an
         instance. This method is intended for internal use only.
         resNode -- node at which the SampleContainer is located in the file.
+        lazy -- see loadDataContainer
         """
-        return PyTablesPersister.loadSample(self.handle, resNode)
+        return PyTablesPersister.loadSample(self.handle, resNode, lazy)
 
     def loadSummary(self, dcId=None):
         """
@@ -222,8 +250,12 @@ class H5FileHandler(object):
             summary['attributes'] = attributes
         return summary
 
-    def loadRecipe(self):
-        return PyTablesPersister.loadRecipe(self.handle)
+    def loadRecipe(self, lazy=True):
+        """
+        Loads the recipe. If lazy is set, the results of its plugs are
+        loaded when requested first.
+        """
+        return PyTablesPersister.loadRecipe(self.handle, lazy)
 
     def saveDataContainer(self, result):
         """
@@ -31,6 +31,8 @@
 
 """This module exposes helper functions used by other parts of pyphant"""
 
+from __future__ import with_statement
+
 
 def getPyphantPath(subdir=''):
     """
@@ -52,14 +54,42 @@ def getPyphantPath(subdir=''):
     return path
 
 
+#Machine and user name of this process, looked up on first use
+_identity = {}
+
+
 def getUsername():
-    import getpass
-    return getpass.getuser()
+    """
+    Returns the name of the user running this process. The name is
+    looked up once per process, see refreshIdentity().
+    """
+    try:
+        return _identity['username']
+    except KeyError:
+        import getpass
+        return _identity.setdefault('username', getpass.getuser())
 
 
 def getMachine():
-    import socket
-    return unicode(socket.getfqdn(), 'utf-8')
+    """
+    Returns the fully qualified domain name of this machine. Since the
+    lookup may involve a DNS query, it is done once per process, see
+    refreshIdentity().
+    """
+    try:
+        return _identity['machine']
+    except KeyError:
+        import socket
+        return _identity.setdefault('machine',
+                                    unicode(socket.getfqdn(), 'utf-8'))
+
+
+def refreshIdentity():
+    """
+    Discards the cached machine and user name, such that they are looked
+    up again on their next use, e.g. after the hostname has changed.
+    """
+    _identity.clear()
 
 
 def enableLogging():
@@ -127,12 +157,142 @@ def emd52dict(emd5):
     return retdict
 
 
-def batch(recipe, input, plug, longname, dobatch=True, temporary=False):
+def _initBatch(recipe, plug):
+    """
+    Connects an Emd5Src worker to the open socket ascending from plug and
+    returns a dictionary holding the plug, the socket and the source.
+    plug -- plug or connector id of plug contained in recipe
+    """
+    if isinstance(plug, basestring):
+        plug = recipe.findConnectorForId(plug)
+    socket = recipe.getOpenSocketsForPlug(plug)[0]
+    from pyphant.core.Emd5Src import Emd5Src
+    source = Emd5Src()
+    socket.insert(source.getPlugs()[0])
+    return {'plug': plug, 'socket': socket, 'source': source}
+
+
+def _processBatchChunk(state, rows, temporary):
+    """
+    Computes the results for the given rows of a batch and saves them to
+    a single HDF5 file, which is registered by the caller. Returns the
+    filename and a list of (index, result emd5) tuples.
+    state -- dictionary as returned by _initBatch()
+    rows -- list of (index, input emd5) tuples
+    """
+    import os
+    from uuid import uuid1
+    from pyphant.core.KnowledgeManager import KM_PATH
+    from pyphant.core.H5FileHandler import H5FileHandler
+    if temporary:
+        subdir = os.path.join(KM_PATH, 'tmp', 'batch')
+    else:
+        subdir = os.path.join(KM_PATH, 'batch')
+    filename = os.path.join(getPyphantPath(subdir), uuid1().hex + '.h5')
+    results = []
+    handler = H5FileHandler(filename, 'w')
+    with handler:
+        for index, emd5 in rows:
+            state['source'].paramEmd5.value = emd5
+            resultDC = state['plug'].getResult()
+            resultDC.seal()
+            handler.saveDataContainer(resultDC)
+            results.append((index, resultDC.id))
+    return filename, results
+
+
+#State of the batch processed by a process of the pool of batch()
+_batchState = {}
+
+
+def _initBatchProcess(recipe, plugId):
+    _batchState.update(_initBatch(recipe, plugId))
+
+
+def _processBatchChunkInProcess(args):
+    rows, temporary = args
+    return _processBatchChunk(_batchState, rows, temporary)
+
+
+def _getRecipeFingerprint(recipe):
+    """
+    Returns an md5 hex digest of the classes and parameter values of
+    the workers of recipe.
+    """
+    from hashlib import md5
+    m = md5()
+    for worker in sorted(recipe.getWorkers(), key=lambda w: w.id):
+        m.update(repr((worker.id, worker.__class__.__module__,
+                       worker.__class__.__name__)))
+        for param in worker.getParamList():
+            m.update(repr((param.name, param.value)))
+    return m.hexdigest()
+
+
+def _getBatchCheckpointHeader(recipe, input, plug):
+    """
+    Returns the dictionary identifying a batch in its checkpoint file.
+    """
+    if not input.id:
+        raise ValueError("The input of a checkpointed batch has to be sealed.")
+    return {'input': input.id, 'plug': getattr(plug, 'id', plug),
+            'recipe': _getRecipeFingerprint(recipe),
+            'rows': unicode(len(input['emd5'].data))}
+
+
+def _writeBatchCheckpointHeader(checkpointFile, header):
+    checkpointFile.writelines(
+        [(u"#%s %s\n" % (key, header[key])).encode('utf-8')
+         for key in sorted(header.keys())])
+
+
+def _readBatchCheckpoint(checkpoint, km, header=None):
+    """
+    Returns the (index, result emd5) tuples recorded in the checkpoint
+    file, whose results are still known to the KnowledgeManager.
+    Returns None, if the file does not exist or if header is given and
+    differs from the header of the file, i.e. the checkpoint has been
+    written for another batch.
+    """
+    import os
+    if not os.path.exists(checkpoint):
+        return None
+    known = set(km.getEmd5List())
+    rows = []
+    fileHeader = {}
+    checkpointFile = open(checkpoint, 'r')
+    try:
+        for line in checkpointFile:
+            line = line.strip().decode('utf-8')
+            if not line:
+                continue
+            if line.startswith(u'#'):
+                key, value = (line[1:].split(None, 1) + [u''])[:2]
+                fileHeader[key] = value
+                continue
+            index, resultId = line.split(None, 1)
+            if resultId in known:
+                rows.append((int(index), resultId))
+    finally:
+        checkpointFile.close()
+    if header is not None and fileHeader != header:
+        import logging
+        logging.getLogger("pyphant").warning(
+            u"Discarding checkpoint %s of another batch." % (checkpoint, ))
+        return None
+    return rows
+
+
+def batch(recipe, input, plug, longname, dobatch=True, temporary=False,
+          processes=1, chunksize=100, checkpoint=None):
     """
     Runs the same recipe multiple times for different input data.
     The return value is either a SampleContainer similar to input
     with 'emd5' column replaced by results or the resulting
     DataContainer from plug, if dobatch is set to False.
+    The rows are processed in chunks. The results of each chunk are
+    saved to a single HDF5 file, which is registered with the
+    KnowledgeManager at once.
     recipe -- CompositeWorker instance
     input -- SampleContainer with 'emd5' column or any DataContainer if
              dobatch is set to False
@@ -144,31 +304,85 @@ def batch(recipe, input, plug, longname, dobatch=True, temporary=False):
     dobatch -- if set to False, input is treated as a single data source
     temporary -- whether to register results temporarily, only applies when
                  dobatch is set to True
+    processes -- number of processes the chunks are distributed to, each
+                 of them working on a copy of recipe. 1 processes all
+                 rows in the calling process, None uses one process per
+                 CPU. Only applies when dobatch is set to True.
+    chunksize -- number of rows per chunk
+    checkpoint -- optional filename recording the finished rows. Rows
+                  recorded by a former, interrupted call are skipped.
+                  The file is overwritten, if it has been written for
+                  another input, plug or recipe. Requires a sealed input.
     """
-    socket = recipe.getOpenSocketsForPlug(plug)[0]
-    from pyphant.core.Emd5Src import Emd5Src
-    DummyWorker = Emd5Src()
-    socket.insert(DummyWorker.getPlugs()[0])
-    DummyWorker.paramSelectby.value = u"enter emd5"
     from pyphant.core.KnowledgeManager import KnowledgeManager
     km = KnowledgeManager.getInstance()
-    if dobatch:
-        import copy
-        output = copy.deepcopy(input)
-        index = 0
-        for emd5 in input['emd5'].data:
-            DummyWorker.paramEnteremd5.value = emd5
-            resultDC = plug.getResult()
-            km.registerDataContainer(resultDC, temporary=temporary)
-            output['emd5'].data[index] = resultDC.id
-            index += 1
-        output.longname = longname
-        output.seal()
-    else:
+    if not dobatch:
+        state = _initBatch(recipe, plug)
         km.registerDataContainer(input)
-        DummyWorker.paramEnteremd5.value = input.id
-        output = plug.getResult()
-    socket.pullPlug()
+        state['source'].paramEmd5.value = input.id
+        output = state['plug'].getResult()
+        state['socket'].pullPlug()
+        return output
+    emd5s = list(input['emd5'].data)
+    resultIds = [None] * len(emd5s)
+    finishedRows = None
+    if checkpoint is not None:
+        header = _getBatchCheckpointHeader(recipe, input, plug)
+        finishedRows = _readBatchCheckpoint(checkpoint, km, header)
+        for index, resultId in finishedRows or []:
+            resultIds[index] = resultId
+    rows = [(index, emd5) for index, emd5 in enumerate(emd5s)
+            if resultIds[index] is None]
+    chunks = [rows[start:start + chunksize]
+              for start in xrange(0, len(rows), chunksize)]
+    state = None
+    pool = None
+    if processes == 1:
+        state = _initBatch(recipe, plug)
+        results = (_processBatchChunk(state, chunk, temporary)
+                   for chunk in chunks)
+    else:
+        from multiprocessing import Pool
+        if not isinstance(plug, basestring):
+            plug = plug.id
+        pool = Pool(processes, _initBatchProcess, (recipe, plug))
+        results = pool.imap_unordered(_processBatchChunkInProcess,
+                                      [(chunk, temporary) for chunk in chunks])
+    checkpointFile = None
+    if finishedRows is not None:
+        checkpointFile = open(checkpoint, 'a')
+    elif checkpoint is not None:
+        checkpointFile = open(checkpoint, 'w')
+        _writeBatchCheckpointHeader(checkpointFile, header)
+    try:
+        for filename, chunkResults in results:
+            km.registerH5(filename, temporary)
+            for index, resultId in chunkResults:
+                resultIds[index] = resultId
+            if checkpointFile is not None:
+                checkpointFile.writelines(
+                    [(u"%d %s\n" % (index, resultId)).encode('utf-8')
+                     for index, resultId in chunkResults])
+                checkpointFile.flush()
+    finally:
+        if checkpointFile is not None:
+            checkpointFile.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if state is not None:
+            state['socket'].pullPlug()
+    import copy
+    from numpy import array
+    emd5 = input['emd5']
+    columns = []
+    for column in input.columns:
+        if column is emd5:
+            columns.append(emd5.derive(data=array(resultIds)))
+        else:
+            columns.append(copy.deepcopy(column))
+    output = input.derive(columns=columns, longname=longname)
+    output.seal()
     return output
 
 
@@ -399,13 +399,21 @@ class KnowledgeManager(Singleton):
         self._cache.append(cache_item)
         self._cache_size += cache_item.size
 
-    def getDataContainer(self, dc_id, use_cache=True, try_remote=True):
+    def getDataContainer(self, dc_id, use_cache=True, try_remote=True,
+                         lazy=False, region=None):
         """
         Returns DataContainer matching the given id.
         dc_id -- Unique ID of the DataContainer (emd5)
         use_cache -- Try local cache first and cache DC for further
                      lookups (default: True)
         try_remote -- Try to get DC from remote KMs (default: True)
+        lazy -- Return locally stored FieldContainers as
+                LazyFieldContainers, which read their arrays from the
+                HDF5 file on demand and bypass the cache (default: False)
+        region -- Return only this region of the DC as unsealed container,
+                  see H5FileHandler.extractRegion. Locally stored DCs are
+                  read partially, remote KMs are asked for the region,
+                  which has to consist of indices then, see dumpRegion.
         """
         filename = None
         with SQLiteWrapper(self.dbase) as wrapper:
@@ -414,14 +422,14 @@ class KnowledgeManager(Singleton):
             except KeyError:
                 pass
         if filename != None:
-            if use_cache:
+            if use_cache and not lazy and region is None:
                 return self.getDCFromCache(dc_id, filename)
             with self.getH5FileHandler(filename) as handler:
-                dc = handler.loadDataContainer(dc_id)
+                dc = handler.loadDataContainer(dc_id, lazy, region)
             return dc
         elif try_remote and self.node != None:
             try:
-                return self.node.get_datacontainer(dc_id)
+                return self.node.get_datacontainer(dc_id, region)
             except DCNotFoundError:
                 pass
         msg = "Could not find DC with id '%s'." % dc_id
@@ -59,6 +59,52 @@ import pyphant.core.bottle
 import pkg_resources
 
 
+def _checkIndex(arg):
+    # Strings are rejected, since FieldContainer.__getitem__ passes them
+    # to Quantity, which evaluates units.
+    if arg is not None and (type(arg) not in (int, long)):
+        raise ValueError("Invalid index %r in region." % (arg, ))
+    return arg
+
+
+def dumpRegion(region):
+    """
+    Returns the region of a DataContainer, see
+    H5FileHandler.extractRegion, as JSON string. Only indices, slices
+    of indices and tuples or lists of these are allowed, i.e. no
+    quantity strings.
+    """
+    def encode(arg):
+        if isinstance(arg, slice):
+            return {'slice': [_checkIndex(arg.start), _checkIndex(arg.stop),
+                              _checkIndex(arg.step)]}
+        elif isinstance(arg, (tuple, list)):
+            return [encode(item) for item in arg]
+        return _checkIndex(arg)
+    if isinstance(region, tuple):
+        return dumps({'tuple': encode(region)})
+    return dumps(encode(region))
+
+
+def loadRegion(text):
+    """
+    Returns the region encoded by dumpRegion(). Raises ValueError for
+    anything but indices, slices of indices and tuples or lists of these.
+    """
+    def decode(arg):
+        if isinstance(arg, dict):
+            if arg.keys() == ['slice'] and isinstance(arg['slice'], list) \
+                   and len(arg['slice']) == 3:
+                return slice(*[_checkIndex(item) for item in arg['slice']])
+            elif arg.keys() == ['tuple'] and isinstance(arg['tuple'], list):
+                return tuple([decode(item) for item in arg['tuple']])
+            raise ValueError("Invalid region %r." % (arg, ))
+        elif isinstance(arg, list):
+            return [decode(item) for item in arg]
+        return _checkIndex(arg)
+    return decode(loads(text))
+
+
 class SkipError(Exception):
     pass
 
@@ -146,14 +192,23 @@ class RemoteKN(object):
                 stream.close()
             self.last_update = time()
 
-    def get_datacontainer_url(self, dc_id, skip):
+    def get_datacontainer_url(self, dc_id, skip, region=None):
+        """
+        Returns the URL of the HDF5 file holding the DC, the updated
+        skip list and the id of the DC in that file, which differs from
+        dc_id for regions, see KnowledgeManager.getDataContainer.
+        Remote KNs not supporting regions return the complete DC.
+        """
         self.update_status()
         if self._status == 1:
             if self.uuid in skip:
                 raise SkipError()
             else:
                 try:
-                    query = urlencode({'skip': dumps(skip), 'dc_id': dc_id})
+                    query = {'skip': dumps(skip), 'dc_id': dc_id}
+                    if region is not None:
+                        query['region'] = dumpRegion(region)
+                    query = urlencode(query)
                     url = '%sget_dc_url/?%s' % (self.url, query)
                     try:
                         stream = urlopen(url, timeout=60.0)
@@ -165,7 +220,8 @@ class RemoteKN(object):
                     if answer['dc_url'] == None:
                         raise DCNotFoundError
                     assert len(answer['skip']) >= len(skip)
-                    return answer['dc_url'], answer['skip']
+                    return (answer['dc_url'], answer['skip'],
+                            answer.get('dc_id', dc_id))
                 except (URLError, HTTPError, IOError, AssertionError):
                     raise UnreachableError()
         else:
@@ -324,13 +380,18 @@ class KnowledgeNode(RoutingHTTPServer):
         return self.km.uuid
     uuid = property(get_uuid)
 
-    def get_datacontainer(self, dc_id):
+    def get_datacontainer(self, dc_id, region=None):
         skip = [self.uuid]
         for remote in self.remotes:
             try:
-                dc_url, skip = remote.get_datacontainer_url(dc_id, skip)
-                self.km.registerURL(dc_url)
-                return self.km.getDataContainer(dc_id)
+                dc_url, skip, url_id = remote.get_datacontainer_url(
+                    dc_id, skip, region)
+                if url_id == dc_id:
+                    self.km.registerURL(dc_url)
+                    return self.km.getDataContainer(dc_id, region=region)
+                # Regions are registered as temporary, derived DCs.
+                self.km.registerURL(dc_url, temporary=True)
+                return self.km.getDataContainer(url_id)
             except (DCNotFoundError, UnreachableError, SkipError):
                 pass
         raise DCNotFoundError()
@@ -345,8 +406,16 @@ class KnowledgeNode(RoutingHTTPServer):
         else:
             skip.append(self.uuid)
         dc_id = query['dc_id']
+        region = None
+        if query.get('region'):
+            region = loadRegion(query['region'])
+        url_id = dc_id
         try:
-            dc = self.km.getDataContainer(dc_id, try_remote=False)
+            dc = self.km.getDataContainer(dc_id, try_remote=False,
+                                          region=region)
+            if region is not None:
+                dc.seal()
+                url_id = dc.id
             # Wrap data container in temporary HDF5 file
             osFileId, filename = mkstemp(suffix='.hdf',
                                          prefix='dcrequest-',
@@ -360,11 +429,12 @@ class KnowledgeNode(RoutingHTTPServer):
             dc_url = None
             for remote in self.remotes:
                 try:
-                    dc_url, skip = remote.get_datacontainer_url(dc_id, skip)
+                    dc_url, skip, url_id = remote.get_datacontainer_url(
+                        dc_id, skip, region)
                     break
                 except (DCNotFoundError, UnreachableError, SkipError):
                     pass
-        return {'skip': skip, 'dc_url': dc_url}
+        return {'skip': skip, 'dc_url': dc_url, 'dc_id': url_id}
 
     def handle_wrapped(self, filename):
         send_file(filename, self._tempdir,
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the LazyFieldContainer class, a FieldContainer
+whose data, error and mask arrays are read on demand from an
+ArraySource, i.e. a node of an HDF5 file or a .npy file.
+
+Opening a LazyFieldContainer only reads its shape, while accessing
+.data, .error or .mask reads the complete array once. Slicing by
+__getitem__ reads the selected region only. A LazyFieldContainer loaded
+from an HDF5 file is sealed with its stored emd5, hence its hash is not
+computed from the data:
+    field = km.getDataContainer(dcId, lazy=True)
+    frame = field[3]
+Memory mapped .npy files are wrapped by
+    field = LazyFieldContainer(NpyArraySource('stack.npy'), unit='1 V')
+"""
+
+from __future__ import with_statement
+import threading
+import numpy
+from pyphant.core.DataContainer import DataContainer, _slotNames
+from pyphant.core.FieldContainer import FieldContainer
+
+_ARRAYS = ('data', 'error', 'mask')
+#Serializes the access to HDF5 files, whose handles are not thread-safe
+_h5Lock = threading.RLock()
+
+
+class ArraySource(object):
+    """
+    Base class of arrays which are read on demand.
+    Subclasses provide .shape, .dtype and read(region=None).
+    """
+    def _getNBytes(self):
+        return int(numpy.prod(self.shape)) * numpy.dtype(self.dtype).itemsize
+    nbytes = property(_getNBytes)
+
+    def read(self, region=None):
+        """
+        Returns the array or the given region of it.
+        region -- tuple of slices and indices or None for the whole array
+        """
+        raise NotImplementedError
+
+
+class H5ArraySource(ArraySource):
+    """
+    Array stored in a node of an HDF5 file, which is opened for each read.
+    """
+    def __init__(self, filename, nodePath, shape, dtype):
+        self.filename = filename
+        self.nodePath = nodePath
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+
+    def read(self, region=None):
+        import tables
+        with _h5Lock:
+            handle = tables.openFile(self.filename, 'r')
+            try:
+                node = handle.getNode(self.nodePath)
+                if region is None:
+                    return numpy.asarray(node.read())
+                try:
+                    return numpy.asarray(node[region])
+                except (TypeError, ValueError, IndexError):
+                    #Selections PyTables cannot translate into hyperslabs
+                    return numpy.asarray(node.read())[region]
+            finally:
+                handle.close()
+
+
+class PackedMaskSource(H5ArraySource):
+    """
+    Boolean mask stored bit-packed in a node of an HDF5 file. Regions
+    of consecutive rows only read the bytes holding these rows.
+    """
+    def __init__(self, filename, nodePath, shape):
+        H5ArraySource.__init__(self, filename, nodePath, shape, bool)
+
+    def read(self, region=None):
+        import tables
+        from pyphant.core.PyTablesPersister import unpackMask
+        if region is not None and not isinstance(region, tuple):
+            region = tuple(region)
+        rows = None
+        if region and isinstance(region[0], slice) and len(self.shape) > 0:
+            start, stop, step = region[0].indices(self.shape[0])
+            if step == 1:
+                rows = (start, max(start, stop))
+        with _h5Lock:
+            handle = tables.openFile(self.filename, 'r')
+            try:
+                node = handle.getNode(self.nodePath)
+                if rows is None:
+                    mask = unpackMask(node.read(), self.shape)
+                    if region is None:
+                        return mask
+                    return mask[region]
+                rowSize = int(numpy.prod(self.shape[1:]))
+                first, last = rows[0] * rowSize, rows[1] * rowSize
+                packed = node[first // 8:(last + 7) // 8]
+            finally:
+                handle.close()
+        mask = unpackMask(packed, (rows[1] - rows[0], ) + self.shape[1:],
+                          first % 8)
+        return mask[(slice(None), ) + region[1:]]
+
+
+class NpyArraySource(ArraySource):
+    """
+    Array stored in a .npy file, which is memory mapped read-only.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._array = None
+
+    def _getArray(self):
+        if self._array is None:
+            self._array = numpy.load(self.filename, mmap_mode='r')
+        return self._array
+
+    shape = property(lambda self: self._getArray().shape)
+    dtype = property(lambda self: self._getArray().dtype)
+
+    def read(self, region=None):
+        if region is None:
+            return self._getArray()
+        return self._getArray()[region]
+
+    def __getstate__(self):
+        return {'filename': self.filename, '_array': None}
+
+
+def _lazyArray(name):
+    slot = FieldContainer.__dict__[name]
+
+    def getArray(self):
+        try:
+            return slot.__get__(self, type(self))
+        except AttributeError:
+            pass
+        with self.lock:
+            try:
+                return slot.__get__(self, type(self))
+            except AttributeError:
+                source = self._sources[name]
+                value = None
+                if source is not None:
+                    value = source.read()
+                    if self.id:
+                        value.setflags(write=False)
+                slot.__set__(self, value)
+                return value
+
+    def setArray(self, value):
+        if isinstance(value, ArraySource):
+            self._sources[name] = value
+            try:
+                slot.__delete__(self)
+            except AttributeError:
+                pass
+        else:
+            slot.__set__(self, value)
+    return property(getArray, setArray)
+
+
+class LazyFieldContainer(FieldContainer):
+    u"""LazyFieldContainer(data, unit=1, error=None, mask=None,
+\t\t\t  dimensions=None, longname=u"Sampled Field",
+\t\t\t  shortname=u"\\Psi", attributes=None, source=None)
+\t  FieldContainer whose arrays data, error and mask may be given as
+\t  ArraySource instances, which are read when first accessed.
+"""
+    __slots__ = ('_sources', )
+    data = _lazyArray('data')
+    error = _lazyArray('error')
+    mask = _lazyArray('mask')
+
+    def __init__(self, data, unit=1, error=None, mask=None,
+                 dimensions=None, longname=u"Sampled Field",
+                 shortname=u"\\Psi", attributes=None, source=None):
+        self._sources = dict([(name, None) for name in _ARRAYS])
+        FieldContainer.__init__(self, data, unit, error, mask, dimensions,
+                                longname, shortname, attributes,
+                                source=source)
+
+    def isMaterialized(self, name='data'):
+        u"""Returns whether the array name has been read already."""
+        try:
+            FieldContainer.__dict__[name].__get__(self, type(self))
+            return True
+        except AttributeError:
+            return False
+
+    def _getShape(self, name):
+        if self.isMaterialized(name):
+            return FieldContainer._getShape(self, name)
+        source = self._sources[name]
+        if source is None:
+            return None
+        return source.shape
+
+    def _readRegion(self, name, region):
+        if self.isMaterialized(name):
+            return FieldContainer._readRegion(self, name, region)
+        source = self._sources[name]
+        if source is None:
+            return None
+        return source.read(tuple(region))
+
+    def _getRawDataBytes(self):
+        if self.isMaterialized('data'):
+            nbytes = self.data.nbytes
+        else:
+            nbytes = self._sources['data'].nbytes
+        return nbytes + sum([dim.rawDataBytes for dim in self.dimensions])
+    rawDataBytes = property(_getRawDataBytes)
+
+    def seal(self, id=None):
+        if not id:
+            FieldContainer.seal(self)
+            return
+        with self.lock:
+            for name in _ARRAYS:
+                if self.isMaterialized(name) \
+                        and getattr(self, name) is not None:
+                    getattr(self, name).setflags(write=False)
+            DataContainer.seal(self, id)
+
+    def __getstate__(self):
+        state = {}
+        for name in _slotNames(type(self)):
+            if name in _ARRAYS:
+                if self.isMaterialized(name):
+                    state[name] = getattr(self, name)
+            elif hasattr(self, name):
+                state[name] = getattr(self, name)
+        return state
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the MemoryBudget class, which limits the memory
+occupied by the intermediate results of a recipe.
+
+Every CalculatingPlug keeps its result until it is invalidated. With a
+MemoryBudget assigned to a recipe by
+    recipe.setMemoryBudget(MemoryBudget(2 * 1024 ** 3))
+the results are accounted by their rawDataBytes. Once the budget is
+exceeded, the least recently used intermediate results are evicted.
+Evicted results are either recomputed on demand or, if spill is set,
+stored temporarily by the KnowledgeManager and reloaded on demand.
+Results of plugs which are not connected to any socket (the outputs of
+the recipe) and results of plugs pinned by pin() are never evicted.
+"""
+
+from __future__ import with_statement
+import threading
+import logging
+from pyphant.core.DataContainer import rawDataBytes
+
+
+class MemoryBudget(object):
+    """
+    LRU accounting of plug results limited to maxBytes.
+    """
+    def __init__(self, maxBytes, spill=False):
+        """
+        maxBytes -- maximal sum of rawDataBytes of the retained results
+        spill -- whether evicted DataContainers are stored temporarily
+                 by the KnowledgeManager instead of being recomputed
+        """
+        self.maxBytes = maxBytes
+        self.spill = spill
+        self.logger = logging.getLogger("pyphant")
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pinned = set()
+        self._clock = 0
+        self.totalBytes = 0
+        self.evictions = 0
+        self.spills = 0
+
+    def __getstate__(self):
+        return {'maxBytes': self.maxBytes, 'spill': self.spill}
+
+    def __setstate__(self, pdict):
+        self.__init__(pdict['maxBytes'], pdict['spill'])
+
+    def pin(self, plug):
+        """
+        Prevents the result of plug from being evicted.
+        """
+        with self._lock:
+            self._pinned.add(plug)
+
+    def unpin(self, plug):
+        with self._lock:
+            self._pinned.discard(plug)
+
+    def isEvictable(self, plug):
+        return plug not in self._pinned and len(plug._sockets) > 0
+
+    def retain(self, plug, result):
+        """
+        Accounts result as the retained result of plug, marks it as most
+        recently used and evicts other results if the budget is exceeded.
+        Called by CalculatingPlug.getResult().
+        """
+        with self._lock:
+            self._clock += 1
+            size = rawDataBytes(result)
+            if plug in self._entries:
+                self.totalBytes -= self._entries[plug][1]
+            self._entries[plug] = (self._clock, size)
+            self.totalBytes += size
+            if self.totalBytes <= self.maxBytes:
+                return
+            candidates = [(lastAccess, candidate)
+                          for candidate, (lastAccess, entrySize)
+                          in self._entries.iteritems()
+                          if candidate is not plug
+                          and self.isEvictable(candidate)]
+            candidates.sort()
+        for lastAccess, candidate in candidates:
+            if self.totalBytes <= self.maxBytes:
+                break
+            if candidate.evictResult(self.spill):
+                self.release(candidate)
+                with self._lock:
+                    self.evictions += 1
+                    if self.spill:
+                        self.spills += 1
+
+    def release(self, plug):
+        """
+        Removes the result of plug from the accounting. Called when the
+        result is invalidated or evicted.
+        """
+        with self._lock:
+            entry = self._entries.pop(plug, None)
+            if entry is not None:
+                self.totalBytes -= entry[1]
+
+    def getStatistics(self):
+        """
+        Returns a dictionary with the number of retained results, their
+        total rawDataBytes and the number of evictions and spills.
+        """
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'totalBytes': self.totalBytes,
+                    'evictions': self.evictions,
+                    'spills': self.spills}
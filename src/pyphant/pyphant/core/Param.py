@@ -76,6 +76,7 @@ class VetoParamChange(ValueError):
 
 class Param(Connectors.Socket):
     def __getValue(self):
+        Connectors.recordParamRead(self)
         if self.isFull():
             return self.getResult()
         else:
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the Profiler, a subscriber recording the resources
+used by each CalculatingPlug of a recipe:
+
+ - wall time, split into the time spent waiting for the results of the
+   upstream plugs and the time spent computing,
+ - CPU time of the process during the computation,
+ - increase of the peak resident set size of the process during the
+   computation (not available on platforms without the resource module),
+ - rawDataBytes of the inputs and of the result.
+
+Usage:
+  profiler = Profiler()
+  recipe.run(subscriber=profiler)
+  report = recipe.getPerformanceReport(profiler)
+  profiler.saveChromeTrace('trace.json')
+
+CPU time and peak RSS are measured for the whole process. If plugs are
+computed concurrently, these figures include the load of the other
+threads.
+"""
+
+from __future__ import with_statement
+import os
+import threading
+import time
+try:
+    from json import dump
+except ImportError:
+    from simplejson import dump
+try:
+    import resource
+except ImportError:
+    resource = None
+from pyphant.core.DataContainer import rawDataBytes
+
+
+def _peakRSS():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class ProcessRecord(object):
+    """
+    Resources used by a single computation of a plug. All times are given
+    in seconds relative to the creation of the Profiler.
+    """
+    def __init__(self, plug, start):
+        self.plug = plug
+        self.start = start
+        self.inputsReady = None
+        self.finish = None
+        self.thread = threading.currentThread().getName()
+        self.cpuTime = None
+        self.peakRSSDelta = None
+        self.inputBytes = 0
+        self.outputBytes = 0
+        self._cpuStart = None
+        self._rssStart = None
+
+    def _getWaitTime(self):
+        return (self.inputsReady or self.finish) - self.start
+    waitTime = property(_getWaitTime)
+
+    def _getComputeTime(self):
+        return self.finish - (self.inputsReady or self.finish)
+    computeTime = property(_getComputeTime)
+
+    def _getWallTime(self):
+        return self.finish - self.start
+    wallTime = property(_getWallTime)
+
+    def toDict(self):
+        return {'plug': self.plug.id,
+                'worker': self.plug.worker.getParam('name').value,
+                'start': self.start,
+                'wallTime': self.wallTime,
+                'waitTime': self.waitTime,
+                'computeTime': self.computeTime,
+                'cpuTime': self.cpuTime,
+                'peakRSSDelta': self.peakRSSDelta,
+                'inputBytes': self.inputBytes,
+                'outputBytes': self.outputBytes,
+                'thread': self.thread}
+
+
+class Profiler(object):
+    """
+    Subscriber recording a ProcessRecord for every computation of a plug.
+    Progress notifications are forwarded to an optional subscriber, such
+    that a recipe can be profiled while its progress is displayed.
+    """
+    def __init__(self, subscriber=None):
+        """
+        subscriber -- subscriber progress notifications are forwarded to
+        """
+        self.subscriber = subscriber
+        self.records = []
+        self._running = {}
+        self._lock = threading.Lock()
+        self._origin = time.time()
+
+    def _getCancelToken(self):
+        return getattr(self.subscriber, 'cancelToken', None)
+    cancelToken = property(_getCancelToken)
+
+    def _now(self):
+        return time.time() - self._origin
+
+    def startProcess(self, process):
+        with self._lock:
+            self._running[process] = ProcessRecord(process, self._now())
+        if self.subscriber:
+            self.subscriber.startProcess(process)
+
+    def inputsCollected(self, process, inputs):
+        """
+        Called by CalculatingPlug once the results of the upstream plugs
+        are available and the worker method is about to be called.
+        """
+        with self._lock:
+            record = self._running.get(process)
+        if record is None:
+            return
+        record.inputBytes = sum([rawDataBytes(value)
+                                 for value in inputs.itervalues()])
+        record._cpuStart = _cpuTime()
+        record._rssStart = _peakRSS()
+        record.inputsReady = self._now()
+
+    def updateProcess(self, process, percentage):
+        if self.subscriber:
+            self.subscriber.updateProcess(process, percentage)
+
+    def finishProcess(self, process):
+        """
+        Called when the computation of process has finished or failed.
+        """
+        finish = self._now()
+        with self._lock:
+            record = self._running.pop(process, None)
+        if record is not None:
+            record.finish = finish
+            if record._cpuStart is not None:
+                record.cpuTime = _cpuTime() - record._cpuStart
+            if record._rssStart is not None:
+                record.peakRSSDelta = _peakRSS() - record._rssStart
+            record.outputBytes = rawDataBytes(process._result)
+            with self._lock:
+                self.records.append(record)
+        if self.subscriber:
+            self.subscriber.finishProcess(process)
+
+    def getRecords(self, workers=None):
+        """
+        Returns the records of the finished computations in the order of
+        their completion.
+        workers -- optional list of workers to restrict the records to
+        """
+        with self._lock:
+            records = list(self.records)
+        if workers is not None:
+            records = [record for record in records
+                       if record.plug.worker in workers]
+        return records
+
+    def getReport(self, workers=None):
+        """
+        Returns a list of dictionaries summing up the records per worker,
+        sorted by descending computeTime.
+        workers -- optional list of workers to restrict the report to
+        """
+        report = {}
+        for record in self.getRecords(workers):
+            worker = record.plug.worker
+            if worker not in report:
+                report[worker] = {
+                    'worker': worker.getParam('name').value,
+                    'class': worker.__class__.__name__,
+                    'calls': 0, 'wallTime': 0.0, 'waitTime': 0.0,
+                    'computeTime': 0.0, 'cpuTime': 0.0,
+                    'peakRSSDelta': 0, 'inputBytes': 0, 'outputBytes': 0}
+            entry = report[worker]
+            entry['calls'] += 1
+            for key in ['wallTime', 'waitTime', 'computeTime',
+                        'inputBytes', 'outputBytes']:
+                entry[key] += getattr(record, key)
+            entry['cpuTime'] += record.cpuTime or 0.0
+            entry['peakRSSDelta'] = max(entry['peakRSSDelta'],
+                                        record.peakRSSDelta or 0)
+        result = report.values()
+        result.sort(key=lambda entry: entry['computeTime'], reverse=True)
+        return result
+
+    def getCosts(self):
+        """
+        Returns a dictionary mapping plugs to their mean computeTime,
+        which can be passed to Scheduler.RecipeScheduler as costs.
+        """
+        totals = {}
+        for record in self.getRecords():
+            total, count = totals.get(record.plug, (0.0, 0))
+            totals[record.plug] = (total + record.computeTime, count + 1)
+        return dict([(plug, total / count)
+                     for plug, (total, count) in totals.iteritems()])
+
+    def saveJSON(self, filename, workers=None):
+        """
+        Writes the report and the records to filename as JSON.
+        """
+        data = {'workers': self.getReport(workers),
+                'plugs': [record.toDict()
+                          for record in self.getRecords(workers)]}
+        with open(filename, 'w') as jsonFile:
+            dump(data, jsonFile, indent=2)
+
+    def getChromeTrace(self, workers=None):
+        """
+        Returns the records as a list of events in the Chrome trace event
+        format. Every computation yields a 'wait' and a 'compute' event.
+        """
+        events = []
+        pid = os.getpid()
+        #The trace format expects integer thread ids, the names are
+        #given by metadata events.
+        tids = {}
+        for record in self.getRecords(workers):
+            if record.thread not in tids:
+                tids[record.thread] = len(tids)
+                events.append({'name': 'thread_name',
+                               'ph': 'M',
+                               'pid': pid,
+                               'tid': tids[record.thread],
+                               'args': {'name': record.thread}})
+            args = record.toDict()
+            for phase, start, duration in [
+                ('wait', record.start, record.waitTime),
+                ('compute', record.finish - record.computeTime,
+                 record.computeTime)]:
+                events.append({'name': record.plug.id,
+                               'cat': phase,
+                               'ph': 'X',
+                               'ts': start * 1e6,
+                               'dur': duration * 1e6,
+                               'pid': pid,
+                               'tid': tids[record.thread],
+                               'args': args})
+        return events
+
+    def saveChromeTrace(self, filename, workers=None):
+        """
+        Writes the records to filename in the Chrome trace event format,
+        which can be loaded by chrome://tracing.
+        """
+        with open(filename, 'w') as traceFile:
+            dump({'traceEvents': self.getChromeTrace(workers)}, traceFile)
@@ -52,12 +52,32 @@ sample:
 field:
 *data
 *error
+*mask [bit-packed, .packedShape = mask.shape]
+*offsets [only for .dataEncoding = 'utf-8' or 'json']
 .unit = repr(field.unit)
+.dataEncoding [unset for numerical arrays and version 1 string arrays]
+.dataShape = field.data.shape [if .dataEncoding is set]
 UNLESS field.dimensions==INDEX:
 #dimensions(hash, id)
-"""
 
+Unicode arrays are stored as UTF-8 bytes in *data and the character
+offsets of their elements in *offsets (.dataEncoding = 'utf-8'), byte
+strings natively ('bytes') and object arrays of datetimes as microseconds
+('datetime64[us]'). Object arrays of numbers or strings are stored like
+the array NumPy converts them to, as the version 1 format did. Other
+object arrays are stored like unicode arrays, each element given as JSON
+with its type tagged ('json', see _encodeObject). String arrays of files
+written by older versions use the version 1 format, i.e. the repr of
+each element, of which only literals, datetimes and Quantities are
+evaluated when loading.
+
+Numerical arrays are written as chunked CArrays compressed by FILTERS,
+which may be replaced by getFilters('blosc', 9) for example. Arrays of
+files written by older versions are contiguous and uncompressed, the
+mask unpacked; both layouts are read by loadField.
+"""
 
+from __future__ import with_statement
 import tables
 from tables import StringCol, Col
 import sys
@@ -70,12 +90,46 @@ from pyphant.quantities import Quantity
 from pyphant.quantities import Quantity as PhysicalQuantity
 
 import scipy
+import os
+import re
+import ast
+import weakref
 import logging
+try:
+    import json
+except ImportError:
+    import simplejson as json
 _logger = logging.getLogger("pyphant")
 
 _reservedAttributes = (
     'longname', 'shortname', 'columns', 'creator', 'machine'
     )
+#Approximate size of the chunks of the arrays written by saveField
+CHUNK_BYTES = 1 << 16
+
+
+def getFilters(complib='zlib', complevel=5, shuffle=True):
+    """
+    Returns the tables.Filters compressing arrays by complib, which is
+    one of 'zlib', 'blosc', 'lzo', 'bzip2' or None for uncompressed
+    arrays. Compression libraries not available fall back to zlib.
+    """
+    if complib is None or complevel == 0:
+        return tables.Filters(complevel=0)
+    try:
+        available = complib == 'zlib' \
+                    or tables.whichLibVersion(complib) is not None
+    except ValueError:
+        available = False
+    if not available:
+        _logger.warning("Compression library %s is not available, "
+                        "using zlib instead." % (complib, ))
+        complib = 'zlib'
+    return tables.Filters(complevel=complevel, complib=complib,
+                          shuffle=shuffle)
+
+#Filters of the arrays written by saveField
+FILTERS = getFilters()
 
 
 class Connection(tables.IsDescription):
@@ -141,7 +195,7 @@ def savePlugs(h5, workerGroup, worker, saveResults=True):
     for (plugName, plug) in worker._plugs.iteritems():
         plugGroup = h5.createGroup(plugs, plugName)
         if plug.resultIsAvailable() and saveResults:
-            resId = saveResult(plug._result, h5)
+            resId = saveResult(plug.getAvailableResult(), h5)
             h5.setNodeAttr(plugGroup, "result", resId)
         connectionTable = h5.createTable(
             plugGroup, 'connections',
@@ -166,7 +220,7 @@ def saveBaseAttributes(h5, workerGroup, worker):
     h5.setNodeAttr(workerGroup, "Annotations", worker._annotations)
 
 
-def saveResult(result, h5):
+def saveResult(result, h5, filters=None):
     hash, uriType = DataContainer.parseId(result.id)
     resId = u"result_" + hash
     try:
@@ -176,9 +230,9 @@ def saveResult(result, h5):
             "/results", resId, result.id.encode("utf-8")
             )
         if uriType == 'field':
-            saveField(h5, resultGroup, result)
+            saveField(h5, resultGroup, result, filters)
         elif uriType == 'sample':
-            saveSample(h5, resultGroup, result)
+            saveSample(h5, resultGroup, result, filters)
         else:
             raise KeyError(
                 "Unknown UriType %s in saving result %s." % (
@@ -188,7 +242,7 @@ def saveResult(result, h5):
     return resId
 
 
-def saveSample(h5, resultGroup, result):
+def saveSample(h5, resultGroup, result, filters=None):
     h5.setNodeAttr(resultGroup, "longname", result.longname.encode("utf-8"))
     h5.setNodeAttr(resultGroup, "shortname", result.shortname.encode("utf-8"))
     h5.setNodeAttr(resultGroup, "creator", result.creator.encode("utf-8"))
@@ -202,30 +256,248 @@ def saveSample(h5, resultGroup, result):
     #Store fields of sample Container and gather list of field IDs
     columns = []
     for column in result.columns:
-        columns.append(saveResult(column, h5))
+        columns.append(saveResult(column, h5, filters))
     h5.setNodeAttr(resultGroup, "columns", columns)
 
 
-def saveField(h5, resultGroup, result):
-    def dump(inputList):
-        def conversion(arg):
-            if type(arg) == type(u' '):
-                return arg.encode('utf-8')
-            else:
-                return arg.__repr__()
-        if type(inputList) == type([]):
-            return map(conversion, inputList)
+def chunkShape(shape, itemsize, chunkBytes=None):
+    """
+    Returns the chunk shape for an array of the given shape and itemsize,
+    which halves the largest extent until a chunk fits into chunkBytes
+    (default: CHUNK_BYTES).
+    """
+    if chunkBytes is None:
+        chunkBytes = CHUNK_BYTES
+    chunk = [max(1, int(n)) for n in shape]
+    while int(scipy.prod(chunk)) * itemsize > chunkBytes and max(chunk) > 1:
+        axis = chunk.index(max(chunk))
+        chunk[axis] = (chunk[axis] + 1) // 2
+    return tuple(chunk)
+
+
+def saveArray(h5, resultGroup, name, array, title, filters=None):
+    """
+    Saves array as chunked CArray compressed by filters (default:
+    FILTERS). Empty, scalar and string arrays are saved as Array.
+    """
+    if filters is None:
+        filters = FILTERS
+    if array.ndim == 0 or array.size == 0 or array.dtype.char in ['S', 'U']:
+        return h5.createArray(resultGroup, name, array, title)
+    node = h5.createCArray(resultGroup, name,
+                           tables.Atom.from_dtype(array.dtype), array.shape,
+                           title, filters=filters,
+                           chunkshape=chunkShape(array.shape,
+                                                 array.dtype.itemsize))
+    node[...] = array
+    return node
+
+
+def packMask(mask):
+    """Returns the boolean mask packed to eight elements per byte."""
+    return scipy.packbits(scipy.asarray(mask, dtype=bool).ravel())
+
+
+def unpackMask(packed, shape, offset=0):
+    """
+    Returns the boolean mask of the given shape, whose first element is
+    the bit offset of the packed bytes.
+    """
+    size = int(scipy.prod(shape))
+    bits = scipy.unpackbits(scipy.asarray(packed, dtype=scipy.uint8))
+    return bits[offset:offset + size].astype(bool).reshape(shape)
+
+
+def saveMask(h5, resultGroup, mask, title, filters=None):
+    """
+    Saves the bit-packed mask. Chunks of all-false masks are not
+    written at all, since they equal the fill value of the CArray.
+    """
+    if filters is None:
+        filters = FILTERS
+    packed = packMask(mask)
+    if packed.size == 0:
+        node = h5.createArray(resultGroup, "mask", packed, title)
+    else:
+        node = h5.createCArray(resultGroup, "mask", tables.UInt8Atom(),
+                               packed.shape, title, filters=filters,
+                               chunkshape=chunkShape(packed.shape, 1))
+        if mask.any():
+            node[...] = packed
+    h5.setNodeAttr(node, "packedShape", scipy.array(mask.shape, dtype=int))
+    return node
+
+
+def loadMask(node):
+    """Returns the mask stored at node in either layout."""
+    if "packedShape" in node._v_attrs._v_attrnamesuser:
+        shape = tuple(node._v_attrs.packedShape)
+        return unpackMask(node.read(), shape)
+    return scipy.array(node.read())
+
+
+def encodeStrings(data):
+    """
+    Returns the UTF-8 encoded characters of the unicode array data and
+    the offsets of its elements counted in characters.
+    """
+    flat = scipy.asarray(data, dtype=unicode).ravel()
+    width = flat.dtype.itemsize // 4
+    flat = scipy.ascontiguousarray(flat, dtype='<U%d' % max(1, width))
+    width = flat.dtype.itemsize // 4
+    lengths = scipy.char.str_len(flat).astype(scipy.int64)
+    codes = flat.view('<u4').reshape(flat.size, width)
+    codes = codes[scipy.arange(width) < lengths[:, scipy.newaxis]]
+    text = codes.tostring().decode('utf-32-le')
+    offsets = scipy.zeros(flat.size + 1, dtype=scipy.int64)
+    scipy.cumsum(lengths, out=offsets[1:])
+    return scipy.fromstring(text.encode('utf-8'), dtype=scipy.uint8), offsets
+
+
+def decodeStrings(encoded, offsets, shape):
+    """
+    Returns the unicode array of the given shape encoded by
+    encodeStrings().
+    """
+    text = scipy.asarray(encoded, dtype=scipy.uint8).tostring()
+    codes = scipy.fromstring(text.decode('utf-8').encode('utf-32-le'),
+                             dtype='<u4')
+    lengths = scipy.diff(offsets)
+    width = max([1] + lengths.tolist())
+    matrix = scipy.zeros((len(lengths), width), dtype='<u4')
+    rows = scipy.repeat(scipy.arange(len(lengths)), lengths)
+    columns = scipy.arange(len(codes)) - scipy.repeat(offsets[:-1], lengths)
+    matrix[rows, columns] = codes
+    return matrix.view('<U%d' % width).reshape(shape)
+
+
+def _isDatetimes(elements):
+    for element in elements:
+        if type(element) != datetime.datetime or element.tzinfo is not None:
+            return False
+    return len(elements) > 0
+
+
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+_UNIT_PATTERN = re.compile(r"^[\w\s*/().+-]*$")
+
+
+def _parseUnit(unit):
+    """
+    Returns unit, if it only consists of known unit names, since
+    Quantity evaluates it.
+    """
+    from pyphant.quantities import _unit_table
+    names = re.findall(r"[A-Za-z_]\w*", unit)
+    if _UNIT_PATTERN.match(unit) is None \
+           or [name for name in names if name not in _unit_table]:
+        raise ValueError("Invalid unit %r." % (unit, ))
+    return str(unit)
+
+
+def _encodeObject(value):
+    """
+    Returns a representation of value, which can be dumped to JSON.
+    Values other than numbers and unicode strings are tagged by their
+    type. Objects of unknown types are stored by their repr, which is
+    loaded as unicode string.
+    """
+    if isinstance(value, scipy.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, long, float, unicode)):
+        return value
+    elif isinstance(value, str):
+        return {'str': value.decode('latin-1')}
+    elif isinstance(value, complex):
+        return {'complex': [value.real, value.imag]}
+    elif type(value) == datetime.datetime and value.tzinfo is None:
+        return {'datetime': value.strftime(_DATETIME_FORMAT)}
+    elif isinstance(value, Quantity):
+        return {'quantity': [_encodeObject(value.value), value.unit.name()]}
+    elif isinstance(value, tuple):
+        return {'tuple': map(_encodeObject, value)}
+    elif isinstance(value, list):
+        return {'list': map(_encodeObject, value)}
+    elif isinstance(value, dict):
+        return {'dict': [[_encodeObject(key), _encodeObject(item)]
+                         for key, item in value.iteritems()]}
+    _logger.warning(u"Storing %s object by its repr." % (
+        type(value).__name__, ))
+    return {'repr': repr(value).decode('utf-8', 'replace')}
+
+
+def _decodeObject(value):
+    """Inverts _encodeObject."""
+    if not isinstance(value, dict):
+        return value
+    (tag, item), = value.items()
+    if tag == 'str':
+        return item.encode('latin-1')
+    elif tag == 'complex':
+        return complex(*item)
+    elif tag == 'datetime':
+        return datetime.datetime.strptime(item, _DATETIME_FORMAT)
+    elif tag == 'quantity':
+        return Quantity(_decodeObject(item[0]), _parseUnit(item[1]))
+    elif tag == 'tuple':
+        return tuple(map(_decodeObject, item))
+    elif tag == 'list':
+        return map(_decodeObject, item)
+    elif tag == 'dict':
+        return dict([(_decodeObject(key), _decodeObject(entry))
+                     for key, entry in item])
+    elif tag == 'repr':
+        return item
+    raise ValueError("Unknown object tag %s." % (tag, ))
+
+
+def saveData(h5, resultGroup, data, title, filters=None):
+    """
+    Saves the data array of a FieldContainer encoded according to its
+    dtype, see the module documentation.
+    """
+    encoding = None
+    if data.dtype.char == 'O':
+        elements = data.ravel().tolist()
+        if len(elements) > 0 and [element for element in elements
+                                  if not isinstance(element, unicode)] == []:
+            data = scipy.asarray(data, dtype=unicode)
+        elif _isDatetimes(elements):
+            data = scipy.array(elements, dtype='datetime64[us]').view(
+                scipy.int64).reshape(data.shape)
+            encoding = 'datetime64[us]'
         else:
-            return map(dump, inputList)
-    if result.data.dtype.char in ['U', 'O']:
-        unicodeData = scipy.array(dump(result.data.tolist()))
-        h5.createArray(
-            resultGroup, "data", unicodeData, result.longname.encode("utf-8")
-            )
+            native = scipy.array(data.tolist())
+            if native.shape == data.shape \
+                   and native.dtype.kind in 'biufcSU':
+                data = native
+    if data.dtype.char == 'U':
+        encoded, offsets = encodeStrings(data)
+        saveArray(h5, resultGroup, "data", encoded, title, filters)
+        saveArray(h5, resultGroup, "offsets", offsets, title, filters)
+        encoding = 'utf-8'
+    elif data.dtype.char == 'S':
+        h5.createArray(resultGroup, "data", data, title)
+        encoding = 'bytes'
+    elif data.dtype.char == 'O':
+        texts = scipy.array([unicode(json.dumps(_encodeObject(element)))
+                             for element in data.ravel().tolist()],
+                            dtype=unicode)
+        encoded, offsets = encodeStrings(texts)
+        saveArray(h5, resultGroup, "data", encoded, title, filters)
+        saveArray(h5, resultGroup, "offsets", offsets, title, filters)
+        encoding = 'json'
     else:
-        h5.createArray(
-            resultGroup, "data", result.data, result.longname.encode("utf-8")
-            )
+        saveArray(h5, resultGroup, "data", data, title, filters)
+    if encoding is not None:
+        h5.setNodeAttr(resultGroup, "dataEncoding", encoding)
+        h5.setNodeAttr(resultGroup, "dataShape",
+                       scipy.array(data.shape, dtype=int))
+
+
+def saveField(h5, resultGroup, result, filters=None):
+    saveData(h5, resultGroup, result.data, result.longname.encode("utf-8"),
+             filters)
     for key, value in result.attributes.iteritems():
         h5.setNodeAttr(resultGroup.data, key, value)
     h5.setNodeAttr(resultGroup, "longname", result.longname.encode("utf-8"))
@@ -234,17 +506,19 @@ def saveField(h5, resultGroup, result):
     h5.setNodeAttr(resultGroup, "machine", result.machine.encode("utf-8"))
 
     if result.error != None:
-        h5.createArray(resultGroup, "error", result.error,
-                       (u"Error of " + result.longname).encode("utf-8"))
+        saveArray(h5, resultGroup, "error", result.error,
+                  (u"Error of " + result.longname).encode("utf-8"), filters)
     if result.mask != None:
-        h5.createArray(resultGroup, "mask", result.mask,
-                       (u"Mask of " + result.longname).encode("utf-8"))
+        saveMask(h5, resultGroup, result.mask,
+                 (u"Mask of " + result.longname).encode("utf-8"), filters)
     h5.setNodeAttr(resultGroup, "unit", repr(result.unit).encode("utf-8"))
     if result.dimensions != DataContainer.INDEX:
         idLen = max([len(dim.id.encode("utf-8")) for dim in result.dimensions])
+        hashLen = max([len(dim.hash.encode("utf-8"))
+                       for dim in result.dimensions])
         dimTable = h5.createTable(
             resultGroup, "dimensions",
-            {"hash": StringCol(32), "id": StringCol(idLen)},
+            {"hash": StringCol(hashLen), "id": StringCol(idLen)},
             (u"Dimensions of " + result.longname).encode("utf-8"),
             expectedrows=len(result.dimensions)
             )
@@ -253,7 +527,7 @@ def saveField(h5, resultGroup, result):
             d["hash"] = dim.hash.encode("utf-8")
             d["id"] = dim.id.encode("utf-8")
             d.append()
-            saveResult(dim, h5)
+            saveResult(dim, h5, filters)
         dimTable.flush()
 
 
@@ -316,7 +590,11 @@ def restoreParamsToWorkers(recipeGroup, workers):
         restoreParamsToWorkerParentsFirst(worker, worker2group, visited)
 
 
-def loadRecipe(h5):
+def loadRecipe(h5, lazy=True):
+    """
+    Returns the recipe stored in h5. If lazy is set, the results of its
+    plugs are loaded when requested first, see StoredResult.
+    """
     recipeGroup = h5.root.recipe
     try:
         annotations = recipeGroup._v_attrs.Annotations
@@ -325,7 +603,7 @@ def loadRecipe(h5):
     recipe = CompositeWorker.CompositeWorker(annotations=annotations)
     workers = {}
     createWorkerGraph(recipeGroup, workers, recipe)
-    restoreResultsToWorkers(recipeGroup, workers, h5)
+    restoreResultsToWorkers(recipeGroup, workers, h5, lazy)
     restoreParamsToWorkers(recipeGroup, workers)
     return recipe
 
@@ -342,32 +620,91 @@ def createWorkerGraph(recipeGroup, workers, recipe):
                     ).insert(plug)
 
 
-def restoreResultsToWorkers(recipeGroup, workers, h5):
+def restoreResultsToWorkers(recipeGroup, workers, h5, lazy=False):
     for workerGroup in recipeGroup:
         for plugGroup in workerGroup.plugs:
             plug = workers[workerGroup._v_name].getPlug(plugGroup._v_name)
             try:
                 resId = plugGroup._v_attrs.result
-                resNode = h5.getNode("/results/" + resId)
-                hash, uriType = DataContainer.parseId(resNode._v_title)
-                if uriType == u'field':
-                    result = loadField(h5, resNode)
-                elif uriType == u'sample':
-                    _logger.info("Trying to load sample data...")
-                    result = loadSample(h5, resNode)
-                    _logger.info("...successfully loaded.")
+                if lazy:
+                    h5.getNode("/results/" + resId)
+                    plug._storedResult = StoredResult(h5, resId)
                 else:
-                    raise TypeError(
-                        "Unknown result uriType in <%s>" % (
-                            resNode._v_title,
-                            )
-                        )
-                plug._result = result
+                    plug._result = loadResult(h5, resId)
             except (AttributeError, tables.NoSuchNodeError), e:
                 _logger.info("Exception: " + str(e))
 
 
-def loadField(h5, resNode):
+def loadResult(h5, resId):
+    """Returns the DataContainer stored at /results/resId."""
+    resNode = h5.getNode("/results/" + resId)
+    hash, uriType = DataContainer.parseId(resNode._v_title)
+    if uriType == u'field':
+        return loadField(h5, resNode)
+    elif uriType == u'sample':
+        _logger.info("Trying to load sample data...")
+        result = loadSample(h5, resNode)
+        _logger.info("...successfully loaded.")
+        return result
+    raise TypeError(
+        "Unknown result uriType in <%s>" % (
+            resNode._v_title,
+            )
+        )
+
+
+#StoredResults whose files have not been overwritten yet
+_storedResults = weakref.WeakSet()
+
+
+class StoredResult(object):
+    """
+    Handle of a plug result stored in a recipe file, which is loaded by
+    load() from the file loadRecipe() read, reopening it if necessary.
+    Loads are serialized, since plugs may be computed by several threads.
+    """
+    def __init__(self, h5, resId):
+        self.h5 = h5
+        self.filename = os.path.realpath(h5.filename)
+        self.resId = resId
+        self.result = None
+        _storedResults.add(self)
+
+    def load(self):
+        from pyphant.core.LazyFieldContainer import _h5Lock
+        if self.result is not None:
+            return self.result
+        with _h5Lock:
+            if self.h5.isopen:
+                return loadResult(self.h5, self.resId)
+            h5 = tables.openFile(self.filename, 'r')
+            try:
+                return loadResult(h5, self.resId)
+            finally:
+                h5.close()
+
+    def resolve(self):
+        """Keeps the result in memory, so the file may be overwritten."""
+        self.result = self.load()
+        _storedResults.discard(self)
+
+
+def resolveStoredResults(filename):
+    """
+    Resolves all StoredResults of the given file, which has to be done
+    before the file is overwritten.
+    """
+    filename = os.path.realpath(filename)
+    for storedResult in list(_storedResults):
+        if storedResult.filename == filename:
+            storedResult.resolve()
+
+
+def loadField(h5, resNode, lazy=False):
+    """
+    Loads the FieldContainer stored at resNode. If lazy is set, a
+    LazyFieldContainer reading its arrays on demand is returned.
+    """
     longname = unicode(h5.getNodeAttr(resNode, "longname"), 'utf-8')
     shortname = unicode(h5.getNodeAttr(resNode, "shortname"), 'utf-8')
     try:
@@ -378,29 +715,34 @@ def loadField(h5, resNode):
         emd5dict = emd52dict(resNode._v_title)
         creator = emd5dict['creator']
         machine = emd5dict['machine']
-    data = scipy.array(resNode.data.read())
-
-    def loads(inputList):
-        if type(inputList) == type([]):
+    if lazy and resNode.data.dtype.char != 'S' \
+           and getDataEncoding(resNode) is None:
+        from pyphant.core.LazyFieldContainer import (LazyFieldContainer,
+                                                     H5ArraySource,
+                                                     PackedMaskSource)
+        arrays = []
+        for name in ['data', 'error', 'mask']:
             try:
-                return map(lambda s: eval(s), inputList)
-            except:
-                return map(lambda s: unicode(s, 'utf-8'), inputList)
-        else:
-            return map(loads, inputList)
-    if data.dtype.char == 'S':
-        data = scipy.array(loads(data.tolist()))
+                node = getattr(resNode, name)
+            except tables.NoSuchNodeError:
+                arrays.append(None)
+            else:
+                if "packedShape" in node._v_attrs._v_attrnamesuser:
+                    arrays.append(PackedMaskSource(
+                        h5.filename, node._v_pathname,
+                        tuple(node._v_attrs.packedShape)))
+                else:
+                    arrays.append(H5ArraySource(
+                        h5.filename, node._v_pathname, node.shape,
+                        node.dtype))
+        data, error, mask = arrays
+        factory = LazyFieldContainer
+    else:
+        data, error, mask = _loadArrays(resNode)
+        factory = DataContainer.FieldContainer
     attributes = {}
     for key in resNode.data._v_attrs._v_attrnamesuser:
         attributes[key] = h5.getNodeAttr(resNode.data, key)
-    try:
-        error = scipy.array(resNode.error.read())
-    except tables.NoSuchNodeError:
-        error = None
-    try:
-        mask = scipy.array(resNode.mask.read())
-    except tables.NoSuchNodeError:
-        mask = None
     unit = eval(unicode(h5.getNodeAttr(resNode, "unit"), 'utf-8'))
     try:
         dimTable = resNode.dimensions
@@ -409,22 +751,106 @@ def loadField(h5, resNode):
                 h5,
                 h5.getNode(
                     "/results/result_" + DataContainer.parseId(row['id'])[0]
-                    )
+                    ),
+                lazy
                 )
             for row in dimTable.iterrows()
             ]
     except tables.NoSuchNodeError:
         dimensions = DataContainer.INDEX
-    result = DataContainer.FieldContainer(data, unit, error, mask,
-                                          dimensions, longname, shortname,
-                                          attributes)
+    result = factory(data, unit, error, mask, dimensions, longname,
+                     shortname, attributes)
     result.creator = creator
     result.machine = machine
     result.seal(resNode._v_title)
     return result
 
 
-def loadSample(h5, resNode):
+def getDataEncoding(resNode):
+    """
+    Returns the encoding of the data stored at resNode or None for
+    numerical and version 1 string arrays.
+    """
+    if "dataEncoding" in resNode._v_attrs._v_attrnamesuser:
+        return resNode._v_attrs.dataEncoding
+    return None
+
+
+def loadData(resNode):
+    """Returns the data array stored at resNode in any version."""
+    encoding = getDataEncoding(resNode)
+    if encoding is None:
+        return _loadDataVersion1(resNode)
+    shape = tuple(resNode._v_attrs.dataShape)
+    if encoding == 'utf-8':
+        return decodeStrings(resNode.data.read(), resNode.offsets.read(),
+                             shape)
+    elif encoding == 'bytes':
+        return scipy.array(resNode.data.read()).reshape(shape)
+    elif encoding == 'datetime64[us]':
+        data = scipy.asarray(resNode.data.read(), dtype=scipy.int64)
+        return data.view('datetime64[us]').astype(object).reshape(shape)
+    elif encoding == 'json':
+        texts = decodeStrings(resNode.data.read(), resNode.offsets.read(),
+                              (int(scipy.prod(shape)), ))
+        data = scipy.empty(len(texts), dtype=object)
+        for index, text in enumerate(texts):
+            data[index] = _decodeObject(json.loads(text))
+        return data.reshape(shape)
+    raise ValueError("Unknown data encoding %s of %s." % (
+        encoding, resNode._v_pathname))
+
+
+_DATETIME_REPR = re.compile(r"^datetime\.datetime\((\d+(?:, \d+)*)\)$")
+_QUANTITY_REPR = re.compile(r"^Quantity\(([^,]+),'([^']*)'\)$")
+
+
+def _literalEval(text):
+    """
+    Returns the element of a version 1 string array, which has been
+    stored by its repr. Only literals and the reprs of datetimes and
+    Quantities are evaluated.
+    """
+    match = _DATETIME_REPR.match(text)
+    if match is not None:
+        return datetime.datetime(*map(int, match.group(1).split(',')))
+    match = _QUANTITY_REPR.match(text)
+    if match is not None:
+        return Quantity(ast.literal_eval(match.group(1)),
+                        _parseUnit(match.group(2)))
+    return ast.literal_eval(text)
+
+
+def _loadDataVersion1(resNode):
+    data = scipy.array(resNode.data.read())
+
+    def loads(inputList):
+        if type(inputList) == type([]):
+            try:
+                return map(_literalEval, inputList)
+            except (ValueError, SyntaxError, TypeError):
+                return map(lambda s: unicode(s, 'utf-8'), inputList)
+        else:
+            return map(loads, inputList)
+    if data.dtype.char == 'S':
+        data = scipy.array(loads(data.tolist()))
+    return data
+
+
+def _loadArrays(resNode):
+    data = loadData(resNode)
+    try:
+        error = scipy.array(resNode.error.read())
+    except tables.NoSuchNodeError:
+        error = None
+    try:
+        mask = loadMask(resNode.mask)
+    except tables.NoSuchNodeError:
+        mask = None
+    return data, error, mask
+
+
+def loadSample(h5, resNode, lazy=False):
     result = DataContainer.SampleContainer.__new__(
         DataContainer.SampleContainer
         )
@@ -452,7 +878,7 @@ def loadSample(h5, resNode):
                     uriType, result.id
                     )
                 )
-        columns.append(loader(h5, h5.getNode(nodename)))
+        columns.append(loader(h5, h5.getNode(nodename), lazy))
     result.columns = columns
     result.seal(resNode._v_title)
     return result
@@ -471,5 +897,6 @@ def loadExecutionOrders(h5):
 
 
 def pruneResults(h5):
+    resolveStoredResults(h5.filename)
     h5.removeNode("/results", recursive=True)
     h5.createGroup("/", "results")
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the ResultCache class, which memoizes plug results
+persistently across runs.
+
+A result is identified by the class and VERSION of its worker, the name
+of the plug, the values of the worker's parameters and the hashes of the
+sealed DataContainers the plug reads from. The results themselves are
+stored by the KnowledgeManager, the cache only maps keys to emd5s.
+Usage:
+    recipe.setResultCache(ResultCache())
+lets every plug of the recipe look up its result before computing it.
+"""
+
+from __future__ import with_statement
+import os
+import sqlite3
+import threading
+import hashlib
+import logging
+from time import time
+from pyphant.core.Helpers import getPyphantPath
+from pyphant.core.SQLiteWrapper import create_table
+
+
+class UncacheableError(ValueError):
+    pass
+
+
+class ResultCache(object):
+    """
+    Persistent mapping of plug inputs to results. If the number of
+    entries exceeds max_entries, the least recently used entries are
+    evicted and DataContainers stored on behalf of the cache are
+    marked as temporary in the KnowledgeManager.
+    """
+    def __init__(self, km=None, max_entries=10000, dbase=u'default'):
+        """
+        km -- KnowledgeManager instance storing the results, defaults to
+              KnowledgeManager.getInstance()
+        max_entries -- maximal number of entries kept
+        dbase -- leave this to 'default', other values are allowed for
+                 debug purposes
+        """
+        self._km = km
+        self.max_entries = max_entries
+        if dbase == u'default':
+            self._dbase = os.path.join(getPyphantPath('sqlite3'),
+                                       'result_cache.sqlite3')
+        else:
+            self._dbase = dbase
+        self.logger = logging.getLogger("pyphant")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        connection = sqlite3.connect(self._dbase)
+        cursor = connection.cursor()
+        try:
+            columns = [('key', 'TEXT PRIMARY KEY UNIQUE NOT NULL'),
+                       ('dc_id', 'TEXT NOT NULL'),
+                       ('owned', 'INT'),
+                       ('last_access', 'REAL')]
+            create_table('rc_results', columns, cursor, ignore_exists=True)
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _getKM(self):
+        if self._km is None:
+            from pyphant.core.KnowledgeManager import KnowledgeManager
+            self._km = KnowledgeManager.getInstance()
+        return self._km
+    km = property(_getKM)
+
+    def __getstate__(self):
+        pdict = self.__dict__.copy()
+        pdict['_km'] = None
+        del pdict['_lock']
+        del pdict['logger']
+        return pdict
+
+    def __setstate__(self, pdict):
+        self.__dict__.update(pdict)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("pyphant")
+
+    def _fingerprint(self, value):
+        from pyphant.core.DataContainer import DataContainer
+        if isinstance(value, DataContainer):
+            if not value.id:
+                raise UncacheableError("Input has not been sealed.")
+            return "dc:" + value.hash.encode('utf-8')
+        if isinstance(value, (basestring, int, long, float, bool,
+                              type(None))):
+            return repr(value)
+        if isinstance(value, (tuple, list)):
+            #The items may be DataContainers, whose repr is not unique.
+            items = ",".join([self._fingerprint(item) for item in value])
+            if isinstance(value, tuple):
+                return "(" + items + ")"
+            return "[" + items + "]"
+        raise UncacheableError("Input of type %s cannot be fingerprinted."
+                               % (type(value), ))
+
+    def getKey(self, plug, inputs):
+        """
+        Returns the cache key for the given plug and inputs or None if
+        the result cannot be cached, e.g. because an input has not been
+        sealed. The hash part of the input emd5s is used, such that
+        recomputed but identical inputs result in the same key.
+        plug -- CalculatingPlug
+        inputs -- dictionary mapping socket names to input values
+        """
+        worker = plug.worker
+        m = hashlib.md5()
+        try:
+            m.update(worker.__class__.__module__)
+            m.update(worker.__class__.__name__)
+            m.update(repr(worker.VERSION))
+            m.update(plug.name)
+            for param in worker.getParamList():
+                if param.name != 'name':
+                    m.update(param.name)
+                    m.update(self._fingerprint(param.value))
+            for name in sorted(inputs.keys()):
+                m.update(name)
+                m.update(self._fingerprint(inputs[name]))
+        except UncacheableError:
+            return None
+        return m.hexdigest()
+
+    def _execute(self, query, args=()):
+        connection = sqlite3.connect(self._dbase, 60.0)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, args)
+            rows = cursor.fetchall()
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        return rows
+
+    def lookup(self, key):
+        """
+        Returns the cached result for key or None.
+        """
+        rows = self._execute("SELECT dc_id FROM rc_results WHERE key=?",
+                             (key, ))
+        result = None
+        if rows:
+            dc_id = rows[0][0]
+            if self.km.hasDataContainer(dc_id):
+                result = self.km.getDataContainer(dc_id, try_remote=False)
+                self._execute("UPDATE rc_results SET last_access=? "\
+                              "WHERE key=?", (time(), key))
+            else:
+                self._execute("DELETE FROM rc_results WHERE key=?", (key, ))
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def store(self, key, result):
+        """
+        Seals the result, stores it with the KnowledgeManager and
+        remembers it for key. Results that are no DataContainers are
+        not cached.
+        """
+        from pyphant.core.DataContainer import DataContainer
+        if not isinstance(result, DataContainer):
+            return
+        result.seal()
+        #Temporary entries, e.g. hand-overs of the ProcessExecutor, are
+        #made persistent and owned by the cache.
+        owned = not self.km.hasDataContainer(result.id) \
+            or self.km.isTemporary(result.id) \
+            or self._execute("SELECT COUNT(*) FROM rc_results "\
+                             "WHERE dc_id=? AND owned", (result.id, ))[0][0]
+        self.km.registerDataContainer(result)
+        if owned:
+            self.km.setTemporary(result.id, False)
+        self._execute("INSERT OR REPLACE INTO rc_results "\
+                      "(key, dc_id, owned, last_access) VALUES (?, ?, ?, ?)",
+                      (key, result.id, owned, time()))
+        self.evict()
+
+    def evict(self, max_entries=None):
+        """
+        Removes the least recently used entries, such that at most
+        max_entries are kept, which defaults to .max_entries.
+        """
+        if max_entries is None:
+            max_entries = self.max_entries
+        rows = self._execute("SELECT key, dc_id, owned FROM rc_results "\
+                             "ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                             (max_entries, ))
+        for key, dc_id, owned in rows:
+            self._execute("DELETE FROM rc_results WHERE key=?", (key, ))
+            references = self._execute("SELECT COUNT(*) FROM rc_results "\
+                                       "WHERE dc_id=?", (dc_id, ))[0][0]
+            if owned and not references:
+                self.km.setTemporary(dc_id, True)
+        with self._lock:
+            self.evictions += len(rows)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        self.evict(0)
+
+    def getStatistics(self):
+        """
+        Returns a dictionary with the number of hits, misses and evictions
+        since instantiation and the number of entries.
+        """
+        entries = self._execute("SELECT COUNT(*) FROM rc_results")[0][0]
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': entries}
@@ -252,7 +252,15 @@ class SQLiteWrapper(object):
         sqlite3.register_converter('QUANTITY', dbase2quantity)
         sqlite3.register_converter('LATEX', dbase2latex)
         #clean tmp:
-        self.cursor.execute("DELETE FROM km_temporary")
+        exe = self.cursor.execute
+        #Databases of former versions delete the entries by a trigger,
+        #which also fires if the temporary flag is removed.
+        exe("DROP TRIGGER IF EXISTS trigger_del_tmp")
+        exe("DELETE FROM km_fc WHERE fc_id IN "\
+                "(SELECT dc_id FROM km_temporary)")
+        exe("DELETE FROM km_sc WHERE sc_id IN "\
+                "(SELECT dc_id FROM km_temporary)")
+        exe("DELETE FROM km_temporary")
 
     def setup_dbase(self):
         #create tables:
@@ -317,10 +325,6 @@ class SQLiteWrapper(object):
                       ['DELETE FROM km_attributes WHERE dc_id=OLD.sc_id',
                        'DELETE FROM km_sc_columns WHERE sc_id=OLD.sc_id'],
                       self.cursor)
-        create_trigger('trigger_del_tmp', 'DELETE', 'km_temporary',
-                      ['DELETE FROM km_fc WHERE fc_id=OLD.dc_id',
-                       'DELETE FROM km_sc WHERE sc_id=OLD.dc_id'],
-                      self.cursor)
         self.setup_sqlite()
 
     def dbase_broken(self):
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+u"""
+This module provides the RecipeScheduler, which computes the results of
+a set of plugs in a bounded number of threads.
+
+Instead of pulling the plugs recursively, which starts a thread for
+every socket of every worker, the scheduler builds the dependency graph
+of the requested plugs once, and computes the plugs whose inputs are
+available in a fixed number of threads. Among the ready plugs the ones
+on the longest (critical) path to the requested plugs are computed
+first. Usually the scheduler is used by CompositeWorker.run().
+
+Single plug results can be requested without blocking the caller by
+Plug.getResultAsync(), which returns a Future computed by the shared
+ResultPool. Concurrent requests for the same plug share one Future.
+The Future of the concurrent.futures package (available for Python 2
+as 'futures') is used if it is installed, else a compatible subset is
+provided by this module.
+"""
+
+from __future__ import with_statement
+import heapq
+import threading
+import Queue
+import logging
+from pyphant.core import (Connectors, Executors)
+
+
+def resolvePlug(plug):
+    """
+    Returns the plug computing the result of the given plug, i.e.
+    ConnectorProxies are followed to the plug inserted into them.
+    """
+    while isinstance(plug, Connectors.ConnectorProxy):
+        inner = plug.getPlug()
+        if inner is None:
+            raise ValueError("Connector %s is not connected." % (plug.id, ))
+        plug = inner
+    return plug
+
+
+def getUpstreamPlugs(plug):
+    """
+    Returns the plugs the given plug reads from via the sockets and the
+    connected parameters of its worker.
+    """
+    sockets = plug.worker.getSockets() + plug.worker.getParamList()
+    return [resolvePlug(socket.getPlug()) for socket in sockets
+            if socket.isFull()]
+
+
+class _PrecomputedExecutor(Executors.InlineExecutor):
+    """
+    Collects the inputs of a plug, whose upstream plugs have been
+    computed already, and calls its method via the executor of the plug.
+    """
+    def __init__(self, executor):
+        self.executor = executor
+
+    tracksParamReads = property(
+        lambda self: getattr(self.executor, 'tracksParamReads', False))
+
+    def callMethod(self, plug, inputs, updater):
+        return self.executor.callMethod(plug, inputs, updater)
+
+
+class RecipeScheduler(object):
+    """
+    Computes the results of plugs in topological order of their
+    dependency graph.
+    """
+    def __init__(self, plugs, costs=None):
+        """
+        plugs -- list of plugs to be computed
+        costs -- optional dictionary mapping plugs to their estimated
+                 computation time, used to determine the critical path.
+                 Defaults to 1 for each plug.
+        """
+        if costs is None:
+            costs = {}
+        self.plugs = [resolvePlug(plug) for plug in plugs]
+        self._upstream = {}
+        self._downstream = {}
+        self.order = []
+        self._buildGraph()
+        self.priorities = {}
+        for plug in reversed(self.order):
+            self.priorities[plug] = costs.get(plug, 1) + max(
+                [0] + [self.priorities[down]
+                       for down in self._downstream[plug]])
+
+    def _buildGraph(self):
+        """
+        Collects all plugs without a result, which are needed to compute
+        the requested plugs, and sorts them topologically.
+        """
+        visiting = set()
+        for start in self.plugs:
+            if start in self._upstream or start.resultIsAvailable():
+                continue
+            stack = [(start, False)]
+            while stack:
+                plug, expanded = stack.pop()
+                if expanded:
+                    visiting.discard(plug)
+                    self.order.append(plug)
+                    continue
+                if plug in self._upstream:
+                    continue
+                visiting.add(plug)
+                upstream = [up for up in getUpstreamPlugs(plug)
+                            if not up.resultIsAvailable()]
+                self._upstream[plug] = upstream
+                self._downstream.setdefault(plug, [])
+                stack.append((plug, True))
+                for up in upstream:
+                    if up in visiting:
+                        raise ValueError("Recipe contains a cycle at plug %s."
+                                         % (up.id, ))
+                    self._downstream.setdefault(up, []).append(plug)
+                    if up not in self._upstream:
+                        stack.append((up, False))
+
+    def run(self, max_workers=None, subscriber=None):
+        """
+        Computes the plugs and returns the list of results in the order
+        of the requested plugs.
+        max_workers -- maximal number of plugs computed at the same
+                       time, defaults to the number of CPUs
+        subscriber -- subscriber passed to CalculatingPlug.getResult()
+        """
+        if max_workers is None:
+            from multiprocessing import cpu_count
+            max_workers = cpu_count()
+        if self.order:
+            self._execute(max(1, max_workers), subscriber)
+        return [plug.getResult(subscriber) for plug in self.plugs]
+
+    def _execute(self, max_workers, subscriber):
+        index = dict([(plug, i) for i, plug in enumerate(self.order)])
+        missing = dict([(plug, len(self._upstream[plug]))
+                        for plug in self.order])
+        ready = [(-self.priorities[plug], index[plug], plug)
+                 for plug in self.order if missing[plug] == 0]
+        heapq.heapify(ready)
+        condition = threading.Condition()
+        state = {'done': 0, 'exceptions': []}
+        #The first failure cancels the plugs being computed.
+        token = Connectors.CancelToken(Connectors.getCancelToken(subscriber))
+        subscriber = Connectors.CancellableSubscriber(token, subscriber)
+
+        def compute():
+            while True:
+                with condition:
+                    while not ready and not state['exceptions'] \
+                          and state['done'] < len(self.order):
+                        condition.wait()
+                    if state['exceptions'] \
+                           or state['done'] == len(self.order):
+                        return
+                    plug = heapq.heappop(ready)[2]
+                try:
+                    plug.getResult(subscriber,
+                                   _PrecomputedExecutor(plug.getExecutor()))
+                except Exception, e:
+                    token.cancel(u"Another plug has failed.")
+                    with condition:
+                        state['exceptions'].append(e)
+                        condition.notifyAll()
+                    return
+                with condition:
+                    state['done'] += 1
+                    for down in self._downstream[plug]:
+                        missing[down] -= 1
+                        if missing[down] == 0:
+                            heapq.heappush(
+                                ready,
+                                (-self.priorities[down], index[down], down))
+                    condition.notifyAll()
+
+        threads = [threading.Thread(target=compute)
+                   for i in xrange(min(max_workers, len(self.order)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if state['exceptions']:
+            failures = [e for e in state['exceptions']
+                        if not isinstance(e, Connectors.CancelledError)]
+            if not failures:
+                raise state['exceptions'][0]
+            raise RuntimeError(str(failures))
+
+
+class _Future(object):
+    """
+    Subset of concurrent.futures.Future used if that package is not
+    available.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def cancel(self):
+        return False
+
+    def cancelled(self):
+        return False
+
+    def set_running_or_notify_cancel(self):
+        return True
+
+    def done(self):
+        with self._condition:
+            return self._done
+
+    def result(self, timeout=None):
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise RuntimeError("Timeout while waiting for result.")
+            if self._exception is not None:
+                raise self._exception
+            return self._result
+
+    def exception(self, timeout=None):
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise RuntimeError("Timeout while waiting for result.")
+            return self._exception
+
+    def add_done_callback(self, fn):
+        with self._condition:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, result, exception):
+        with self._condition:
+            self._result = result
+            self._exception = exception
+            self._done = True
+            self._condition.notifyAll()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            fn(self)
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = _Future
+
+
+class ResultPool(object):
+    """
+    Bounded pool of threads computing the results of plugs requested by
+    Plug.getResultAsync().
+    """
+    def __init__(self, max_workers=None):
+        """
+        max_workers -- maximal number of threads, defaults to the number
+                       of CPUs
+        """
+        if max_workers is None:
+            from multiprocessing import cpu_count
+            max_workers = cpu_count()
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, plug, subscriber=None):
+        """
+        Returns a Future of the result of plug. If the result of plug is
+        being computed already, the Future of that computation is
+        returned and subscriber is not notified.
+        """
+        with self._lock:
+            future = self._pending.get(plug)
+            if future is not None:
+                return future
+            future = Future()
+            self._pending[plug] = future
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((plug, subscriber, future))
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            plug, subscriber, future = item
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    del self._pending[plug]
+                continue
+            try:
+                result = plug.getResult(subscriber)
+            except Exception, e:
+                logging.getLogger('pyphant').error(
+                    u"An unhandled exception occured in the calculation.",
+                    exc_info=True)
+                result, exception = None, e
+            else:
+                exception = None
+            with self._lock:
+                del self._pending[plug]
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+
+    def shutdown(self):
+        """
+        Stops the threads of the pool once the submitted plugs have been
+        computed.
+        """
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+        for thread in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+
+_resultPool = None
+_resultPoolLock = threading.Lock()
+
+
+def getResultPool():
+    """
+    Returns the ResultPool used by Plug.getResultAsync().
+    """
+    global _resultPool
+    with _resultPoolLock:
+        if _resultPool is None:
+            _resultPool = ResultPool()
+        return _resultPool
+
+
+def setResultPool(pool):
+    """
+    Replaces the ResultPool used by Plug.getResultAsync(), e.g. in order
+    to change the number of threads. The former pool is not shut down.
+    """
+    global _resultPool
+    with _resultPoolLock:
+        _resultPool = pool
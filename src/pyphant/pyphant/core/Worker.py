@@ -193,7 +193,9 @@ class Worker(object):
         self.getParam(param).unregisterListener(listener, eventType)
 
     def invalidate(self, event=None):
-        map(lambda p: p.invalidate(), self._plugs.values())
+        for plug in self._plugs.values():
+            if event is None or plug.dependsOn(event):
+                plug.invalidate(event)
 
     def getSocket(self, name):
         return self._sockets[name]
@@ -34,11 +34,15 @@ u"""
 
 
 import unittest
+import threading
+import numpy
 import pkg_resources
 import pyphant.core.Param as Param
 from pyphant.core.CompositeWorker import CompositeWorker
 import pyphant.core.EventDispatcher as EventDispatcher
-from pyphant.core import Worker
+from pyphant.core import (Worker, Connectors)
+from pyphant.core.FieldContainer import FieldContainer
+from pyphant.core.MemoryBudget import MemoryBudget
 
 
 class TestCompositeDummyWorker(Worker.Worker):
@@ -72,5 +76,211 @@ class CompositeWorkerParamNameChangeTest(unittest.TestCase):
         TestCompositeDummyWorker(self.composite)
         TestCompositeDummyWorker(self.composite)
 
+class TestCompositeSource(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeSource"
+    _params = [("value", u"Value", 1, None)]
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, subscriber=0):
+        return self.paramValue.value
+
+
+class TestCompositeSum(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeSum"
+    _sockets = [("summand1", Connectors.TYPE_INT),
+                ("summand2", Connectors.TYPE_INT)]
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def add(self, summand1, summand2, subscriber=0):
+        return summand1 + summand2
+
+
+class CompositeWorkerRunTest(unittest.TestCase):
+    def setUp(self):
+        self.composite = CompositeWorker()
+        self.source = TestCompositeSource(self.composite)
+        self.source.paramValue.value = 2
+        self.sum1 = TestCompositeSum(self.composite)
+        self.sum1.socketSummand1.insert(self.source.plugGetValue)
+        self.sum1.socketSummand2.insert(self.source.plugGetValue)
+        self.sum2 = TestCompositeSum(self.composite)
+        self.sum2.socketSummand1.insert(self.source.plugGetValue)
+        self.sum2.socketSummand2.insert(self.sum1.plugAdd)
+
+    def testRun(self):
+        self.assertEqual(self.composite.run(max_workers=2), [6])
+        self.assertTrue(self.sum1.plugAdd.resultIsAvailable())
+
+    def testRunById(self):
+        result = self.composite.run([self.sum1.plugAdd.id,
+                                     self.sum2.plugAdd.id], 1)
+        self.assertEqual(result, [4, 6])
+
+    def testOrder(self):
+        from pyphant.core.Scheduler import RecipeScheduler
+        scheduler = RecipeScheduler([self.sum2.plugAdd])
+        self.assertEqual(scheduler.order, [self.source.plugGetValue,
+                                           self.sum1.plugAdd,
+                                           self.sum2.plugAdd])
+        self.assertEqual(scheduler.priorities[self.source.plugGetValue], 3)
+
+
+class TestCompositeParity(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeParity"
+    _params = [("value", u"Value", 1, None),
+               ("unused", u"Unused", 1, None)]
+    _sockets = [("dummy", Connectors.TYPE_INT)]
+    calls = 0
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getParity(self, subscriber=0):
+        self.calls += 1
+        return self.paramValue.value % 2
+
+
+class TestCompositeCount(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeCount"
+    _sockets = [("number", Connectors.TYPE_INT)]
+    calls = 0
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def count(self, number, subscriber=0):
+        self.calls += 1
+        return number + 1
+
+
+class IncrementalInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.composite = CompositeWorker()
+        self.parity = TestCompositeParity(self.composite)
+        self.counter = TestCompositeCount(self.composite)
+        self.counter.socketNumber.insert(self.parity.plugGetParity)
+        self.assertEqual(self.counter.plugCount.getResult(), 2)
+
+    def testUnreadParam(self):
+        self.parity.paramUnused.value = 5
+        self.assertTrue(self.parity.plugGetParity.resultIsAvailable())
+        self.assertTrue(self.counter.plugCount.resultIsAvailable())
+
+    def testEarlyCutoff(self):
+        self.parity.paramValue.value = 3
+        self.assertFalse(self.counter.plugCount.resultIsAvailable())
+        self.assertEqual(self.counter.plugCount.getResult(), 2)
+        self.assertEqual(self.parity.calls, 2)
+        self.assertEqual(self.counter.calls, 1)
+
+    def testRecompute(self):
+        self.parity.paramValue.value = 2
+        self.assertEqual(self.counter.plugCount.getResult(), 1)
+        self.assertEqual(self.parity.calls, 2)
+        self.assertEqual(self.counter.calls, 2)
+
+    def testUnreadSocket(self):
+        #getParity does not read its socket dummy
+        source = TestCompositeSource(self.composite)
+        self.parity.socketDummy.insert(source.plugGetValue)
+        self.assertTrue(self.parity.plugGetParity.resultIsAvailable())
+
+
+class TestCompositeBlocking(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeBlocking"
+    calls = 0
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, subscriber=0):
+        self.calls += 1
+        self.release.wait()
+        return 42
+
+
+class AsyncResultTest(unittest.TestCase):
+    def setUp(self):
+        self.composite = CompositeWorker()
+        self.worker = TestCompositeBlocking(self.composite)
+        self.worker.release = threading.Event()
+
+    def testDeduplication(self):
+        future1 = self.worker.plugGetValue.getResultAsync()
+        future2 = self.worker.plugGetValue.getResultAsync()
+        self.assertTrue(future1 is future2)
+        self.worker.release.set()
+        self.assertEqual(future1.result(10), 42)
+        self.assertEqual(self.worker.calls, 1)
+        future3 = self.worker.plugGetValue.getResultAsync()
+        self.assertEqual(future3.result(10), 42)
+        self.assertEqual(self.worker.calls, 1)
+
+
+class TestCompositeField(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeField"
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def getField(self, subscriber=0):
+        return FieldContainer(numpy.arange(100.0))
+
+
+class TestCompositeNegate(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestCompositeNegate"
+    _sockets = [("field", Connectors.TYPE_IMAGE)]
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def negate(self, field, subscriber=0):
+        return FieldContainer(-field.data)
+
+
+class MemoryBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.composite = CompositeWorker()
+        self.budget = MemoryBudget(1)
+        self.composite.setMemoryBudget(self.budget)
+        self.source = TestCompositeField(self.composite)
+        self.middle = TestCompositeNegate(self.composite)
+        self.middle.socketField.insert(self.source.plugGetField)
+        self.output = TestCompositeNegate(self.composite)
+        self.output.socketField.insert(self.middle.plugNegate)
+
+    def testEviction(self):
+        result = self.output.plugNegate.getResult()
+        self.assertFalse(self.source.plugGetField.resultIsAvailable())
+        self.assertFalse(self.middle.plugNegate.resultIsAvailable())
+        self.assertTrue(self.output.plugNegate.getResult() is result)
+        self.assertEqual(self.budget.getStatistics()['entries'], 1)
+        self.assertEqual(self.budget.getStatistics()['evictions'], 2)
+        numpy.testing.assert_array_equal(
+            self.middle.plugNegate.getResult().data, -numpy.arange(100.0))
+
+    def testPin(self):
+        self.budget.pin(self.middle.plugNegate)
+        self.output.plugNegate.getResult()
+        self.assertFalse(self.source.plugGetField.resultIsAvailable())
+        self.assertTrue(self.middle.plugNegate.resultIsAvailable())
+
+    def testInvalidate(self):
+        self.output.plugNegate.getResult()
+        self.output.plugNegate.invalidate()
+        self.assertEqual(self.budget.getStatistics()['totalBytes'], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
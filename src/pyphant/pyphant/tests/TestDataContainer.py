@@ -43,7 +43,14 @@ from pyphant.core.DataContainer import (INDEX,
                                         FieldContainer,
                                         SampleContainer,
                                         DataContainer,
-                                        assertEqual)
+                                        assertEqual,
+                                        hashArray,
+                                        splitHash,
+                                        HashAlgorithm,
+                                        HASH_ALGORITHMS,
+                                        setHashAlgorithm,
+                                        getHashAlgorithm)
+import hashlib
 import numpy.testing as nt
 import numpy
 
@@ -452,6 +459,219 @@ class FieldContainerTestCase(unittest.TestCase):
         self.assertEqual(sumField.shortname,
                          u"%s - %s" % (self.shortname, self.shortname))
 
+class DerivedContainerTestCase(unittest.TestCase):
+    def testSource(self):
+        source = FieldContainer(numpy.arange(5.0))
+        source.machine = u"elsewhere"
+        source.creator = u"someone"
+        for derived in [source[1:3], source.getMaskedFC(source.data > 1),
+                        FieldContainer(source.data, source=source)]:
+            self.assertEqual(derived.machine, u"elsewhere")
+            self.assertEqual(derived.creator, u"someone")
+        field = FieldContainer(numpy.arange(5.0), source=source)
+        self.assertEqual(field.dimensions[0].machine, u"elsewhere")
+
+
+class SlotsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.field = FieldContainer(numpy.arange(5.0), u'm',
+                                    longname=u'length', shortname=u'l')
+        self.sample = SampleContainer([self.field], longname=u'table',
+                                      shortname=u't')
+
+    def testNoInstanceDict(self):
+        for container in [self.field, self.field.dimensions[0],
+                          self.sample, INDEX[0]]:
+            self.assertFalse(hasattr(container, '__dict__'))
+
+    def testSealedIsImmutable(self):
+        self.field.longname = u'width'
+        self.sample.seal()
+        self.assertRaises(TypeError, setattr, self.field, 'longname', u'x')
+        self.assertRaises(TypeError, setattr, self.sample, 'shortname', u'x')
+
+    def testPickle(self):
+        import cPickle
+        self.sample.seal()
+        for protocol in [0, 2]:
+            field = cPickle.loads(cPickle.dumps(self.field, protocol))
+            self.assertEqual(field.id, self.field.id)
+            self.assertEqual(field.timestamp, self.field.timestamp)
+            self.assertEqual(field, self.field)
+            sample = cPickle.loads(cPickle.dumps(self.sample, protocol))
+            self.assertEqual(sample.id, self.sample.id)
+            self.assertEqual(sample[u'l'].longname, u'length')
+
+    def testWeakref(self):
+        import weakref
+        self.assertTrue(weakref.ref(self.field)() is self.field)
+
+
+class BlockwiseArithmeticTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data = numpy.random.randn(9, 13)
+        self.mask = self.data > 1.0
+        self.field1 = FieldContainer(self.data, '1 mm', mask=self.mask)
+        self.field2 = FieldContainer(self.data[::-1].copy(), '1 m')
+
+    def testBlocks(self):
+        from pyphant.core import FieldContainer as module
+        regions = list(module._iterBlocks((9, 13), 8 * 13 * 4))
+        self.assertEqual(regions, [(slice(0, 4), ), (slice(4, 8), ),
+                                   (slice(8, 12), )])
+        blockBytes = module.BLOCK_BYTES
+        module.BLOCK_BYTES = 8 * 13 * 2
+        try:
+            difference = self.field2.subtract(self.field1)
+        finally:
+            module.BLOCK_BYTES = blockBytes
+        nt.assert_array_almost_equal(difference.data,
+                                     self.data[::-1] - self.data / 1000)
+        nt.assert_array_equal(difference.mask, self.mask)
+
+    def testOut(self):
+        out = numpy.zeros((9, 13))
+        total = self.field1.add(self.field2, out=out)
+        self.assertTrue(total.data is out)
+        nt.assert_array_almost_equal(out, self.data[::-1] + self.data / 1000)
+        self.assertEqual(total.unit, Quantity('1 m'))
+
+
+class SharingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.field = FieldContainer(numpy.arange(5.0), u'm',
+                                    mask=numpy.zeros(5, dtype=bool),
+                                    attributes={u'a': 1})
+        self.field.seal()
+
+    def testDeepcopySealed(self):
+        self.assertTrue(copy.deepcopy(self.field) is self.field)
+        sample = SampleContainer([self.field])
+        sampleCopy = copy.deepcopy(sample)
+        self.assertFalse(sampleCopy is sample)
+        self.assertTrue(sampleCopy.columns[0] is self.field)
+        sample.seal()
+        self.assertTrue(copy.deepcopy(sample) is sample)
+
+    def testDeriveField(self):
+        derived = self.field.derive()
+        self.assertEqual(derived.id, None)
+        self.assertTrue(derived.dimensions[0] is self.field.dimensions[0])
+        derived.data[0] = 7.0
+        derived.mask[0] = True
+        derived.attributes[u'a'] = 2
+        self.assertEqual(self.field.data[0], 0.0)
+        self.assertFalse(self.field.mask[0])
+        self.assertEqual(self.field.attributes[u'a'], 1)
+        data = numpy.ones(5)
+        derived = self.field.derive(data=data, longname=u'ones')
+        self.assertTrue(derived.data is data)
+        self.assertEqual(derived.longname, u'ones')
+        self.assertEqual(derived.unit, self.field.unit)
+
+    def testDeriveSample(self):
+        sample = SampleContainer([self.field], longname=u'table')
+        sample.seal()
+        column = FieldContainer(numpy.ones(5), longname=u'other',
+                                shortname=u'o')
+        derived = sample.derive(columns=sample.columns + [column])
+        self.assertEqual(derived.longname, u'table')
+        self.assertTrue(derived.columns[0] is self.field)
+        self.assertTrue(derived[u'o'] is column)
+        self.assertEqual(len(sample.columns), 1)
+
+
+class HashTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data = numpy.arange(60.0).reshape(6, 10)
+
+    def digest(self, array, chunkBytes, algorithm=None):
+        m = hashlib.md5()
+        hashArray(m, array, chunkBytes, algorithm)
+        return m.hexdigest()
+
+    def testChunking(self):
+        self.assertEqual(self.digest(self.data, 7),
+                         self.digest(self.data, 1 << 20))
+
+    def testNonContiguous(self):
+        transposed = self.data.T
+        self.assertFalse(transposed.flags.c_contiguous)
+        for chunkBytes in [7, 100, 1 << 20]:
+            self.assertEqual(self.digest(transposed, chunkBytes),
+                             self.digest(transposed.copy(), chunkBytes))
+
+    def testDtypeAndShape(self):
+        self.assertNotEqual(self.digest(self.data, 100),
+                            self.digest(self.data.reshape(10, 6), 100))
+        self.assertNotEqual(self.digest(self.data, 100),
+                            self.digest(self.data.view(numpy.int64), 100))
+
+    def testObjectArray(self):
+        data = numpy.array([u'a', 1, None], dtype=object)
+        self.assertEqual(self.digest(data, 100), self.digest(data, 100))
+
+    def testTag(self):
+        field = FieldContainer(self.data)
+        field.seal()
+        self.assertEqual(splitHash(field.hash)[0], u"md5v2")
+        self.assertEqual(splitHash(u"0123456789abcdef0123456789abcdef"),
+                         (None, u"0123456789abcdef0123456789abcdef"))
+
+    def testTree(self):
+        single = HashAlgorithm(u'md5', hashlib.md5, tree=True, threads=1)
+        multi = HashAlgorithm(u'md5', hashlib.md5, tree=True, threads=4)
+        for array in [self.data, self.data.T]:
+            self.assertEqual(self.digest(array, 24, single),
+                             self.digest(array, 24, multi))
+        self.assertNotEqual(self.digest(self.data, 24, multi),
+                            self.digest(self.data, 24))
+
+    def testTreeNonContiguous(self):
+        tree = HashAlgorithm(u'md5', hashlib.md5, tree=True, threads=1)
+        for array in [self.data.T, self.data[::2, 1:], self.data[:, ::3]]:
+            self.assertFalse(array.flags.c_contiguous)
+            for chunkBytes in [7, 24, 100, 1000]:
+                self.assertEqual(
+                    self.digest(array, chunkBytes, tree),
+                    self.digest(numpy.ascontiguousarray(array), chunkBytes,
+                                tree))
+
+    def testSetHashAlgorithm(self):
+        HASH_ALGORITHMS[u'md5tree'] = HashAlgorithm(u'md5tree', hashlib.md5,
+                                                    tree=True)
+        try:
+            setHashAlgorithm(u'md5tree')
+            self.assertEqual(getHashAlgorithm().tag, u"md5treev2")
+            field = FieldContainer(self.data)
+            field.seal()
+            self.assertEqual(splitHash(field.hash)[0], u"md5treev2")
+            transposed = FieldContainer(self.data.T.copy().T)
+            transposed.seal()
+            self.assertEqual(transposed.hash, field.hash)
+        finally:
+            setHashAlgorithm(u'md5')
+            del HASH_ALGORITHMS[u'md5tree']
+
+    def testStable(self):
+        field1 = FieldContainer(self.data, longname=u"a", shortname=u"a")
+        field2 = FieldContainer(self.data.T.copy().T,
+                                longname=u"a", shortname=u"a")
+        field1.seal()
+        field2.seal()
+        self.assertEqual(field1.hash, field2.hash)
+
+    def testEqualByHash(self):
+        field = FieldContainer(self.data, longname=u"a", shortname=u"a")
+        field.seal()
+        #Sealing with the id of field states that the content is the same,
+        #hence the differing data is not compared anymore.
+        other = FieldContainer(self.data + 1.0, longname=u"a", shortname=u"a")
+        self.assertNotEqual(field, other)
+        other.seal(field.id)
+        self.assertEqual(field, other)
+
+
 class IsValidFieldContainer(unittest.TestCase):
     def setUp(self):
         self.field = FieldContainer(numpy.random.randn(7, 13),
@@ -709,6 +929,128 @@ class AlgebraSampleContainerTests(SampleContainerTest):
         self.assertRaises(ValueError, sc.calcColumn, expr, 'Add', 'a')
 
 
+class ExpressionCacheTests(unittest.TestCase):
+    def makeSample(self, scale):
+        distance = FieldContainer(numpy.array([5., 10., 1.]) * scale,
+                                  Quantity('1.0 m'), longname=u"Distance",
+                                  shortname=u"s")
+        time = FieldContainer(numpy.array([3., 4., 5.]), Quantity('1.0 s'),
+                              longname=u"Time", shortname=u"t")
+        return SampleContainer([distance, time])
+
+    def testReuse(self):
+        from pyphant.core.AstTransformers import ExpressionCache
+        from pyphant.core import DataContainer as module
+        cache = module.EXPRESSION_CACHE
+        module.EXPRESSION_CACHE = ExpressionCache(maxSize=1)
+        try:
+            expr = "col('s') / col('Time') > '2 m / s'"
+            first = self.makeSample(1.0).calcColumn(expr, u'f', u'fast')
+            second = self.makeSample(0.1).calcColumn(expr, u'f', u'fast')
+            nt.assert_array_equal(first.data, [False, True, False])
+            nt.assert_array_equal(second.data, [False, False, False])
+            statistics = module.EXPRESSION_CACHE.getStatistics()
+            self.assertEqual(statistics['hits'], 1)
+            self.assertEqual(statistics['misses'], 1)
+            distance = self.makeSample(1.0).calcColumn("col('s') + '1 cm'",
+                                                       u's', u'Distance')
+            nt.assert_array_almost_equal(distance.data, [5.01, 10.01, 1.01])
+            self.assertEqual(module.EXPRESSION_CACHE.keys()[0][0],
+                             "col('s') + '1 cm'")
+        finally:
+            module.EXPRESSION_CACHE = cache
+
+    def testSchema(self):
+        sample = self.makeSample(1.0)
+        other = self.makeSample(1.0)
+        other.columns[0].unit = Quantity('1.0 km')
+        expr = "col('s') - '1 m'"
+        nt.assert_array_equal(sample.calcColumn(expr, u'd', u'd').data,
+                              [4., 9., 0.])
+        nt.assert_array_almost_equal(
+            other.calcColumn(expr, u'd', u'd').data, [4.999, 9.999, 0.999])
+
+    def testEngines(self):
+        from pyphant.core import AstTransformers
+        numpy.random.seed(1)
+        distance = FieldContainer(numpy.random.rand(1000), Quantity('1.0 m'),
+                                  longname=u"Distance", shortname=u"s")
+        time = FieldContainer(numpy.random.rand(1000) + 1.0, Quantity('1 s'),
+                              longname=u"Time", shortname=u"t")
+        sample = SampleContainer([distance, time])
+        expressions = ["col('s') / col('t') / 3.0 - '1 cm/s'",
+                       "col('s') / col('t') <= '0.3 m/s' or col('s') < '5 cm'"
+                       " and not col('t') > '1500 ms'"]
+        useNumexpr = AstTransformers.USE_NUMEXPR
+        chunkBytes = AstTransformers.CHUNK_BYTES
+        try:
+            for expr in expressions:
+                results = []
+                for use, chunk in [(False, 1 << 40), (False, 24), (True, 24)]:
+                    AstTransformers.USE_NUMEXPR = use
+                    AstTransformers.CHUNK_BYTES = chunk
+                    results.append(sample.calcColumn(expr, u'r', u'r').data)
+                for result in results[1:]:
+                    self.assertEqual(result.dtype, results[0].dtype)
+                    nt.assert_array_equal(result, results[0])
+        finally:
+            AstTransformers.USE_NUMEXPR = useNumexpr
+            AstTransformers.CHUNK_BYTES = chunkBytes
+
+
+class ExtractRowsTests(unittest.TestCase):
+    def setUp(self):
+        self.time = FieldContainer(numpy.arange(6.0), u'1 s',
+                                   longname=u'time', shortname=u't')
+        self.time.seal()
+        self.columns = [
+            FieldContainer(numpy.arange(6.0) * i, u'1 V',
+                           dimensions=[self.time],
+                           longname=u'column %d' % i, shortname=u'c_%d' % i)
+            for i in xrange(3)]
+        self.sample = SampleContainer(self.columns + [
+            FieldContainer(numpy.arange(12.0).reshape(6, 2),
+                           longname=u'pairs', shortname=u'p')])
+
+    def testMaskAndIndices(self):
+        mask = numpy.array([True, False, True, False, False, True])
+        for selection in [mask, numpy.flatnonzero(mask)]:
+            result = self.sample.extractRows(selection, u's', u'selection')
+            nt.assert_array_equal(result[u'c_2'].data, [0.0, 4.0, 10.0])
+            nt.assert_array_equal(result[u'p'].data,
+                                  [[0.0, 1.0], [4.0, 5.0], [10.0, 11.0]])
+            nt.assert_array_equal(result[u'p'].dimensions[0].data, [0, 2, 5])
+
+    def testSlice(self):
+        result = self.sample.extractRows(slice(2, 4), u's', u'rows')
+        nt.assert_array_equal(result[u'c_2'].data, [4.0, 6.0])
+        nt.assert_array_equal(result[u'p'].data, [[4.0, 5.0], [6.0, 7.0]])
+        nt.assert_array_equal(result[u'c_1'].dimensions[0].data, [2.0, 3.0])
+
+    def testSharedDimension(self):
+        self.sample.seal()
+        result = self.sample.extractRows(numpy.array([1, 3]), u's', u'sel')
+        dims = [column.dimensions[0] for column in result.columns[:3]]
+        self.assertTrue(dims[0] is dims[1] is dims[2])
+        nt.assert_array_equal(dims[0].data, [1.0, 3.0])
+        pairs = result[u'p']
+        self.assertTrue(pairs.dimensions[1]
+                        is self.sample[u'p'].dimensions[1])
+
+    def testEmptySelection(self):
+        for selection in [[], numpy.zeros(6, dtype=bool)]:
+            result = self.sample.extractRows(selection, u's', u'none')
+            self.assertEqual(result[u'c_2'].data.shape, (0, ))
+            self.assertEqual(result[u'p'].data.shape, (0, 2))
+            self.assertEqual(result[u'c_1'].dimensions[0].data.shape, (0, ))
+
+    def testLength(self):
+        self.assertRaises(ValueError, self.sample.extractRows,
+                          numpy.ones(4, dtype=bool), u's', u'sel')
+        self.assertRaises(ValueError, self.sample.extractRows,
+                          numpy.array([6]), u's', u'sel')
+
+
 class CommonSampleContainerTests(SampleContainerTest):
     def testLabeling(self):
         self.assertEqual(self.sampleContainer.label,
@@ -1384,6 +1726,61 @@ class FieldContainerSlicing2dDim(FieldContainerSlicing2d):
         self.assertEqual(section, afoot)
 
 
+class FieldContainerViewSlicing(unittest.TestCase):
+    def setUp(self):
+        self.yDim = FieldContainer(numpy.linspace(0.1, 1.0, 10), unit="1m",
+                                   longname="height", shortname="h")
+        self.field = FieldContainer(numpy.arange(20.0).reshape(10, 2),
+                                    mask=numpy.zeros((10, 2), dtype=bool),
+                                    longname="voltage", shortname="U",
+                                    unit="1V")
+        self.field.dimensions[0] = self.yDim
+
+    def testBasicSliceIsView(self):
+        for section in [self.field[2:5], self.field["0.3m:0.6m"]]:
+            self.assertTrue(numpy.may_share_memory(section.data,
+                                                   self.field.data))
+            self.assertTrue(numpy.may_share_memory(section.mask,
+                                                   self.field.mask))
+            self.assertFalse(section.data.flags.writeable)
+            self.assertFalse(section.mask.flags.writeable)
+            nt.assert_array_equal(section.data, self.field.data[2:5])
+            nt.assert_array_equal(section.dimensions[0].data,
+                                  self.yDim.data[2:5])
+        self.assertTrue(self.field.data.flags.writeable)
+
+    def testFancyIndexIsCopy(self):
+        section = self.field[[1, 3], ]
+        self.assertFalse(numpy.may_share_memory(section.data,
+                                                self.field.data))
+        self.assertTrue(section.data.flags.writeable)
+
+    def testDecreasingDimension(self):
+        self.field.dimensions[0] = FieldContainer(
+            numpy.arange(10.0, 0.0, -1.0), unit="1m", longname="height",
+            shortname="h")
+        nt.assert_array_equal(self.field["3m:6m"].data,
+                              self.field.data[5:8])
+
+    def testSealedDimensionChecksOnce(self):
+        from pyphant.core import FieldContainer as FC
+        self.yDim.seal()
+        section = self.field["0.3m:0.6m"]
+        self.assertTrue(FC._increasing[self.yDim.hash])
+        #The cached flag is used instead of scanning the data again.
+        FC._increasing[self.yDim.hash] = False
+        searchInterval = FC._searchInterval
+        calls = []
+        FC._searchInterval = lambda *args: calls.append(args)
+        try:
+            nt.assert_array_equal(self.field["0.3m:0.6m"].data,
+                                  section.data)
+        finally:
+            FC._searchInterval = searchInterval
+            del FC._increasing[self.yDim.hash]
+        self.assertEqual(calls, [])
+
+
 if __name__ == "__main__":
     #suite = unittest.TestLoader().loadTestsFromTestCase(IsValidFieldContainer)
     #unittest.TextTestRunner().run(suite)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2007, Rectorate of the University of Freiburg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+u"""Provides unittest classes for core.Executors"""
+
+
+import unittest
+import time
+import pkg_resources
+from pyphant.core import (Worker, Connectors, CompositeWorker, Executors)
+
+
+class TestExecutorSource(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestExecutorSource"
+    _params = [("value", u"Value", 1, None)]
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, subscriber=0):
+        return self.paramValue.value
+
+
+class TestExecutorSum(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestExecutorSum"
+    _sockets = [("summand1", Connectors.TYPE_INT),
+                ("summand2", Connectors.TYPE_INT)]
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def add(self, summand1, summand2, subscriber=0):
+        return summand1 + summand2
+
+
+class TestExecutorProgress(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestExecutorProgress"
+    _sockets = [("value", Connectors.TYPE_INT)]
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, value, subscriber=0):
+        subscriber %= 50
+        return value
+
+
+class ProgressRecorder(object):
+    def __init__(self):
+        self.percentages = []
+
+    def startProcess(self, process):
+        pass
+
+    def updateProcess(self, process, percentage):
+        self.percentages.append(percentage)
+
+    def finishProcess(self, process):
+        pass
+
+    def inputsCollected(self, process, inputs):
+        pass
+
+
+class ExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.recipe = CompositeWorker.CompositeWorker()
+        self.source1 = TestExecutorSource(self.recipe)
+        self.source1.paramValue.value = 2
+        self.source2 = TestExecutorSource(self.recipe)
+        self.source2.paramValue.value = 40
+        self.summer = TestExecutorSum(self.recipe)
+        self.summer.socketSummand1.insert(self.source1.plugGetValue)
+        self.summer.socketSummand2.insert(self.source2.plugGetValue)
+
+    def testDefaultExecutor(self):
+        self.assertTrue(self.summer.plugAdd.getExecutor()
+                        is Executors.DEFAULT_EXECUTOR)
+        self.assertEqual(self.summer.plugAdd.getResult(), 42)
+
+    def testInlineExecutor(self):
+        executor = Executors.InlineExecutor()
+        self.recipe.setExecutor(executor)
+        self.assertTrue(self.summer.plugAdd.getExecutor() is executor)
+        self.assertEqual(self.summer.plugAdd.getResult(), 42)
+
+    def testPlugExecutor(self):
+        executor = Executors.InlineExecutor()
+        self.recipe.setExecutor(Executors.ThreadExecutor())
+        self.summer.plugAdd.executor = executor
+        self.assertTrue(self.summer.plugAdd.getExecutor() is executor)
+        self.assertEqual(self.summer.plugAdd.getResult(), 42)
+
+    def testProcessExecutor(self):
+        executor = Executors.ProcessExecutor(2)
+        self.recipe.setExecutor(executor)
+        try:
+            self.assertEqual(self.summer.plugAdd.getResult(), 42)
+        finally:
+            executor.close()
+
+    def testProcessExecutorWorkerState(self):
+        state = Executors._getWorkerState(self.source2)
+        self.assertEqual(state[0], TestExecutorSource)
+        self.assertEqual(state[2]['value'], 40)
+        worker = Executors._createWorker(state)
+        self.assertTrue(worker.parent is None)
+        self.assertEqual(worker.getValue(), 40)
+
+    def testProcessExecutorProgress(self):
+        executor = Executors.ProcessExecutor(1)
+        progress = TestExecutorProgress(self.recipe)
+        progress.socketValue.insert(self.summer.plugAdd)
+        self.recipe.setExecutor(executor)
+        recorder = ProgressRecorder()
+        try:
+            self.assertEqual(progress.plugGetValue.getResult(recorder), 42)
+        finally:
+            executor.close()
+        self.assertTrue(50 in recorder.percentages)
+
+
+class TestExecutorFailure(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestExecutorFailure"
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, subscriber=0):
+        time.sleep(0.05)
+        raise ValueError("Failure")
+
+
+class TestExecutorLoop(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestExecutorLoop"
+    iterations = 0
+
+    @Worker.plug(Connectors.TYPE_INT)
+    def getValue(self, subscriber=0):
+        for i in xrange(1000):
+            self.iterations = i
+            subscriber %= i / 10
+            time.sleep(0.01)
+        return 1
+
+
+class CancellationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.recipe = CompositeWorker.CompositeWorker()
+        self.loop = TestExecutorLoop(self.recipe)
+
+    def testTimeout(self):
+        self.loop.plugGetValue.timeout = 0.1
+        self.assertRaises(Connectors.PlugTimeoutError,
+                          self.loop.plugGetValue.getResult)
+        self.assertTrue(self.loop.iterations < 100)
+
+    def testCancel(self):
+        subscriber = Connectors.CancellableSubscriber()
+        subscriber.cancel()
+        self.assertRaises(Connectors.CancelledError,
+                          self.loop.plugGetValue.getResult, subscriber)
+        self.assertEqual(self.loop.iterations, 0)
+
+    def testProcessExecutorTimeout(self):
+        executor = Executors.ProcessExecutor(1)
+        self.recipe.setExecutor(executor)
+        self.loop.plugGetValue.timeout = 0.2
+        start = time.time()
+        try:
+            self.assertRaises(Connectors.PlugTimeoutError,
+                              self.loop.plugGetValue.getResult)
+            self.assertTrue(time.time() - start < 2.0)
+        finally:
+            #Waits for the child process, which is cancelled as well.
+            executor.close()
+        self.assertTrue(time.time() - start < 4.0)
+
+    def testSiblingCancellation(self):
+        failure = TestExecutorFailure(self.recipe)
+        summer = TestExecutorSum(self.recipe)
+        summer.socketSummand1.insert(failure.plugGetValue)
+        summer.socketSummand2.insert(self.loop.plugGetValue)
+        self.assertRaises(RuntimeError, summer.plugAdd.getResult)
+        self.assertTrue(self.loop.iterations < 100)
+        self.assertFalse(self.loop.plugGetValue.resultIsAvailable())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -164,6 +164,48 @@ class SCReadOnlyTestCase(SampleContainerTestCase):
         self.assertEqual(self.sc, scLoaded)
 
 
+class RegionTestCase(SampleContainerTestCase):
+    def setUp(self):
+        SampleContainerTestCase.setUp(self)
+        from numpy import arange
+        self.stack = FieldContainer(arange(60.0).reshape(3, 4, 5), PQ('1V'),
+                                    longname=u'stack', shortname=u'S')
+        self.stack.dimensions[0] = FieldContainer(
+            NPArray([1.0, 2.0, 3.0]), PQ('1mm'), longname=u'z',
+            shortname=u'z')
+        self.stack.seal()
+        osHandle, self.regionFilename = mkstemp(
+            suffix = '.h5', prefix = 'pyphantH5FileHandlerTest')
+        os.close(osHandle)
+        handler = H5FH(self.regionFilename, 'w')
+        with handler:
+            handler.saveDataContainer(self.stack)
+            handler.saveDataContainer(self.sc)
+
+    def tearDown(self):
+        os.remove(self.regionFilename)
+
+    def testField(self):
+        handler = H5FH(self.regionFilename, 'r')
+        with handler:
+            plane = handler.loadDataContainer(self.stack.id, region=1)
+            part = handler.loadDataContainer(self.stack.id,
+                                             region=("2mm:4mm", slice(1, 3)))
+        self.assertEqual(plane.id, None)
+        self.assertEqual(plane, self.stack[1])
+        self.assertEqual(part, self.stack["2mm:4mm", 1:3])
+        self.assertEqual(part.dimensions[0].data.tolist(), [2.0, 3.0])
+
+    def testSample(self):
+        handler = H5FH(self.regionFilename, 'r')
+        with handler:
+            rows = handler.loadDataContainer(self.sc.id, region=slice(1, 3))
+        self.assertEqual(rows.id, None)
+        self.assertEqual(rows.columns[0].data.tolist(), [-103.5, 1000.43])
+        self.assertEqual(rows.columns[0].error.tolist(), [0.2, 4.5])
+        self.assertEqual(rows.columns[1].data.tolist(), [5.3, 600.9])
+
+
 class MixedAppendTestCase(SampleContainerTestCase):
     def setUp(self):
         SampleContainerTestCase.setUp(self)
@@ -32,7 +32,13 @@
 u"""Provides unittest classes for core.Helpers"""
 
 import unittest
-from pyphant.core.Helpers import parseFCUnit
+import os
+import tempfile
+import pkg_resources
+import numpy
+from pyphant.core import (Helpers, Worker, Connectors)
+from pyphant.core.DataContainer import (FieldContainer, SampleContainer)
+from pyphant.core.Helpers import (parseFCUnit, _readBatchCheckpoint)
 from pyphant.quantities import Quantity
 
 
@@ -47,5 +53,156 @@ class ParseFCUnitTestCase(unittest.TestCase):
         self.assertEqual(parseFCUnit("120 mm"), Quantity("120 mm"))
 
 
+class IdentityTestCase(unittest.TestCase):
+    def testCached(self):
+        machine = Helpers.getMachine()
+        username = Helpers.getUsername()
+        self.assertTrue(Helpers.getMachine() is machine)
+        self.assertTrue(Helpers.getUsername() is username)
+        Helpers.refreshIdentity()
+        self.assertEqual(Helpers.getMachine(), machine)
+        self.assertEqual(Helpers.getUsername(), username)
+
+
+class TestHelpersWorker(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestHelpersWorker"
+
+
+class TestHelpersDouble(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestHelpersDouble"
+    _sockets = [("field", Connectors.TYPE_IMAGE)]
+    calls = 0
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def double(self, field, subscriber=0):
+        TestHelpersDouble.calls += 1
+        return FieldContainer(field.data * 2, longname=u'double',
+                              shortname=u'd')
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        from pyphant.core.KnowledgeManager import KnowledgeManager
+        from pyphant.core.CompositeWorker import CompositeWorker
+        km = KnowledgeManager.getInstance()
+        ids = []
+        for i in xrange(5):
+            field = FieldContainer(numpy.arange(3.0) + i, longname=u'f',
+                                   shortname=u'f')
+            field.seal()
+            km.registerDataContainer(field, temporary=True)
+            ids.append(field.id)
+        self.input = SampleContainer(
+            [FieldContainer(numpy.array(ids), longname=u'emd5',
+                            shortname=u'e')],
+            longname=u'inputs', shortname=u'i')
+        self.input.seal()
+        self.recipe = CompositeWorker()
+        self.double = TestHelpersDouble(self.recipe)
+        handle, self.checkpoint = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.checkpoint)
+        TestHelpersDouble.calls = 0
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def run_batch(self, input, processes=1):
+        from pyphant.core.KnowledgeManager import KnowledgeManager
+        km = KnowledgeManager.getInstance()
+        output = Helpers.batch(self.recipe, input, self.double.plugDouble,
+                               u'outputs', temporary=True,
+                               processes=processes, chunksize=2,
+                               checkpoint=self.checkpoint)
+        return [km.getDataContainer(dcId).data.tolist()
+                for dcId in output['emd5'].data]
+
+    def testProcessesAndResume(self):
+        expected = [[2.0 * (j + i) for j in xrange(3)] for i in xrange(5)]
+        self.assertEqual(self.run_batch(self.input, 2), expected)
+        lines = open(self.checkpoint).readlines()
+        self.assertEqual(len([l for l in lines if l[0] != '#']), 5)
+        #Resume from the header and the first three rows
+        checkpointFile = open(self.checkpoint, 'w')
+        checkpointFile.writelines(
+            [l for l in lines if l[0] == '#']
+            + sorted([l for l in lines if l[0] != '#'])[:3])
+        checkpointFile.close()
+        self.assertEqual(self.run_batch(self.input), expected)
+        self.assertEqual(TestHelpersDouble.calls, 2)
+        #Another input discards the checkpoint.
+        TestHelpersDouble.calls = 0
+        other = SampleContainer([self.input['emd5'].derive()],
+                                longname=u'other', shortname=u'o')
+        other.seal()
+        self.assertEqual(self.run_batch(other), expected)
+        self.assertEqual(TestHelpersDouble.calls, 5)
+
+    def testUnsealedInput(self):
+        input = SampleContainer([self.input['emd5'].derive()],
+                                longname=u'inputs', shortname=u'i')
+        self.assertRaises(ValueError, Helpers.batch, self.recipe, input,
+                          self.double.plugDouble, u'outputs',
+                          checkpoint=self.checkpoint)
+        self.assertEqual(input.id, None)
+
+
+class BatchCheckpointTestCase(unittest.TestCase):
+    class DummyKM(object):
+        def getEmd5List(self):
+            return [u'emd5://m/u/d/a.field', u'emd5://m/u/d/c.field']
+
+    header = {u'input': u'emd5://m/u/d/in.sample', u'plug': u'w.plug',
+              u'recipe': u'0123', u'rows': u'3'}
+
+    def setUp(self):
+        handle, self.checkpoint = tempfile.mkstemp()
+        os.write(handle, "#input emd5://m/u/d/in.sample\n#plug w.plug\n"
+                 "#recipe 0123\n#rows 3\n"
+                 "0 emd5://m/u/d/a.field\n"
+                 "1 emd5://m/u/d/b.field\n\n"
+                 "2 emd5://m/u/d/c.field\n")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.checkpoint)
+
+    def testKnownRows(self):
+        rows = _readBatchCheckpoint(self.checkpoint, self.DummyKM())
+        self.assertEqual(rows, [(0, u'emd5://m/u/d/a.field'),
+                                (2, u'emd5://m/u/d/c.field')])
+
+    def testMissingCheckpoint(self):
+        self.assertEqual(_readBatchCheckpoint(self.checkpoint + 'x',
+                                              self.DummyKM()), None)
+
+    def testHeader(self):
+        rows = _readBatchCheckpoint(self.checkpoint, self.DummyKM(),
+                                    self.header)
+        self.assertEqual(len(rows), 2)
+        for key in self.header:
+            header = self.header.copy()
+            header[key] = u'other'
+            self.assertEqual(_readBatchCheckpoint(
+                self.checkpoint, self.DummyKM(), header), None)
+
+    def testRecipeFingerprint(self):
+        from pyphant.core.CompositeWorker import CompositeWorker
+        recipe = CompositeWorker()
+        worker = TestHelpersWorker(recipe)
+        fingerprint = Helpers._getRecipeFingerprint(recipe)
+        self.assertEqual(Helpers._getRecipeFingerprint(recipe), fingerprint)
+        worker.getParam('name').value = u'renamed'
+        self.assertNotEqual(Helpers._getRecipeFingerprint(recipe),
+                            fingerprint)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -35,10 +35,31 @@ u"""Provides unittest classes for KnowledgeNode.
 
 import unittest
 from pyphant.core.KnowledgeNode import (KnowledgeNode, RemoteKN,
-                                        get_kn_autoport)
+                                        get_kn_autoport, dumpRegion,
+                                        loadRegion)
 import tempfile
 import os
 import socket
+try:
+    from json import dumps
+except ImportError:
+    from simplejson import dumps
+
+
+class RegionTestCase(unittest.TestCase):
+    def testRoundTrip(self):
+        for region in [3, slice(2, None), (slice(1, 5, 2), 2),
+                       ([1, 3, 7], ), [0, slice(None)]]:
+            self.assertEqual(loadRegion(dumpRegion(region)), region)
+
+    def testRejectStrings(self):
+        payload = u"1m:2 __import__('sys').exit(1) or m"
+        self.assertRaises(ValueError, dumpRegion, (payload, ))
+        for text in [dumps(payload), dumps({'tuple': [payload]}),
+                     dumps({'slice': [0, payload, None]}),
+                     dumps([{'slice': [0, 1.5, None]}]), dumps(True),
+                     dumps({'tuple': [1], 'slice': [0, 1, None]})]:
+            self.assertRaises(ValueError, loadRegion, text)
 
 
 class KnowledgeNodeTestCase(unittest.TestCase):
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2009, Rectorate of the University of Freiburg
+# Copyright (c) 2009-2010, Andreas W. Liehr (liehr@users.sourceforge.net)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+u"""Provides unittest classes for core.LazyFieldContainer"""
+
+
+import unittest
+import os
+import tempfile
+import cPickle
+import numpy
+from pyphant.core.FieldContainer import FieldContainer
+from pyphant.core.LazyFieldContainer import (LazyFieldContainer,
+                                             NpyArraySource)
+
+
+class LazyFieldContainerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data = numpy.arange(60.0).reshape(4, 15)
+        fd, self.filename = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        numpy.save(self.filename, self.data)
+        self.field = LazyFieldContainer(NpyArraySource(self.filename),
+                                        unit='1 V', longname=u'voltage',
+                                        shortname=u'U')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testConstruction(self):
+        self.assertFalse(self.field.isMaterialized())
+        self.assertEqual(self.field.rawDataBytes,
+                         self.data.nbytes + 4 * 8 + 15 * 8)
+        self.assertEqual(self.field.dimensions[0].data.shape, (4, ))
+        self.assertFalse(self.field.isMaterialized())
+        self.assertEqual(self.field.mask, None)
+
+    def testSlicing(self):
+        part = self.field[1:3, 5]
+        self.assertFalse(self.field.isMaterialized())
+        self.assertEqual(type(part), FieldContainer)
+        numpy.testing.assert_array_equal(part.data, self.data[1:3, 5])
+        self.assertEqual(part.attributes.keys(),
+                         [self.field.dimensions[1].longname])
+
+    def testMaterialize(self):
+        eager = FieldContainer(self.data.copy(), unit='1 V',
+                               longname=u'voltage', shortname=u'U')
+        self.assertEqual(self.field, eager)
+        self.assertTrue(self.field.isMaterialized())
+        self.field.seal()
+        eager.seal()
+        self.assertEqual(self.field.hash, eager.hash)
+
+    def testSealWithId(self):
+        eager = FieldContainer(self.data.copy())
+        eager.seal()
+        field = LazyFieldContainer(NpyArraySource(self.filename))
+        field.seal(eager.id)
+        self.assertEqual(field.hash, eager.hash)
+        self.assertFalse(field.isMaterialized())
+        self.assertFalse(field.data.flags.writeable)
+
+    def testArithmetic(self):
+        eager = FieldContainer(numpy.ones((4, 15)), unit='1 mV')
+        difference = self.field - eager
+        self.assertFalse(self.field.isMaterialized())
+        numpy.testing.assert_array_almost_equal(difference.data,
+                                                self.data - 0.001)
+
+    def testPickle(self):
+        eager = FieldContainer(self.data.copy())
+        eager.seal()
+        self.field.seal(eager.id)
+        field = cPickle.loads(cPickle.dumps(self.field, 2))
+        self.assertFalse(field.isMaterialized())
+        self.assertEqual(field.id, self.field.id)
+        numpy.testing.assert_array_equal(field.data, self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2007, Rectorate of the University of Freiburg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+u"""Provides unittest classes for core.Profiler"""
+
+
+import unittest
+import os
+import tempfile
+import numpy
+import pkg_resources
+from pyphant.core import (Worker, Connectors, CompositeWorker)
+from pyphant.core.Profiler import Profiler
+from pyphant.core.FieldContainer import FieldContainer
+try:
+    from json import load
+except ImportError:
+    from simplejson import load
+
+
+class TestProfilerSource(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestProfilerSource"
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def getField(self, subscriber=0):
+        return FieldContainer(numpy.zeros(100))
+
+
+class TestProfilerDouble(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestProfilerDouble"
+    _sockets = [("field", Connectors.TYPE_IMAGE)]
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def double(self, field, subscriber=0):
+        subscriber %= 50
+        return FieldContainer(numpy.zeros(200))
+
+
+class TestProfilerFailure(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestProfilerFailure"
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def getField(self, subscriber=0):
+        raise ValueError("Failure")
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.recipe = CompositeWorker.CompositeWorker()
+        self.source = TestProfilerSource(self.recipe)
+        self.double = TestProfilerDouble(self.recipe)
+        self.double.socketField.insert(self.source.plugGetField)
+        self.profiler = Profiler()
+        self.double.plugDouble.getResult(self.profiler)
+
+    def testRecords(self):
+        records = self.profiler.getRecords()
+        self.assertEqual([record.plug for record in records],
+                         [self.source.plugGetField, self.double.plugDouble])
+        source, double = records
+        self.assertEqual(double.inputBytes,
+                         self.source.plugGetField.getResult().rawDataBytes)
+        self.assertEqual(double.outputBytes,
+                         self.double.plugDouble.getResult().rawDataBytes)
+        self.assertTrue(double.outputBytes > double.inputBytes > 0)
+        self.assertTrue(double.waitTime >= source.wallTime)
+        self.assertAlmostEqual(double.wallTime,
+                               double.waitTime + double.computeTime)
+
+    def testReport(self):
+        report = self.recipe.getPerformanceReport(self.profiler)
+        self.assertEqual(len(report), 2)
+        self.assertEqual(set([entry['class'] for entry in report]),
+                         set(['TestProfilerSource', 'TestProfilerDouble']))
+        self.assertEqual(sum([entry['calls'] for entry in report]), 2)
+
+    def testFailure(self):
+        failure = TestProfilerFailure(self.recipe)
+        self.assertRaises(ValueError, failure.plugGetField.getResult,
+                          self.profiler)
+        self.assertEqual(self.profiler._running, {})
+        self.assertEqual(self.profiler.getRecords()[-1].plug,
+                         failure.plugGetField)
+
+    def testExport(self):
+        handle, filename = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            self.profiler.saveChromeTrace(filename)
+            events = load(open(filename))['traceEvents']
+            threads = set([record.thread
+                           for record in self.profiler.getRecords()])
+            metadata = [event for event in events if event['ph'] == 'M']
+            self.assertEqual(len(events), 4 + len(threads))
+            self.assertEqual(set([event['args']['name']
+                                  for event in metadata]), threads)
+            for event in events:
+                self.assertTrue(isinstance(event['tid'], int))
+            self.profiler.saveJSON(filename)
+            data = load(open(filename))
+            self.assertEqual(len(data['workers']), 2)
+            self.assertEqual(len(data['plugs']), 2)
+        finally:
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
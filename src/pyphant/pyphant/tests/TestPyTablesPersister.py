@@ -34,6 +34,7 @@ u"""Provides unittest classes FieldContainerTestCase.
 """
 
 
+from __future__ import with_statement
 import unittest
 
 import scipy
@@ -45,6 +46,10 @@ from pyphant.core.PyTablesPersister import (saveField, loadField, saveSample,
                                             loadExecutionOrders)
 import numpy
 import tables
+import pkg_resources
+from pyphant.core import (Worker, Connectors)
+from pyphant.core.CompositeWorker import CompositeWorker
+from pyphant.core.H5FileHandler import H5FileHandler
 
 class ContainerTestCase(unittest.TestCase):
     def setUp(self):
@@ -120,6 +125,171 @@ class FieldContainerTestCaseWithMask(FieldContainerTestCase):
         super(FieldContainerTestCase,self).setUp()
         self.field.mask = self.field.data>3
 
+class H5FileTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.path = tempfile.mktemp(suffix='.h5')
+
+    def tearDown(self):
+        import os
+        os.remove(self.path)
+
+    def save(self, field):
+        h5 = tables.openFile(self.path, 'w')
+        h5.createGroup(h5.root, 'results')
+        group = h5.createGroup(h5.root, 'field', field.id)
+        saveField(h5, group, field)
+        h5.close()
+
+    def load(self):
+        h5 = tables.openFile(self.path)
+        try:
+            return loadField(h5, h5.root.field)
+        finally:
+            h5.close()
+
+class StorageLayoutTestCase(H5FileTestCase):
+    def setUp(self):
+        super(StorageLayoutTestCase, self).setUp()
+        data = numpy.arange(3000.0).reshape(100, 30)
+        self.field = FieldContainer(data, unit='1 V', mask=data % 7 == 0,
+                                    error=0.1 * data, longname=u'voltage',
+                                    shortname=u'U')
+        self.field.seal()
+
+    def testChunkedCompressed(self):
+        self.save(self.field)
+        h5 = tables.openFile(self.path)
+        try:
+            for name in ['data', 'error', 'mask']:
+                node = getattr(h5.root.field, name)
+                self.assertTrue(isinstance(node, tables.CArray))
+                self.assertTrue(node.filters.complevel > 0)
+            self.assertEqual(h5.root.field.mask.shape, (3000 / 8, ))
+            restored = loadField(h5, h5.root.field)
+            numpy.testing.assert_array_equal(restored.mask, self.field.mask)
+            self.assertEqual(restored.mask.dtype, numpy.bool_)
+            self.assertEqual(restored, self.field)
+        finally:
+            h5.close()
+
+    def testAllFalseMask(self):
+        field = FieldContainer(self.field.data, mask=numpy.zeros((100, 30),
+                                                                 dtype=bool))
+        field.seal()
+        self.save(field)
+        restored = self.load()
+        self.assertEqual(restored.mask.shape, (100, 30))
+        self.assertFalse(restored.mask.any())
+
+    def testLegacyLayout(self):
+        h5 = tables.openFile(self.path, 'w')
+        group = h5.createGroup(h5.root, 'field', self.field.id)
+        h5.createArray(group, 'data', self.field.data, 'voltage')
+        h5.createArray(group, 'mask', self.field.mask, 'Mask of voltage')
+        for key in ['longname', 'shortname', 'creator', 'machine']:
+            h5.setNodeAttr(group, key, getattr(self.field, key).encode())
+        h5.setNodeAttr(group, 'unit', repr(self.field.unit))
+        h5.close()
+        restored = self.load()
+        numpy.testing.assert_array_equal(restored.data, self.field.data)
+        numpy.testing.assert_array_equal(restored.mask, self.field.mask)
+
+    def testLazyMask(self):
+        self.save(self.field)
+        h5 = tables.openFile(self.path)
+        try:
+            restored = loadField(h5, h5.root.field, lazy=True)
+        finally:
+            h5.close()
+        part = restored[3:17, 4:9]
+        self.assertFalse(restored.isMaterialized('mask'))
+        numpy.testing.assert_array_equal(part.mask, self.field.mask[3:17, 4:9])
+        numpy.testing.assert_array_equal(restored.mask, self.field.mask)
+
+class EncodingTestCase(H5FileTestCase):
+    def roundTrip(self, data):
+        field = FieldContainer(data, longname=u'names', shortname=u'n')
+        field.seal()
+        self.save(field)
+        return self.load().data
+
+    def testUnicode(self):
+        data = numpy.array([[u'Hallo World!', u''], [u'Hallo W\xf6rld!', u'x']])
+        for array in [data, data.astype(object)]:
+            restored = self.roundTrip(array)
+            self.assertEqual(restored.dtype.char, 'U')
+            numpy.testing.assert_array_equal(restored, data)
+        h5 = tables.openFile(self.path)
+        try:
+            self.assertEqual(h5.root.field._v_attrs.dataEncoding, 'utf-8')
+            self.assertEqual(h5.root.field.data.dtype, numpy.uint8)
+        finally:
+            h5.close()
+
+    def testBytesAndObjects(self):
+        data = numpy.array(['1.5', 'abc'])
+        numpy.testing.assert_array_equal(self.roundTrip(data), data)
+        numbers = numpy.array([1, 2.5], dtype=object)
+        numpy.testing.assert_array_equal(self.roundTrip(numbers), [1., 2.5])
+        mixed = numpy.array([None, {'a': 1}], dtype=object)
+        self.assertEqual(self.roundTrip(mixed).tolist(), mixed.tolist())
+
+    def testJSON(self):
+        elements = [None, u'\xe4', 'abc', 1 + 2j, (1, u'b'), [2.5],
+                    Quantity('1.5 mm/s'), datetime.datetime(2009, 3, 1, 7),
+                    {u'a': None}]
+        data = numpy.empty(len(elements), dtype=object)
+        for index, element in enumerate(elements):
+            data[index] = element
+        self.assertEqual(self.roundTrip(data).tolist(), elements)
+        h5 = tables.openFile(self.path)
+        try:
+            self.assertEqual(h5.root.field._v_attrs.dataEncoding, 'json')
+        finally:
+            h5.close()
+        unknown = numpy.array([None, set([1])], dtype=object)
+        self.assertEqual(self.roundTrip(unknown).tolist(),
+                         [None, u'set([1])'])
+
+    def testDatetime(self):
+        data = numpy.array([datetime.datetime(2009, 3, 1, 12, 30, 15, 7),
+                            datetime.datetime(1999, 12, 31)])
+        restored = self.roundTrip(data)
+        self.assertEqual(restored.dtype, object)
+        self.assertEqual(restored.tolist(), data.tolist())
+
+    def testVersion1(self):
+        field = FieldContainer(numpy.array([u'\xe4', u'b']),
+                               longname=u'names', shortname=u'n')
+        field.seal()
+        h5 = tables.openFile(self.path, 'w')
+        group = h5.createGroup(h5.root, 'field', field.id)
+        h5.createArray(group, 'data', numpy.array(['\xc3\xa4', 'b']), 'names')
+        for key in ['longname', 'shortname', 'creator', 'machine']:
+            h5.setNodeAttr(group, key, getattr(field, key).encode('utf-8'))
+        h5.setNodeAttr(group, 'unit', repr(field.unit))
+        h5.close()
+        numpy.testing.assert_array_equal(self.load().data, field.data)
+
+    def testVersion1Literals(self):
+        from pyphant.core.PyTablesPersister import _loadDataVersion1
+        h5 = tables.openFile(self.path, 'w')
+        texts = ["None", "1.5", "Quantity(2.5,'mm')",
+                 "datetime.datetime(2009, 1, 2, 3, 4, 5, 6)"]
+        h5.createArray(h5.root, 'data', numpy.array(texts))
+        h5.createGroup(h5.root, 'unsafe')
+        h5.createArray(h5.root.unsafe, 'data',
+                       numpy.array(["__import__('os').getcwd()", "1"]))
+        try:
+            self.assertEqual(_loadDataVersion1(h5.root).tolist(),
+                             [None, 1.5, Quantity('2.5 mm'),
+                              datetime.datetime(2009, 1, 2, 3, 4, 5, 6)])
+            self.assertEqual(_loadDataVersion1(h5.root.unsafe).tolist(),
+                             [u"__import__('os').getcwd()", u'1'])
+        finally:
+            h5.close()
+
 class SampleContainerTestCase(ContainerTestCase):
     def setUp(self):
         super(SampleContainerTestCase,self).setUp()
@@ -167,6 +337,63 @@ class SampleContainerInSampleContainerTestCase(SampleContainerTestCase):
                                       attributes = copy.copy(self.attributes).update({'isSample':'It seems so.'}))
         self.sample.seal()
 
+class FieldSource(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "FieldSource"
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def getField(self, subscriber=0):
+        field = FieldContainer(numpy.arange(6.).reshape(2, 3), unit='1 V')
+        field.seal()
+        return field
+
+
+class LazyRecipeTestCase(H5FileTestCase):
+    def setUp(self):
+        H5FileTestCase.setUp(self)
+        recipe = CompositeWorker()
+        self.result = FieldSource(recipe).getPlug('getField').getResult()
+        with H5FileHandler(self.path, 'w') as handler:
+            handler.saveRecipe(recipe)
+
+    def loadPlug(self):
+        with H5FileHandler(self.path, 'r') as handler:
+            recipe = handler.loadRecipe()
+        return recipe.getWorker('FieldSource').getPlug('getField')
+
+    def testResolveOnGetResult(self):
+        plug = self.loadPlug()
+        self.assertEqual(plug._result, None)
+        self.assertTrue(plug.resultIsAvailable())
+        self.assertEqual(plug.getAvailableResult(), self.result)
+        self.assertEqual(plug._result, None)
+        self.assertEqual(plug.getResult(), self.result)
+        self.assertEqual(plug._result, self.result)
+
+    def testConcurrentLoads(self):
+        import threading
+        results = []
+        with H5FileHandler(self.path, 'r') as handler:
+            plug = handler.loadRecipe().getWorker('FieldSource').getPlug(
+                'getField')
+            threads = [threading.Thread(
+                target=lambda: results.append(plug.getAvailableResult()))
+                       for i in xrange(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [self.result] * 8)
+
+    def testOverwrite(self):
+        plug = self.loadPlug()
+        with H5FileHandler(self.path, 'w') as handler:
+            handler.saveRecipe(CompositeWorker())
+        self.assertEqual(plug.getResult(), self.result)
+
+
 class ExecutionOrderTestCase(unittest.TestCase):
     def setUp(self):
         import tempfile
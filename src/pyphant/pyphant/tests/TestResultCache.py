@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2006-2007, Rectorate of the University of Freiburg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+# * Neither the name of the Freiburg Materials Research Center,
+#   University of Freiburg nor the names of its contributors may be used to
+#   endorse or promote products derived from this software without specific
+#   prior written permission.
+#
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER
+# OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+u"""Provides unittest classes for core.ResultCache"""
+
+
+import unittest
+import pkg_resources
+import tempfile
+import shutil
+import os
+import numpy
+from pyphant.core import (Worker, Connectors)
+from pyphant.core.ResultCache import (ResultCache, UncacheableError)
+from pyphant.core.DataContainer import FieldContainer
+
+
+class TestResultCacheWorker(Worker.Worker):
+    API = 2
+    VERSION = 1
+    REVISION = pkg_resources.get_distribution("pyphant").version
+    name = "TestResultCacheWorker"
+    _params = [("factor", u"Factor", 2, None)]
+    _sockets = [("field", Connectors.TYPE_IMAGE)]
+
+    @Worker.plug(Connectors.TYPE_IMAGE)
+    def scale(self, field, subscriber=0):
+        return FieldContainer(field.data * self.paramFactor.value)
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResultCache(
+            max_entries=1, dbase=os.path.join(self.tmpdir, 'cache.sqlite3'))
+        self.worker = TestResultCacheWorker()
+        self.plug = self.worker.plugScale
+        self.field = FieldContainer(numpy.arange(10.0))
+        self.field.seal()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testKey(self):
+        key = self.cache.getKey(self.plug, {'field': self.field})
+        self.assertEqual(key, self.cache.getKey(self.plug,
+                                                {'field': self.field}))
+        self.worker.paramFactor.value = 3
+        self.assertNotEqual(key, self.cache.getKey(self.plug,
+                                                   {'field': self.field}))
+
+    def testUnsealedInput(self):
+        field = FieldContainer(numpy.arange(10.0))
+        self.assertEqual(self.cache.getKey(self.plug, {'field': field}),
+                         None)
+
+    def testSequences(self):
+        fingerprint = self.cache._fingerprint
+        self.assertNotEqual(fingerprint((1, [2])), fingerprint([1, (2, )]))
+        other = FieldContainer(numpy.arange(10.0) + 1)
+        other.seal()
+        self.assertNotEqual(fingerprint((self.field, 1)),
+                            fingerprint((other, 1)))
+        self.assertEqual(fingerprint([self.field]),
+                         "[dc:" + self.field.hash.encode('utf-8') + "]")
+        for value in [(FieldContainer(numpy.arange(3.0)), ),
+                      [1, (object(), )]]:
+            self.assertRaises(UncacheableError, fingerprint, value)
+
+    def testStoreAndLookup(self):
+        key = self.cache.getKey(self.plug, {'field': self.field})
+        self.assertEqual(self.cache.lookup(key), None)
+        result = self.worker.scale(self.field)
+        self.cache.store(key, result)
+        self.assertEqual(self.cache.lookup(key).id, result.id)
+        stats = self.cache.getStatistics()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (1, 1, 1))
+
+    def testEviction(self):
+        self.cache.store('key1', self.field)
+        self.cache.store('key2', FieldContainer(numpy.arange(5.0)))
+        self.assertEqual(self.cache.getStatistics()['entries'], 1)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def testStoreTemporary(self):
+        self.cache.km.registerDataContainer(self.field, temporary=True)
+        self.cache.store('key1', self.field)
+        self.assertFalse(self.cache.km.isTemporary(self.field.id))
+        self.cache.clear()
+        self.assertTrue(self.cache.km.isTemporary(self.field.id))
+
+    def testSharedResult(self):
+        self.cache.max_entries = 2
+        self.cache.store('key1', self.field)
+        self.cache.store('key2', self.field)
+        self.cache.evict(1)
+        self.assertFalse(self.cache.km.isTemporary(self.field.id))
+        self.cache.evict(0)
+        self.assertTrue(self.cache.km.isTemporary(self.field.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
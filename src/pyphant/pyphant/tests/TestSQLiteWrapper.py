@@ -94,6 +94,20 @@ class SQLiteWrapperTestCase(unittest.TestCase):
         os.remove(self.dbase)
         os.removedirs(self.dir)
 
+    def testTemporary(self):
+        id = self.summary['id']
+        with self.wrapper:
+            self.wrapper.set_entry(im_summary, None)
+            self.wrapper.set_entry(self.summary, 'storage1', temporary=True)
+            assert self.wrapper.is_temporary(id)
+            self.wrapper.set_temporary(id, False)
+            assert not self.wrapper.is_temporary(id)
+            assert self.wrapper.has_entry(id)
+            self.wrapper.set_temporary(id, True)
+            self.wrapper.setup_sqlite()
+            assert not self.wrapper.has_entry(id)
+            assert self.wrapper.has_entry(im_summary['id'])
+
     def testAll(self):
         assert pyphant.core.SQLiteWrapper.date2dbase('2009') \
             == '2009-01-01_00:00:00.000000'
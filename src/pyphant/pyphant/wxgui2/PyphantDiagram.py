@@ -297,7 +297,7 @@ class PlugShape(ConnectorShape, sogl.CircleShape):
                 computer.join()
             result = computer.result
         else:
-            result = self._plug._result
+            result = self._plug.getAvailableResult()
         if not result == None:
             self._ids[event.GetId()](result)
         else:
@@ -39,7 +39,6 @@ from pyphant.core import (Worker, Connectors)
 from pyphant.core.DataContainer import (FieldContainer, SampleContainer)
 from ImageProcessing import FEATURE_COLOR
 import scipy
-import copy
 import pkg_resources
 
 
@@ -74,8 +73,7 @@ class ApplyMask(Worker.Worker):
             m == FEATURE_COLOR, img, FEATURE_COLOR
             ).astype('d')
         subscriber %= 55.0
-        container = copy.deepcopy(image)
-        container.data = result
+        container = image.derive(data=result)
         container.seal()
         subscriber %= 100.0
         return container
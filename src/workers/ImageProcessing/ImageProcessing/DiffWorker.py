@@ -58,7 +58,7 @@ class DiffWorker(Worker.Worker):
         result = image1 - image2
         if self.paramAbsolute.value == u"Yes":
             import numpy
-            result.data = numpy.abs(result.data)
+            numpy.abs(result.data, result.data)
         if self.paramLongname.value != 'default':
             result.longname = self.paramLongname.value
         if self.paramSymbol.value != 'default':
@@ -35,7 +35,6 @@ Toolbox. It is used to backfill outlined features again.
 """
 
 from pyphant.core import (Worker, Connectors)
-import copy
 from ImageProcessing import (BACKGROUND_COLOR, FEATURE_COLOR)
 import pkg_resources
 
@@ -54,7 +53,7 @@ class EdgeFillWorker(Worker.Worker):
 
     @Worker.plug(Connectors.TYPE_IMAGE)
     def fillImage(self, image, subscriber=0):
-        result = copy.deepcopy(image)
+        result = image.derive()
         im = result.data
         self.fillFromEdge(im, BACKGROUND_COLOR, FEATURE_COLOR)
         result.seal()
@@ -37,7 +37,6 @@ edge until only the outline remains.
 
 from pyphant.core import (Worker, Connectors)
 from ImageProcessing import EdgeFillWorker
-import copy
 import pkg_resources
 
 
@@ -52,7 +51,7 @@ class EdgeTouchingFeatureRemover(EdgeFillWorker.EdgeFillWorker):
 
     @Worker.plug(Connectors.TYPE_IMAGE)
     def fillFeatures(self, image, subscriber=0):
-        result = copy.deepcopy(image)
+        result = image.derive()
         im = result.data
         from ImageProcessing import (FEATURE_COLOR, BACKGROUND_COLOR)
         self.fillFromEdge(im, FEATURE_COLOR, BACKGROUND_COLOR)
@@ -48,8 +48,7 @@ class MarkInclusions(Worker.Worker):
 
     @Worker.plug(Connectors.TYPE_IMAGE)
     def markInclusions(self, zstack, statistics, subscriber=0):
-        from copy import deepcopy
-        ret = deepcopy(zstack)
+        ret = zstack.derive()
         ret.longname = "Marked_%s" % zstack.longname
         zst = zstack.attributes.get('ZStackType') or "unknown"
         ret.attributes['ZStackType'] = "Marked_%s" % zst
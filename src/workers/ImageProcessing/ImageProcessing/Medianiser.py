@@ -38,7 +38,6 @@ kernel and the number of smoothing runs can be edited.
 
 from pyphant.core import (Worker, Connectors)
 import scipy.ndimage.filters
-import copy
 import pkg_resources
 
 
@@ -55,10 +54,11 @@ class Medianiser(Worker.Worker):
 
     @Worker.plug(Connectors.TYPE_IMAGE)
     def medianize(self, field, subscriber=0):
-        im = copy.deepcopy(field)
         size = self.paramSize.value
         ru = self.paramRuns.value
+        data = field.data
         for _ in xrange(ru):
-            im.data = scipy.ndimage.filters.median_filter(im.data, size=size)
+            data = scipy.ndimage.filters.median_filter(data, size=size)
+        im = field.derive(data=data)
         im.seal()
         return im
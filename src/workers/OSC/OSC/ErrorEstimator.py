@@ -37,7 +37,6 @@ evaluates the error caused by noise for every pixel in a field.
 import numpy
 from pyphant.core import (Worker, Connectors)
 import logging
-import copy
 import pkg_resources
 
 _logger = logging.getLogger("pyphant")
@@ -88,7 +87,6 @@ class ErrorEstimator(Worker.Worker):
             x = xCon[i]
             noise[i] = localNoise(x, self.paramDA.value)
             subscriber %= float(i + 1) / count * 100.0
-        result = copy.deepcopy(osc)
-        result.error = noise
+        result = osc.derive(error=noise)
         result.seal()
         return result
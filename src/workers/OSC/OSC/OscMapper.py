@@ -38,7 +38,6 @@ from pyphant.core import (Worker, Connectors, DataContainer)
 from pyphant.quantities import Quantity
 from OSC.OscAbsorption import grid2Index
 import logging
-import copy
 import pkg_resources
 
 
@@ -114,7 +113,7 @@ class OscMapper(Worker.Worker):
         xCon = osc[self.paramXAxis.value]
         yCon = osc[self.paramYAxis.value]
         fCon = osc[self.paramField.value]
-        cons = [copy.deepcopy(data) for data in [xCon, yCon, fCon]]
+        cons = [data.derive() for data in [xCon, yCon, fCon]]
         xCon, yCon, fCon = cons
         for con in cons:
             con.longname = con.longname.replace('_', ' ')
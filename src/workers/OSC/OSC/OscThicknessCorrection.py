@@ -37,7 +37,6 @@ import numpy
 from pyphant.core import (Worker, Connectors)
 from pyphant.quantities import Quantity
 import logging
-import copy
 import pkg_resources
 
 
@@ -57,7 +56,7 @@ class OscThicknessCorrector(Worker.Worker):
         self._logger = logging.getLogger("pyphant")
 
     def perform_spincoat_correction(self, x, y, uncorrected_t):
-        t = copy.deepcopy(uncorrected_t)
+        t = uncorrected_t.derive()
         r = numpy.sqrt(x.data ** 2 + y.data ** 2)
         r_min = r.min()
         r_max = r.max()
@@ -68,7 +67,7 @@ class OscThicknessCorrector(Worker.Worker):
         return t
 
     def perform_print_correction(self, x, raw_y, uncorrected_t):
-        t = copy.deepcopy(uncorrected_t)
+        t = uncorrected_t.derive()
         y = raw_y.data
         d = 1.9 * y ** 2 + 19.3 * y + 49
         t.data = t.data - d
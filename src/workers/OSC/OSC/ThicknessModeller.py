@@ -55,8 +55,7 @@ class ThicknessModeller(Worker.Worker):
         h = copy.deepcopy(heights.data)
         h.sort()
         data = numpy.vstack([copy.deepcopy(A.data[indexMap[i]]) for i in h])
-        height = copy.deepcopy(heights)
-        height.data = h
+        height = heights.derive(data=h)
         attr = copy.deepcopy(A.attributes).update(osc.attributes)
         result = DataContainer.FieldContainer(
             data, unit=A.unit,
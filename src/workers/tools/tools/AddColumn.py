@@ -36,7 +36,6 @@ orignial chart again.
 """
 
 from pyphant.core import (Worker, Connectors)
-import copy
 import pkg_resources
 
 
@@ -50,9 +49,6 @@ class AddColumn(Worker.Worker):
 
     @Worker.plug(Connectors.TYPE_ARRAY)
     def compute(self, sample, field, subscriber=1):
-        result = copy.deepcopy(sample)
-        cols = result.columns
-        cols.append(field)
-        result.columns = cols
+        result = sample.derive(columns=sample.columns + [field])
         result.seal()
         return result
@@ -34,7 +34,6 @@ u"""
 """
 
 from pyphant.core import (Worker, Connectors, DataContainer)
-import copy
 import pkg_resources
 
 
@@ -56,7 +55,7 @@ class ColumnExtractor(Worker.Worker):
     def extract(self, osc, subscriber=0):
         col = osc[self.paramColumn.value]
         if self.paramIndex.value == 'All':
-            result = copy.deepcopy(col)
+            result = col.derive()
         else:
             index = int(self.paramIndex.value)
             if len(col.dimensions) > 1:
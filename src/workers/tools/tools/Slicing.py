@@ -37,7 +37,6 @@ part of a field and provides it as a new field to work on.
 
 from pyphant.core import (Worker, Connectors, DataContainer)
 from pyphant import quantities
-import copy
 import pkg_resources
 
 
@@ -129,6 +128,6 @@ class Slicing(Worker.Worker):
                                     min(s.stop + 1,
                                         len(field.dimensions[dim].data)),
                                     s.step)
-        result = copy.deepcopy(field[params])
+        result = field[params]
         result.seal()
         return result